@@ -0,0 +1,262 @@
+# -------------------------------------------------------------------------------
+# Name:        benchmark
+# Purpose:     Reproducible performance benchmark of the footprint stages on a synthetic city
+#              (see synthetic_city). Reports points/s, cells/s, polygons/s and the peak memory per stage as JSON.
+#              The arcpy stages (regularize, split) are only timed when arcpy is available.
+#
+#              python benchmark.py --out benchmark.json [--tiles 2 2] [--density 8] [--workers 1]
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+
+import numpy as np
+
+import building_classifier
+import grid_lib
+import instrumentation
+import las_io
+import parallel_lib
+import synthetic_city
+import tile_stream
+
+# Constants, in meters
+DEFAULT_CELL_SIZE = 0.8           # toolbox default raster cell size
+DEFAULT_MIN_AREA = 46.45          # toolbox default minimum building area (500 square feet)
+MIN_HEIGHT = 2.0
+CLASSIFY_MIN_AREA = 50.0
+REGULARIZE_TOLERANCE = 1.5
+CHANGED_EVERY = 10                # every n-th true building is left out of the "existing" footprints
+RESULT_VERSION = 1
+
+
+class StageTimer(object):
+
+    """
+    Times one benchmark stage: with StageTimer(results, "rasterize") as stage: ... stage.cells += n
+    The error of an optional stage is reported in the results, the benchmark goes on.
+    """
+
+    def __init__(self, results, name, optional=False):
+        self.results = results
+        self.name = name
+        self.optional = optional
+        self.points = 0
+        self.cells = 0
+        self.polygons = 0
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        self.start_cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start_time
+        result = {"seconds": round(seconds, 4), "cpu_seconds": round(time.process_time() - self.start_cpu, 4)}
+        for name in ("points", "cells", "polygons"):
+            count = getattr(self, name)
+            if count:
+                result[name] = count
+                result[name + "_per_s"] = round(count / seconds, 1) if seconds else None
+        # peak_rss_mb is the benchmark process only. worker_peak_rss_mb is the largest pool worker that finished
+        # so far (the operating system keeps one peak for all finished children, not one per stage)
+        rss = instrumentation.peak_rss()
+        result["peak_rss_mb"] = round(rss / 2 ** 20, 1) if rss else None
+        worker_rss = instrumentation.peak_worker_rss()
+        if worker_rss:
+            result["worker_peak_rss_mb"] = round(worker_rss / 2 ** 20, 1)
+        if exc_type is not None:
+            result["error"] = str(exc_value)
+        self.results[self.name] = result
+
+        return self.optional and exc_type is not None and issubclass(exc_type, Exception)
+
+
+def _arcpy():
+    try:
+        import arcpy
+        return arcpy
+    except ImportError:
+        return None
+
+
+def run_benchmark(folder, cell_size=DEFAULT_CELL_SIZE, min_area=DEFAULT_MIN_AREA, workers=1, message=print):
+    # Times the stages on the synthetic city in folder (synthetic_city.generate_city). Coordinates are meters.
+    # Returns {stage name: result}.
+    truth = synthetic_city.load_truth(folder)
+    las_files = truth["las_files"]
+    stages = {}
+
+    message("Tile scan")
+    with StageTimer(stages, "tile_scan") as stage:
+        headers = []
+        for las_file in las_files:
+            headers.append(las_io.read_header(las_file))
+            x, y, z, _ = las_io.read_xyz(las_file)
+            stage.points += x.size
+
+    options = building_classifier.building_options(MIN_HEIGHT, CLASSIFY_MIN_AREA, 1.0)
+    tasks = [(las_file, [las_files[n] for n in las_io.find_neighbours(headers, i, options["halo"])], options)
+             for i, las_file in enumerate(las_files)]
+    tile_centers = [((h.min[0] + h.max[0]) / 2.0, (h.min[1] + h.max[1]) / 2.0) for h in headers]
+
+    message("Classify")
+    with StageTimer(stages, "classify") as stage:
+        tiles = parallel_lib.run_tasks(tile_stream.classify_tile_task, tasks, workers)
+        stage.points = sum(h.point_count for h in headers)
+    for number, tile in enumerate(tiles):
+        tile["number"] = number
+
+    message("Rasterize")
+    with StageTimer(stages, "rasterize") as stage:
+        for tile in tiles:
+            tile_stream.rasterize_tile(tile, cell_size)
+            stage.cells += tile["mask"].size
+
+    message("Morphology")
+    with StageTimer(stages, "morphology") as stage:
+        for tile in tiles:
+            stage.cells += tile["mask"].size
+            tile_stream.morphology_tile(tile, tile_centers, min_area)
+
+    message("Vectorize")
+    with StageTimer(stages, "vectorize") as stage:
+        for tile in tiles:
+            tile_stream.vectorize_tile(tile)
+            stage.polygons += len(tile["footprints"])
+    footprints = [parts for tile in tiles for parts in tile["footprints"]]
+
+    message("Stream (classify to vectorize, overlapped)")
+    streamed = []
+    with StageTimer(stages, "stream") as stage:
+        tile_stream.stream_footprints(las_files, streamed.append, options, cell_size, min_area, workers=workers)
+        stage.points = sum(h.point_count for h in headers)
+        stage.polygons = sum(len(tile["footprints"]) for tile in streamed)
+
+    message("Change detection")
+    with StageTimer(stages, "change_detection") as stage:
+        spec = grid_lib.grid_spec_from_extent(*truth["extent"], cell_size=cell_size)
+        existing = [b["rings"] for i, b in enumerate(truth["buildings"]) if i % CHANGED_EVERY]
+        changes = detect_changes(spec, footprints, existing, min_area)
+        stage.cells = spec.n_rows * spec.n_cols
+        stage.polygons = len(footprints) + len(existing)
+    stages["change_detection"]["changes"] = changes
+
+    arcpy = _arcpy()
+    if arcpy is None:
+        for name in ("regularize", "split"):
+            stages[name] = {"skipped": "arcpy is not available"}
+        return stages
+
+    arcpy.env.overwriteOutput = True
+    spatial_reference = arcpy.SpatialReference(32613)
+    draft = "in_memory/benchmark_footprints"
+    with tile_stream.FootprintWriter(draft, spatial_reference, message=lambda text: None) as writer:
+        for tile in tiles:
+            writer(tile)
+
+    message("Regularize")
+    regularized = "in_memory/benchmark_regularized"
+    with StageTimer(stages, "regularize", optional=True) as stage:
+        arcpy.CheckOutExtension("3D")
+        arcpy.ddd.RegularizeBuildingFootprint(draft, regularized, "RIGHT_ANGLES",
+                                              "{0} Meters".format(REGULARIZE_TOLERANCE))
+        stage.polygons = int(arcpy.GetCount_management(regularized).getOutput(0))
+
+    message("Split")
+    parcels = "in_memory/benchmark_parcels"
+    arcpy.CreateFeatureclass_management("in_memory", "benchmark_parcels", "POLYGON",
+                                        spatial_reference=spatial_reference)
+    with arcpy.da.InsertCursor(parcels, ["SHAPE@"]) as cursor:
+        for parcel in truth["parcels"]:
+            ring = arcpy.Array([arcpy.Point(x, y) for x, y in parcel["ring"]])
+            cursor.insertRow([arcpy.Polygon(ring, spatial_reference)])
+    with StageTimer(stages, "split", optional=True) as stage:
+        import split_features
+        split_bldg = split_features.split("in_memory", regularized, parcels, min_area,
+                                          "in_memory/benchmark_split", 0, True)
+        stage.polygons = int(arcpy.GetCount_management(split_bldg).getOutput(0))
+
+    for dataset in (draft, regularized, parcels):
+        arcpy.Delete_management(dataset)
+
+    return stages
+
+
+def detect_changes(spec, footprints, existing, min_area):
+    # Raster change detection of the extracted footprints against the existing footprints: connected groups of
+    # cells covered by only one of them, of at least min_area. Returns {"new": n, "demolished": n}.
+    new = synthetic_city.rasterize_rings(spec, footprints) > 0
+    old = synthetic_city.rasterize_rings(spec, existing) > 0
+    min_cells = min_area / spec.cell_size ** 2
+
+    changes = {}
+    for name, mask in (("new", new & ~old), ("demolished", old & ~new)):
+        # slivers along the outlines are opened away first
+        mask = grid_lib.opening(mask.astype(np.float64), 3) > 0
+        labels, n = grid_lib.label_components(mask, connectivity=4)
+        counts = np.bincount(labels.ravel(), minlength=n + 1)[1:]
+        changes[name] = int((counts >= min_cells).sum())
+
+    return changes
+
+
+def environment():
+    return {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "processor": platform.processor(), "cpu_count": os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Footprint extraction benchmark on a synthetic city")
+    parser.add_argument("--out", help="JSON result file, printed only when not given")
+    parser.add_argument("--folder", help="folder of the synthetic city, a temporary folder when not given")
+    parser.add_argument("--tiles", type=int, nargs=2, default=(2, 2), metavar=("X", "Y"))
+    parser.add_argument("--tile-size", type=float, default=synthetic_city.DEFAULT_TILE_SIZE)
+    parser.add_argument("--density", type=float, default=synthetic_city.DEFAULT_DENSITY, help="points per m2")
+    parser.add_argument("--seed", type=int, default=synthetic_city.DEFAULT_SEED)
+    parser.add_argument("--cell-size", type=float, default=DEFAULT_CELL_SIZE)
+    parser.add_argument("--min-area", type=float, default=DEFAULT_MIN_AREA)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    folder = args.folder or tempfile.mkdtemp(prefix="building_benchmark_")
+    start_time = time.perf_counter()
+    truth = synthetic_city.generate_city(folder, args.tiles[0], args.tiles[1], args.tile_size, args.density,
+                                         args.seed)
+    generate_seconds = time.perf_counter() - start_time
+
+    stages = run_benchmark(folder, args.cell_size, args.min_area, args.workers,
+                           message=lambda text: print(text, file=sys.stderr))
+
+    rss = instrumentation.peak_rss()
+    worker_rss = instrumentation.peak_worker_rss()
+    result = {"version": RESULT_VERSION,
+              "dataset": {"tiles": len(truth["las_files"]), "tile_size": args.tile_size, "density": args.density,
+                          "seed": args.seed, "points": truth["point_count"], "buildings": len(truth["buildings"]),
+                          "generate_seconds": round(generate_seconds, 4)},
+              "parameters": {"cell_size": args.cell_size, "min_area": args.min_area, "workers": args.workers},
+              "environment": environment(),
+              "stages": stages,
+              "peak_rss_mb": round(rss / 2 ** 20, 1) if rss else None,
+              "worker_peak_rss_mb": round(worker_rss / 2 ** 20, 1) if worker_rss else None}
+
+    text = json.dumps(result, indent=1)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+
+    main()
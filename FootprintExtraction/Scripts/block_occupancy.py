@@ -0,0 +1,308 @@
+# -------------------------------------------------------------------------------
+# Name:        block_occupancy
+# Purpose:     Per block occupancy bitmaps of class / mask rasters and the processing regions they give,
+#              so raster stages only run over the blocks that hold data (plus a halo)
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+
+import numpy as np
+
+import grid_lib
+
+# Constants
+BUILDING_CLASS = 6
+DEFAULT_BLOCK_SIZE = 256          # raster cells per block (each way)
+DEFAULT_HALO = 1                  # blocks added around the occupied blocks
+MAX_REGIONS = 64                  # every region is a separate run of the raster tools, more are grouped
+MAX_REGION_FRACTION = 0.5         # regions covering more of the extent than this run as one full extent pass
+OCCUPANCY_EXTENSION = "_occupancy.npz"
+READ_ROWS = 1024                  # raster rows per read when computing the occupancy of a raster
+
+
+def block_spec(spec, block_size=DEFAULT_BLOCK_SIZE):
+    # GridSpec of the blocks of a raster grid: one cell per block
+    return grid_lib.GridSpec(spec.x_min, spec.y_max, spec.cell_size * block_size,
+                             -(-spec.n_rows // block_size), -(-spec.n_cols // block_size))
+
+
+def mark_blocks(occupied, blocks, spec, mask, row0=0):
+    # Sets the blocks (bool grid occupied, GridSpec blocks) that contain a True cell of mask.
+    # mask: rows row0.. of a grid with GridSpec spec, blocks and spec do not have to be aligned.
+    rows, cols = np.nonzero(mask)
+    if rows.size == 0:
+        return occupied
+
+    # every distinct cell is enough, the block grid is much coarser than the cells
+    x, y = grid_lib.cell_centers(spec, rows + row0, cols)
+    b_rows, b_cols, inside = grid_lib.cell_index(blocks, x, y)
+    occupied[b_rows[inside], b_cols[inside]] = True
+
+    return occupied
+
+
+def grid_occupancy(a, value=BUILDING_CLASS, block_size=DEFAULT_BLOCK_SIZE):
+    # Occupancy of an in-memory grid: blocks with any cell equal to value (any not NaN cell when value is None)
+    mask = ~np.isnan(a) if value is None else a == value
+    return grid_lib.block_any(mask, block_size)
+
+
+def mosaic_occupancy(mosaic, value=BUILDING_CLASS, block_size=DEFAULT_BLOCK_SIZE):
+    # Occupancy of a virtual_mosaic.VirtualMosaic, read one block row at a time. Returns occupied, block spec.
+    spec = mosaic.grid_spec()
+    blocks = block_spec(spec, block_size)
+    occupied = np.zeros((blocks.n_rows, blocks.n_cols), dtype=bool)
+
+    for b_row in range(blocks.n_rows):
+        row0 = b_row * block_size
+        n_rows = min(block_size, spec.n_rows - row0)
+        strip = mosaic.read_cells(row0, 0, n_rows, spec.n_cols)
+        occupied[b_row] = grid_lib.block_any(strip == value, block_size)[0]
+
+    return occupied, blocks
+
+
+def raster_occupancy(in_raster, value=BUILDING_CLASS, block_size=DEFAULT_BLOCK_SIZE, blocks=None, occupied=None):
+    # Occupancy of a raster dataset (arcpy), read in strips of READ_ROWS rows.
+    # value: cell value that marks a block, None for every cell with data.
+    # blocks / occupied: block grid to add to (e.g. of another raster), a new one from the raster when None.
+    # Returns occupied, block spec.
+    import arcpy
+
+    desc = arcpy.Describe(in_raster)
+    spec = grid_lib.GridSpec(desc.extent.XMin, desc.extent.YMax, desc.meanCellWidth, desc.height, desc.width)
+    if blocks is None:
+        blocks = block_spec(spec, block_size)
+    if occupied is None:
+        occupied = np.zeros((blocks.n_rows, blocks.n_cols), dtype=bool)
+
+    for row0 in range(0, spec.n_rows, READ_ROWS):
+        n_rows = min(READ_ROWS, spec.n_rows - row0)
+        lower_left = arcpy.Point(spec.x_min, spec.y_max - (row0 + n_rows) * spec.cell_size)
+        strip = arcpy.RasterToNumPyArray(in_raster, lower_left, spec.n_cols, n_rows, nodata_to_value=np.nan)
+        strip = strip.astype(np.float64)
+        mask = ~np.isnan(strip) if value is None else strip == value
+        mark_blocks(occupied, blocks, spec, mask, row0)
+
+    return occupied, blocks
+
+
+def occupancy_path(raster):
+    # Occupancy file of a raster: next to the raster, or next to the geodatabase of a geodatabase raster
+    folder, name = os.path.split(os.path.abspath(raster))
+    if folder.lower().endswith(".gdb"):
+        return os.path.splitext(folder)[0] + "_" + name + OCCUPANCY_EXTENSION
+
+    return os.path.splitext(raster)[0] + OCCUPANCY_EXTENSION
+
+
+def save_occupancy(path, occupied, blocks):
+    np.savez_compressed(path, occupied=occupied, grid=np.array(blocks, dtype=np.float64))
+    return path
+
+
+def load_occupancy(path):
+    # Returns occupied, block spec, or None, None when there is no occupancy file
+    if not os.path.exists(path):
+        return None, None
+
+    with np.load(path) as data:
+        grid = data["grid"]
+        blocks = grid_lib.GridSpec(float(grid[0]), float(grid[1]), float(grid[2]), int(grid[3]), int(grid[4]))
+        return data["occupied"].astype(bool), blocks
+
+
+def dilate(occupied, halo=DEFAULT_HALO):
+    # Adds halo blocks around the occupied blocks (8 neighbourhood)
+    out = occupied.copy()
+    for _ in range(halo):
+        grown = out.copy()
+        grown[1:, :] |= out[:-1, :]
+        grown[:-1, :] |= out[1:, :]
+        grown[:, 1:] |= grown[:, :-1].copy()
+        grown[:, :-1] |= grown[:, 1:].copy()
+        out = grown
+
+    return out
+
+
+def block_regions(occupied, halo=DEFAULT_HALO, max_regions=MAX_REGIONS):
+    # Processing regions, in blocks: [(extent, boxes)], extent and boxes as (row0, col0, row1, col1).
+    # boxes are non overlapping rectangles that cover the occupied blocks and their halo. Connected blocks always
+    # fall in the same box, so a feature that spans blocks is never cut.
+    # With more than max_regions boxes, the boxes are grouped by square tiles of 2, 4, ... blocks (by the tile of
+    # their first block), a region is then the extent of the boxes of a tile. The extents of a group can
+    # overlap boxes of other groups: keep only the features inside the boxes of the region (see delete_outside).
+    boxes = _component_boxes(dilate(occupied, halo))
+    if len(boxes) <= max_regions:
+        return [(box, [box]) for box in boxes]
+
+    size = 2
+    while True:
+        groups = {}
+        for box in boxes:
+            groups.setdefault((box[0] // size, box[1] // size), []).append(box)
+        if len(groups) <= max_regions:
+            break
+        size *= 2
+
+    regions = []
+    for key in sorted(groups):
+        members = groups[key]
+        extent = (min(b[0] for b in members), min(b[1] for b in members),
+                  max(b[2] for b in members), max(b[3] for b in members))
+        regions.append((extent, members))
+
+    return regions
+
+
+def _component_boxes(mask):
+    # Bounding boxes of the connected groups of mask cells. The boxes are filled in and grouped again until
+    # no two boxes overlap.
+    if not mask.any():
+        return []
+
+    current = mask
+    while True:
+        labels, n = grid_lib.label_components(current, connectivity=8)
+
+        rows, cols = np.nonzero(current)
+        ids = labels[rows, cols] - 1
+        boxes = np.zeros((n, 4), dtype=np.int64)
+        boxes[:, 0] = mask.shape[0]
+        boxes[:, 1] = mask.shape[1]
+        np.minimum.at(boxes[:, 0], ids, rows)
+        np.minimum.at(boxes[:, 1], ids, cols)
+        np.maximum.at(boxes[:, 2], ids, rows + 1)
+        np.maximum.at(boxes[:, 3], ids, cols + 1)
+
+        filled = np.zeros(mask.shape, dtype=bool)
+        for row0, col0, row1, col1 in boxes:
+            filled[row0:row1, col0:col1] = True
+        if np.array_equal(filled, current):
+            break
+        current = filled
+
+    return [tuple(int(v) for v in b) for b in boxes[np.lexsort((boxes[:, 1], boxes[:, 0]))]]
+
+
+def _box_extent(box, blocks, extent=None):
+    row0, col0, row1, col1 = box
+    x_min = blocks.x_min + col0 * blocks.cell_size
+    x_max = blocks.x_min + col1 * blocks.cell_size
+    y_max = blocks.y_max - row0 * blocks.cell_size
+    y_min = blocks.y_max - row1 * blocks.cell_size
+    if extent:
+        x_min, y_min = max(x_min, extent[0]), max(y_min, extent[1])
+        x_max, y_max = min(x_max, extent[2]), min(y_max, extent[3])
+
+    return x_min, y_min, x_max, y_max
+
+
+def region_extents(occupied, blocks, halo=DEFAULT_HALO, max_regions=MAX_REGIONS, extent=None):
+    # Processing regions in map units: [(extent, boxes)], extent and boxes as (x_min, y_min, x_max, y_max),
+    # clipped to extent when given. When a region has more than 1 box, features outside the boxes
+    # belong to another region.
+    return [(_box_extent(region, blocks, extent), [_box_extent(b, blocks, extent) for b in members])
+            for region, members in block_regions(occupied, halo, max_regions)]
+
+
+def covered_fraction(regions, extent):
+    # Fraction of extent (x_min, y_min, x_max, y_max) that the region extents cover
+    covered = sum((e[2] - e[0]) * (e[3] - e[1]) for e, _ in regions)
+    total = (extent[2] - extent[0]) * (extent[3] - extent[1])
+
+    return covered / total if total else 1.0
+
+
+def choose_regions(regions, fraction, max_regions=MAX_REGIONS, max_fraction=MAX_REGION_FRACTION):
+    # The regions the raster tools run on. Every region pays the fixed cost of its tool runs (each tool call
+    # has its own setup time), so one pass over the full extent, [(None, [])], is used instead when there are
+    # no regions, more than max_regions, or when they cover more than max_fraction of the extent and little
+    # area is skipped.
+    if not regions or len(regions) > max_regions or fraction > max_fraction:
+        return [(None, [])]
+
+    return regions
+
+
+def inside_boxes(x, y, boxes):
+    # True for the coordinates that fall in one of the boxes (x_min, y_min, x_max, y_max)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    inside = np.zeros(x.shape, dtype=bool)
+    for x_min, y_min, x_max, y_max in boxes:
+        inside |= (x >= x_min) & (x < x_max) & (y > y_min) & (y <= y_max)
+
+    return inside
+
+
+def set_extent(region):
+    # Processing extent of the raster tools for a region, the full extent when region is None
+    import arcpy
+
+    if region is None:
+        arcpy.ClearEnvironment("extent")
+    else:
+        arcpy.env.extent = arcpy.Extent(*region)
+
+
+def merge_regions(region_features, out_feature_class):
+    # Merges the outputs of the regions and deletes them
+    import arcpy
+
+    arcpy.Merge_management(region_features, out_feature_class)
+    for feature_class in region_features:
+        arcpy.Delete_management(feature_class)
+
+    return out_feature_class
+
+
+def delete_outside(feature_class, boxes):
+    # Deletes the features of a region that belong to another region (label point outside the boxes)
+    import arcpy
+
+    with arcpy.da.UpdateCursor(feature_class, ["SHAPE@"]) as cursor:
+        for row in cursor:
+            point = row[0].labelPoint
+            if not inside_boxes(point.X, point.Y, boxes):
+                cursor.deleteRow()
+
+
+def clip_to_boxes(feature_class, boxes, out_feature_class):
+    # Clips the features of a region to its boxes, for features that are not confined to the occupied blocks
+    # (e.g. polygons of the open ground)
+    import arcpy
+    import scratch_workspace
+
+    with scratch_workspace.ScratchWorkspace(prefix="boxes", kind=scratch_workspace.MEMORY) as memory:
+        boxes_fc = memory.path("region_boxes")
+        arcpy.CreateFeatureclass_management(os.path.dirname(boxes_fc), os.path.basename(boxes_fc), "POLYGON",
+                                            spatial_reference=arcpy.Describe(feature_class).spatialReference)
+        with arcpy.da.InsertCursor(boxes_fc, ["SHAPE@"]) as cursor:
+            for x_min, y_min, x_max, y_max in boxes:
+                cursor.insertRow([arcpy.Extent(x_min, y_min, x_max, y_max).polygon])
+        arcpy.Clip_analysis(feature_class, boxes_fc, out_feature_class)
+
+    return out_feature_class
+
+
+def building_regions(in_raster, value=BUILDING_CLASS, halo=DEFAULT_HALO):
+    # Processing regions of a class raster: from the occupancy recorded when the raster was written
+    # (see create_building_mosaic), computed from the raster otherwise.
+    # Returns the regions (see region_extents) and the fraction of the raster extent that is processed.
+    import arcpy
+
+    occupied, blocks = load_occupancy(occupancy_path(in_raster))
+    if occupied is None:
+        occupied, blocks = raster_occupancy(in_raster, value)
+
+    extent = arcpy.Describe(in_raster).extent
+    extent = (extent.XMin, extent.YMin, extent.XMax, extent.YMax)
+    regions = region_extents(occupied, blocks, halo, extent=extent)
+
+    return regions, covered_fraction(regions, extent)
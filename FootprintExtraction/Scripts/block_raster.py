@@ -0,0 +1,250 @@
+# -------------------------------------------------------------------------------
+# Name:        block_raster
+# Purpose:     Tiled, zlib compressed raster container for intermediate grids.
+#              Fixed size blocks, append-only writes (safe from parallel workers), random block access.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import json
+import struct
+import time
+import zlib
+
+import numpy as np
+
+import grid_lib
+
+# Constants
+BLOCK_RASTER_EXTENSION = ".blk"
+DEFAULT_BLOCK_SIZE = 256
+DEFAULT_LEVEL = 6                 # zlib compression level
+LOCK_RETRY_DELAY = 0.05           # seconds between attempts to lock the file on Windows
+FILE_MAGIC = b"BRST"
+RECORD_MAGIC = b"BLK1"
+RECORD = struct.Struct("<4siiIQ")  # magic, block row, block col, crc32, payload length
+
+# File layout:
+#   "BRST", header length (uint32), header (JSON: grid, dtype, nodata, block size)
+#   block records, appended in any order: RECORD + zlib payload. A later record of the same block replaces
+#   the earlier one, a record without payload clears the block. Blocks without a record are nodata.
+# The block offset table is built by reading the record headers only (payloads are skipped).
+
+
+class BlockRasterError(Exception):
+
+    """
+    Raised when a file is not a valid block raster.
+    """
+
+    pass
+
+
+class BlockRaster(object):
+
+    def __init__(self, path, spec, dtype, nodata, block_size):
+        self.path = path
+        self.spec = spec
+        self.dtype = np.dtype(dtype)
+        self.nodata = nodata
+        self.block_size = block_size
+        self.shape = (spec.n_rows, spec.n_cols)
+        self.n_blocks = (-(-spec.n_rows // block_size), -(-spec.n_cols // block_size))
+        self.table = {}
+        self._scanned = 0
+
+    @classmethod
+    def create(cls, path, spec, dtype="uint8", nodata=0, block_size=DEFAULT_BLOCK_SIZE):
+        header = json.dumps({"grid": list(spec), "dtype": np.dtype(dtype).str, "nodata": nodata,
+                             "block_size": block_size}).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(FILE_MAGIC + struct.pack("<I", len(header)) + header)
+
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            start = f.read(8)
+            if len(start) < 8 or start[:4] != FILE_MAGIC:
+                raise BlockRasterError(path + " is not a block raster.")
+            header_size = struct.unpack("<I", start[4:])[0]
+            header = json.loads(f.read(header_size).decode("utf-8"))
+
+        raster = cls(path, grid_lib.GridSpec(*header["grid"]), header["dtype"], header["nodata"],
+                     header["block_size"])
+        raster._scanned = 8 + header_size
+        raster.refresh()
+
+        return raster
+
+    def refresh(self):
+        # Reads the record headers appended since the last scan (e.g. by worker processes)
+        end = os.path.getsize(self.path)
+        with open(self.path, "rb") as f:
+            position = self._scanned
+            while position + RECORD.size <= end:
+                f.seek(position)
+                magic, b_row, b_col, crc, length = RECORD.unpack(f.read(RECORD.size))
+                if magic != RECORD_MAGIC:
+                    raise BlockRasterError(self.path + ": damaged block record at byte " + str(position) + ".")
+                if position + RECORD.size + length > end:
+                    # record still being written
+                    break
+                if length:
+                    self.table[(b_row, b_col)] = (position + RECORD.size, length, crc)
+                else:
+                    self.table.pop((b_row, b_col), None)
+                position += RECORD.size + length
+
+        self._scanned = position
+
+    def block_shape(self, b_row, b_col):
+        return (min(self.block_size, self.shape[0] - b_row * self.block_size),
+                min(self.block_size, self.shape[1] - b_col * self.block_size))
+
+    def write_block(self, b_row, b_col, block, skip_empty=True):
+        # Appends one block. Blocks with only nodata are not stored when skip_empty is set.
+        block = np.asarray(block, dtype=self.dtype)
+        if block.shape != self.block_shape(b_row, b_col):
+            raise BlockRasterError("Block " + str((b_row, b_col)) + " must have the shape " +
+                                   str(self.block_shape(b_row, b_col)) + ".")
+
+        if skip_empty and not _has_data(block, self.nodata):
+            if (b_row, b_col) not in self.table:
+                return 0
+            # clears the stored block
+            payload = b""
+        else:
+            payload = zlib.compress(np.ascontiguousarray(block).tobytes(), DEFAULT_LEVEL)
+        crc = zlib.crc32(payload)
+        record = RECORD.pack(RECORD_MAGIC, b_row, b_col, crc, len(payload)) + payload
+
+        # one append per record: the file lock keeps records of parallel writers apart
+        with open(self.path, "ab") as f:
+            _lock(f)
+            try:
+                offset = f.seek(0, os.SEEK_END) + RECORD.size
+                f.write(record)
+                f.flush()
+            finally:
+                _unlock(f)
+
+        if payload:
+            self.table[(b_row, b_col)] = (offset, len(payload), crc)
+        else:
+            self.table.pop((b_row, b_col), None)
+
+        return len(payload)
+
+    def read_block(self, b_row, b_col):
+        shape = self.block_shape(b_row, b_col)
+        entry = self.table.get((b_row, b_col))
+        if entry is None:
+            return np.full(shape, self.nodata, dtype=self.dtype)
+
+        offset, length, crc = entry
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            payload = f.read(length)
+        if zlib.crc32(payload) != crc:
+            raise BlockRasterError(self.path + ": checksum error in block " + str((b_row, b_col)) + ".")
+
+        return np.frombuffer(zlib.decompress(payload), dtype=self.dtype).reshape(shape).copy()
+
+    def has_block(self, b_row, b_col):
+        return (b_row, b_col) in self.table
+
+    def occupied(self):
+        # boolean grid of the blocks that are stored (hold data)
+        flags = np.zeros(self.n_blocks, dtype=bool)
+        for b_row, b_col in self.table:
+            flags[b_row, b_col] = True
+
+        return flags
+
+    def read_window(self, row0, col0, n_rows, n_cols):
+        # Cells [row0, row0 + n_rows) x [col0, col0 + n_cols), only the blocks that intersect are read
+        out = np.full((n_rows, n_cols), self.nodata, dtype=self.dtype)
+        size = self.block_size
+        for b_row in range(max(row0, 0) // size, min(-(-(row0 + n_rows) // size), self.n_blocks[0])):
+            for b_col in range(max(col0, 0) // size, min(-(-(col0 + n_cols) // size), self.n_blocks[1])):
+                if (b_row, b_col) not in self.table:
+                    continue
+                block = self.read_block(b_row, b_col)
+                r0 = max(row0, b_row * size)
+                r1 = min(row0 + n_rows, b_row * size + block.shape[0])
+                c0 = max(col0, b_col * size)
+                c1 = min(col0 + n_cols, b_col * size + block.shape[1])
+                out[r0 - row0:r1 - row0, c0 - col0:c1 - col0] = \
+                    block[r0 - b_row * size:r1 - b_row * size, c0 - b_col * size:c1 - b_col * size]
+
+        return out
+
+    def read_array(self):
+        return self.read_window(0, 0, self.shape[0], self.shape[1])
+
+    def write_array(self, array, blocks=None):
+        # Writes the blocks of a full grid (all blocks, or the (b_row, b_col) in blocks)
+        if blocks is None:
+            blocks = [(r, c) for r in range(self.n_blocks[0]) for c in range(self.n_blocks[1])]
+
+        size = self.block_size
+        for b_row, b_col in blocks:
+            self.write_block(b_row, b_col, array[b_row * size:(b_row + 1) * size, b_col * size:(b_col + 1) * size])
+
+    def compact(self, out_path=None):
+        # Rewrites the file with only the latest record of every block (drops replaced records)
+        out_path = out_path or self.path + ".tmp"
+        compacted = BlockRaster.create(out_path, self.spec, self.dtype, self.nodata, self.block_size)
+        for b_row, b_col in sorted(self.table):
+            compacted.write_block(b_row, b_col, self.read_block(b_row, b_col), skip_empty=False)
+
+        if out_path == self.path + ".tmp":
+            os.replace(out_path, self.path)
+            return BlockRaster.open(self.path)
+
+        return compacted
+
+
+def write_block_task(path, b_row, b_col, block):
+    # Worker entry point (parallel_lib.run_tasks): appends one block to an existing block raster
+    return BlockRaster.open(path).write_block(b_row, b_col, block)
+
+
+def _has_data(block, nodata):
+    if nodata is not None and isinstance(nodata, float) and np.isnan(nodata):
+        return not np.isnan(block).all()
+
+    return bool((block != nodata).any())
+
+
+def _lock(f):
+    # exclusive lock on the file, blocks until the lock is granted.
+    # msvcrt.LK_LOCK gives up (OSError) after 10 attempts a second apart, a long writer would make the other
+    # writers fail, so the non blocking lock is retried until it is granted.
+    if os.name == "nt":
+        import msvcrt
+        while True:
+            f.seek(0)
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                time.sleep(LOCK_RETRY_DELAY)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock(f):
+    if os.name == "nt":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,223 @@
+# -------------------------------------------------------------------------------
+# Name:        building_classifier
+# Purpose:     In-process building point classification with NumPy, alternative to
+#              arcpy.ddd.ClassifyLasBuilding that does not edit the LAS files
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+
+import numpy as np
+
+import grid_lib
+import las_io
+import ground_filter
+import parallel_lib
+import point_cache
+import void_fill
+
+# Constants, in meters. Use building_options() to convert them to the units of the data.
+DEFAULT_CELL_SIZE = 1.0           # grid cell size for the planarity analysis
+DEFAULT_ROUGHNESS = 0.15          # max. standard deviation of the points to a local plane
+DEFAULT_HALO = 50.0               # points of neighbouring tiles read around each tile
+UNASSIGNED = 1
+NOISE_CLASSES = (las_io.LOW_NOISE, las_io.HIGH_NOISE)
+
+# 3x3 cell neighbourhood
+_NEIGHBOURS = [(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)]
+
+
+def building_options(min_height, min_area, m_per_unit, cell_size=DEFAULT_CELL_SIZE, roughness=DEFAULT_ROUGHNESS,
+                     halo=DEFAULT_HALO):
+    # min_height and min_area in the units of the data, the other parameters in meters
+    options = {"min_height": min_height,
+               "min_area": min_area,
+               "cell_size": cell_size / m_per_unit,
+               "roughness": roughness / m_per_unit,
+               "halo": halo / m_per_unit}
+    options["ground"] = ground_filter.ground_options(m_per_unit)
+
+    return options
+
+
+def plane_roughness(spec, x, y, z):
+    # Per cell: mean point of the cell, then the covariance of the mean points of the 3x3 cell neighbourhood.
+    # Returns the smallest eigenvalue as standard deviation (distance to the best fitting plane),
+    # the number of neighbours used and the cell mean z.
+    rows, cols, inside = grid_lib.cell_index(spec, x, y)
+    flat = rows[inside] * spec.n_cols + cols[inside]
+    size = spec.n_rows * spec.n_cols
+    shape = (spec.n_rows, spec.n_cols)
+
+    counts = np.bincount(flat, minlength=size)
+    occupied = (counts > 0).reshape(shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cx, cy = grid_lib.cell_centers(spec, rows[inside], cols[inside])
+        # cell mean point relative to the cell center, keeps the moments small and exact
+        u = (np.bincount(flat, x[inside] - cx, size) / counts).reshape(shape)
+        v = (np.bincount(flat, cy - y[inside], size) / counts).reshape(shape)
+        w = (np.bincount(flat, z[inside], size) / counts).reshape(shape)
+
+    u = np.nan_to_num(u)
+    v = np.nan_to_num(v)
+    z_mean = np.where(occupied, np.nan_to_num(w), np.nan)
+    w = np.nan_to_num(w)
+
+    pad_u = np.pad(u, 1)
+    pad_v = np.pad(v, 1)
+    pad_w = np.pad(w, 1)
+    pad_o = np.pad(occupied, 1)
+
+    n = np.zeros(shape)
+    s = np.zeros(shape + (3,))
+    ss = np.zeros(shape + (3, 3))
+    for dr, dc in _NEIGHBOURS:
+        window = (slice(1 + dr, 1 + dr + shape[0]), slice(1 + dc, 1 + dc + shape[1]))
+        valid = pad_o[window]
+        # neighbour offset relative to the center cell, z relative to the center cell mean
+        p = np.stack((pad_u[window] + dc * spec.cell_size,
+                      pad_v[window] + dr * spec.cell_size,
+                      pad_w[window] - w), axis=-1) * valid[..., None]
+        n += valid
+        s += p
+        ss += p[..., :, None] * p[..., None, :]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s / n[..., None]
+        cov = ss / n[..., None, None] - mean[..., :, None] * mean[..., None, :]
+
+    usable = occupied & (n >= 4)
+    roughness = np.full(shape, np.inf)
+    eigen = np.linalg.eigvalsh(cov[usable])
+    roughness[usable] = np.sqrt(np.maximum(eigen[:, 0], 0.0))
+
+    return roughness, n, z_mean
+
+
+def building_cells(spec, x, y, z, options):
+    # Cells of planar regions above min_height (x, y, z are the candidate points only)
+    # with a region area of at least min_area
+    roughness, neighbours, z_mean = plane_roughness(spec, x, y, z)
+    planar = roughness <= options["roughness"]
+
+    labels, n = grid_lib.label_components(planar, 8)
+    if n == 0:
+        return np.zeros(planar.shape, dtype=bool), z_mean
+
+    areas = np.bincount(labels.ravel()) * spec.cell_size ** 2
+    areas[0] = 0
+    buildings = areas[labels] >= options["min_area"]
+
+    # add the roof edge cells, they are not planar in a 3x3 neighbourhood
+    buildings |= grid_lib.max_filter(buildings.astype(np.float64), 3) > 0
+    buildings &= ~np.isnan(z_mean)
+
+    return buildings, z_mean
+
+
+def classify_building_tile(las_file, neighbour_files, options, out_folder=None):
+    # Returns the classification of all points of las_file with the building points set to 6.
+    # Building points from an earlier classification are reset (RECLASSIFY_BUILDING).
+    # Without Ground (2) points in the data the ground is filtered in-process and set to 2 as well.
+    classes, _, _ = classify_building_window(las_file, neighbour_files, options)
+
+    if out_folder:
+        return save_classes(las_file, classes, out_folder)
+
+    return classes
+
+
+def classify_building_window(las_file, neighbour_files, options):
+    # Same as classify_building_tile, also returns the x, y of the roof points of the whole window
+    # (the tile and the halo points of the neighbour files)
+    header, points = las_io.read_points(las_file)
+    classes = np.array(las_io.classification(header, points), dtype=np.uint8)
+    bounds = las_io.header_bounds(header, options["halo"])
+
+    x, y, z, index = las_io.read_xyz(las_file)
+    tile_classes = classes[index]
+    in_tile = [np.ones(x.size, dtype=bool)]
+    xs, ys, zs, cs = [x], [y], [z], [tile_classes]
+    for neighbour in neighbour_files:
+        n_header, n_points = las_io.read_points(neighbour)
+        nx, ny, nz, n_index = las_io.read_xyz(neighbour, bounds)
+        xs.append(nx)
+        ys.append(ny)
+        zs.append(nz)
+        cs.append(las_io.classification(n_header, n_points)[n_index])
+        in_tile.append(np.zeros(nx.size, dtype=bool))
+
+    x_all = np.concatenate(xs)
+    y_all = np.concatenate(ys)
+    z_all = np.concatenate(zs)
+    c_all = np.concatenate(cs)
+    in_tile = np.concatenate(in_tile)
+
+    spec = grid_lib.grid_spec_from_extent(bounds[0], bounds[1], bounds[2], bounds[3], options["cell_size"])
+
+    # ground surface
+    is_ground = c_all == las_io.GROUND
+    derived_ground = not is_ground.any()
+    if derived_ground:
+        dtm = ground_filter.ground_surface_from_points(spec, x_all, y_all, z_all, options["ground"])
+        with np.errstate(invalid="ignore"):
+            dz = z_all - grid_lib.sample_bilinear(spec, dtm, x_all, y_all)
+            is_ground = (dz <= options["ground"]["initial_height"]) & (dz >= -options["ground"]["max_height"])
+    else:
+        dtm = void_fill.binning_surface(spec, x_all[is_ground], y_all[is_ground], z_all[is_ground])
+
+    # height above ground
+    with np.errstate(invalid="ignore"):
+        hag = z_all - grid_lib.sample_bilinear(spec, dtm, x_all, y_all)
+        candidate = (hag >= options["min_height"]) & ~is_ground & ~np.isin(c_all, NOISE_CLASSES)
+
+    buildings, z_mean = building_cells(spec, x_all[candidate], y_all[candidate], z_all[candidate], options)
+
+    # roof points: candidates in building cells, not far below the cell mean (walls, vegetation under eaves)
+    rows, cols, inside = grid_lib.cell_index(spec, x_all, y_all)
+    rows = np.clip(rows, 0, spec.n_rows - 1)
+    cols = np.clip(cols, 0, spec.n_cols - 1)
+    with np.errstate(invalid="ignore"):
+        roof = candidate & inside & buildings[rows, cols] & \
+            (z_all >= z_mean[rows, cols] - 3 * options["roughness"])
+
+    tile_roof = roof[in_tile]
+    tile_classes[tile_classes == las_io.BUILDING] = UNASSIGNED
+    if derived_ground:
+        tile_classes[is_ground[in_tile]] = las_io.GROUND
+    tile_classes[tile_roof] = las_io.BUILDING
+    classes[index] = tile_classes
+
+    return classes, x_all[roof], y_all[roof]
+
+
+def save_classes(las_file, classes, out_folder):
+    # Writes the classification as <name>_class.npy, returns the file
+    out_file = os.path.join(out_folder, os.path.splitext(os.path.basename(las_file))[0] + "_class.npy")
+    np.save(out_file, classes)
+    # class sorted sidecar, later stages read the building and ground points from it
+    point_cache.write_sidecar(las_file, out_folder, classes)
+
+    return out_file
+
+
+def classify_buildings(las_files, options, workers=None, out_folder=None):
+    # Tile parallel building classification.
+    # Returns {las_file: class array}, or {las_file: .npy file} when out_folder is set
+    # (keeps the memory use of the main process low for large datasets). With out_folder a point_cache
+    # sidecar is written for every file as well.
+    if out_folder and not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+
+    headers = [las_io.read_header(f) for f in las_files]
+    tasks = []
+    for i, las_file in enumerate(las_files):
+        neighbours = [las_files[n] for n in las_io.find_neighbours(headers, i, options["halo"])]
+        tasks.append((las_file, neighbours, options, out_folder))
+
+    results = parallel_lib.run_tasks(classify_building_tile, tasks, workers)
+
+    return dict(zip(las_files, results))
@@ -12,18 +12,26 @@
 
 # -------------------------------------------------------------------------------
 
-import arcpy
 import os
-import time
 import traceback
 import datetime
 import logging
 import csv
 import sys
 import math
+import threading
+import uuid
 from math import *
 
 from bisect import bisect_left
+from collections import namedtuple
+
+import instrumentation
+import message_log
+import units
+import lazy_imports
+
+arcpy = lazy_imports.lazy_import("arcpy")
 
 # Constants
 NON_GP = "non-gp"
@@ -34,13 +42,20 @@ WARNING = "warning"
 
 in_memory_switch = True
 
+# Describe of a dataset or layer (see describe_dataset), extent as (x_min, y_min, x_max, y_max)
+DatasetInfo = namedtuple("DatasetInfo", ["name", "catalog_path", "data_type", "shape_type", "spatial_reference",
+                                         "has_z", "oid_field", "area_field", "extent"])
+_describe_cache = {}
+_describe_lock = threading.Lock()
+DELETE_CHUNK_SIZE = 1000      # ids per where clause of delete_rows_by_ids
+
 def template_function(debug):
 
     if debug == 0:
         msg("--------------------------")
         msg("Executing template_function...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("template_function")
 
     try:
 
@@ -64,8 +79,8 @@ def template_function(debug):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -108,7 +123,7 @@ def trace(*arg):
 def set_up_logging(output_folder, file):
 
     arcpy.AddMessage("Executing set_up_logging...")
-    start_time = time.clock()
+    span = instrumentation.start_span("set_up_logging")
 
     try:
         # Make the 'logs' folder if it doesn't exist
@@ -117,7 +132,6 @@ def set_up_logging(output_folder, file):
             os.makedirs(log_location)
 
         # Set up logging
-        logging.getLogger('').handlers = []  # clears handlers
         date_prefix = datetime.datetime.now().strftime('%Y%m%d_%H%M')
 
         log_file_date = os.path.join(log_location, file + "_" + date_prefix + ".log")
@@ -132,10 +146,8 @@ def set_up_logging(output_folder, file):
             except FunctionError:
                 log_file_name = log_file_date
 
-        logging.basicConfig(level=logging.INFO,
-                            filename=log_file_name,
-                            format='%(asctime)s %(message)s',
-                            datefmt='%Y-%m-%d %H:%M:%S')
+        # the log file is written by the listener thread of message_log, the geoprocessing messages by msg
+        message_log.start([message_log.file_handler(log_file_name), message_log.message_handler()])
 
         msg("Logging set up.  Log location: " + log_location)
 
@@ -146,10 +158,10 @@ def set_up_logging(output_folder, file):
         raise
 
     finally:
+        span.end("failed" if failed else None)
         if failed:
             msg_prefix = "An exception was raised in set_up_logging."
-            end_time = time.clock()
-            msg_body = create_msg_body(msg_prefix, start_time, end_time)
+            msg_body = span.message(msg_prefix)
             msg(msg_body, ERROR)
 
 
@@ -157,7 +169,16 @@ def msg(*arg):
 
     # Utility method that writes a logging info statement, a print statement and an
     # arcpy.AddMessage() statement all at once.
-    if len(arg) == 1:
+    # After set_up_logging (message_log.start) the geoprocessing message is written right away (similar
+    # messages coalesced), the log file line is queued and written by the listener thread.
+    if message_log.is_started():
+        if len(arg) > 1 and arg[1] == ERROR:
+            message_log.log(logging.ERROR, str(arg[0]))
+        elif len(arg) > 1 and arg[1] == WARNING:
+            message_log.log(logging.WARNING, str(arg[0]))
+        else:
+            message_log.log(logging.INFO, str(arg[0]))
+    elif len(arg) == 1:
         logging.info(str(arg[0]) + "\n")
         arcpy.AddMessage(str(arg[0]))
     elif arg[1] == ERROR:
@@ -247,14 +268,67 @@ def create_gdb(path, name):
         arcpy.AddError(e.args[0])
 
 
+def is_in_memory(path):
+    workspace = str(path).replace("\\", "/").split("/")[0].lower()
+    return workspace in ("in_memory", "memory")
+
+
+def _describe_key(path):
+    # Cache key of a dataset path, None for names that are not a full path (layers, table views)
+    if not isinstance(path, str) or not os.path.isabs(path) or is_in_memory(path):
+        return None
+    return os.path.normcase(os.path.abspath(path))
+
+
+def describe_dataset(dataset):
+    # arcpy.Describe of a dataset or layer as a DatasetInfo. Datasets are cached by their catalog path
+    # (a path the dataset is given with is looked up the same way). Layers and table views are never cached,
+    # their names are re-created over other data, neither are datasets in memory, they are cheap to describe
+    # and often re-created under the same name.
+    # Call invalidate_describe at the start of a tool run (the cache lives as long as the Python session) and
+    # after a tool replaces the dataset.
+    key = _describe_key(dataset)
+    if key is not None:
+        with _describe_lock:
+            info = _describe_cache.get(key)
+        if info is not None:
+            return info
+
+    desc = arcpy.Describe(dataset)
+    extent = getattr(desc, "extent", None)
+    info = DatasetInfo(name=desc.name,
+                       catalog_path=getattr(desc, "catalogPath", None),
+                       data_type=desc.dataType,
+                       shape_type=getattr(desc, "shapeType", None),
+                       spatial_reference=getattr(desc, "spatialReference", None),
+                       has_z=getattr(desc, "hasZ", False),
+                       oid_field=getattr(desc, "OIDFieldName", None),
+                       area_field=getattr(desc, "areaFieldName", None),
+                       extent=(extent.XMin, extent.YMin, extent.XMax, extent.YMax) if extent else None)
+
+    key = _describe_key(info.catalog_path)
+    if key is not None and not info.data_type.endswith(("Layer", "TableView")):
+        with _describe_lock:
+            _describe_cache[key] = info
+
+    return info
+
+
+def invalidate_describe(dataset=None):
+    # Forgets the cached Describe of a dataset (given by its path), of all datasets when None
+    with _describe_lock:
+        if dataset is None:
+            _describe_cache.clear()
+            return
+        _describe_cache.pop(_describe_key(dataset), None)
+
+
 def get_name_from_feature_class(feature_class):
-    desc_fc = arcpy.Describe(feature_class)
-    return desc_fc.name
+    return describe_dataset(feature_class).name
 
 
 def get_datatype_from_layer(layer):
-    desc = arcpy.Describe(layer)
-    return desc.dataType
+    return describe_dataset(layer).data_type
 
 def get_raster_featuretype_from_layer(layer):
     desc = arcpy.Describe(layer)
@@ -295,8 +369,9 @@ def is_number(s):
 
 
 def get_full_path_from_layer(in_layer):
-    dir_name = os.path.dirname(arcpy.Describe(in_layer).catalogPath)
-    layer_name = arcpy.Describe(in_layer).name
+    info = describe_dataset(in_layer)
+    dir_name = os.path.dirname(info.catalog_path)
+    layer_name = info.name
 
     return os.path.join(dir_name, layer_name)
 
@@ -395,7 +470,7 @@ def set_null_or_negative_to_value_in_fields(cn_table, cn_field_list, cn_value_li
             msg("--------------------------")
             msg("Executing set_null_or_negative_to_value_in_fields...")
 
-        start_time = time.clock()
+        span = instrumentation.start_span("set_null_or_negative_to_value_in_fields")
         failed = True
         null_value = False
         field_name = ""
@@ -431,8 +506,8 @@ def set_null_or_negative_to_value_in_fields(cn_table, cn_field_list, cn_value_li
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -448,7 +523,7 @@ def set_null_to_value_in_fields(cn_table, cn_field_list, cn_value_list, error, d
             msg("--------------------------")
             msg("Executing set_null_to_value_in_fields...")
 
-        start_time = time.clock()
+        span = instrumentation.start_span("set_null_to_value_in_fields")
         failed = True
         null_value = False
         field_name = ""
@@ -496,8 +571,8 @@ def set_null_to_value_in_fields(cn_table, cn_field_list, cn_value_list, error, d
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -512,7 +587,7 @@ def calculate_field_from_other_field(lyr, table, input_field, output_field, oper
         msg("--------------------------")
         msg("Executing calculate_field_from_other_field...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("calculate_field_from_other_field")
 
     return_error = True
 
@@ -560,8 +635,8 @@ def calculate_field_from_other_field(lyr, table, input_field, output_field, oper
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -575,7 +650,7 @@ def check_null_in_fields(cn_table, cn_field_list, error, debug):
             msg("--------------------------")
             msg("Executing check_null_in_fields...")
 
-        start_time = time.clock()
+        span = instrumentation.start_span("check_null_in_fields")
         failed = True
         null_value = False
         field_name = ""
@@ -619,8 +694,8 @@ def check_null_in_fields(cn_table, cn_field_list, error, debug):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -682,7 +757,7 @@ def check_fields(cf_table, cf_field_list, error, debug):
             msg("--------------------------")
             msg("Executing check_fields...")
 
-        start_time = time.clock()
+        span = instrumentation.start_span("check_fields")
 
         real_fields_list = []
         real_fields = arcpy.ListFields(cf_table)
@@ -719,8 +794,8 @@ def check_fields(cf_table, cf_field_list, error, debug):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -775,6 +850,50 @@ def delete_fields(feature_class, field_list):
         arcpy.AddError(e.args[0])
 
 
+def where_in(table, field, values):
+    # "field IN (...)" where clause for numbers or strings
+    items = []
+    for value in values:
+        if isinstance(value, str):
+            items.append("'" + value.replace("'", "''") + "'")
+        else:
+            items.append(repr(int(value)) if float(value).is_integer() else repr(float(value)))
+
+    return "{0} IN ({1})".format(arcpy.AddFieldDelimiters(table, field), ", ".join(items))
+
+
+def delete_rows(table, where_clause):
+    # Deletes the rows (of the selection of a layer) matching where_clause in one DeleteRows.
+    # Returns the number of deleted rows.
+    # The view name is unique, callers in other threads of the process do not replace each other's view.
+    view = "delete_rows_" + uuid.uuid4().hex
+    count = 0
+    try:
+        arcpy.MakeTableView_management(table, view, where_clause)
+        count = int(arcpy.GetCount_management(view).getOutput(0))
+        if count:
+            arcpy.DeleteRows_management(view)
+    finally:
+        if arcpy.Exists(view):
+            arcpy.Delete_management(view)
+
+    return count
+
+
+def delete_rows_by_ids(table, field, ids, chunk_size=DELETE_CHUNK_SIZE, report=True):
+    # Deletes the rows whose field value is in ids, chunk_size ids per where clause.
+    # Returns the number of deleted rows.
+    ids = sorted(set(ids))
+    count = 0
+    for i in range(0, len(ids), chunk_size):
+        count += delete_rows(table, where_in(table, field, ids[i:i + chunk_size]))
+
+    if report:
+        msg("Deleted " + str(count) + " features from " + get_name_from_feature_class(table) + ".")
+
+    return count
+
+
 def find_field_by_wildcard(feature_class, wild_card):
     try:
         real_fields = arcpy.ListFields(feature_class)
@@ -893,7 +1012,7 @@ def copy_features_with_selected_attributes(ws, input_obj, output_obj, keep_field
             msg("--------------------------")
             msg("Executing check_fields...")
 
-        start_time = time.clock()
+        span = instrumentation.start_span("copy_features_with_selected_attributes")
 
         field_info_str = ''
 
@@ -937,8 +1056,8 @@ def copy_features_with_selected_attributes(ws, input_obj, output_obj, keep_field
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -949,7 +1068,7 @@ def copy_features_with_selected_attributes(ws, input_obj, output_obj, keep_field
 
 
 def remove_layers_from_scene(project, layer_list):
-    start_time = time.clock()
+    span = instrumentation.start_span("remove_layers_from_scene")
     try:
         msg_prefix = ""
 
@@ -977,8 +1096,8 @@ def remove_layers_from_scene(project, layer_list):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -991,7 +1110,7 @@ def import_table_with_required_fields(in_table, ws, out_table_name, local_list,
         msg("--------------------------")
         msg("Executing import_table_with_required_fields...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("import_table_with_required_fields")
 
     try:
         i = 0
@@ -1029,8 +1148,8 @@ def import_table_with_required_fields(in_table, ws, out_table_name, local_list,
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1045,11 +1164,11 @@ def get_z_unit(local_lyr, debug):
         msg("--------------------------")
         msg("Executing get_z_unit...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("get_z_unit")
 
     try:
 
-        sr = arcpy.Describe(local_lyr).spatialReference
+        sr = describe_dataset(local_lyr).spatial_reference
         local_unit = 'Meters'
 
         if sr.VCS:
@@ -1087,8 +1206,8 @@ def get_z_unit(local_lyr, debug):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1102,11 +1221,11 @@ def get_xy_unit(local_lyr, debug):
         msg("--------------------------")
         msg("Executing get_xy_unit...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("get_xy_unit")
 
     try:
 
-        sr = arcpy.Describe(local_lyr).spatialReference
+        sr = describe_dataset(local_lyr).spatial_reference
         local_unit = 'Meters'
 
         unit_xy = sr.linearUnitName
@@ -1140,8 +1259,8 @@ def get_xy_unit(local_lyr, debug):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1155,14 +1274,14 @@ def get_cs_info(local_lyr, debug):
         msg("--------------------------")
         msg("Executing is_projected...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("get_cs_info")
 
     try:
         cs_name = None
         cs_vcs_name = None
         projected = False
 
-        sr = arcpy.Describe(local_lyr).spatialReference
+        sr = describe_dataset(local_lyr).spatial_reference
 
         if sr:
             cs_name = sr.name
@@ -1215,8 +1334,8 @@ def get_cs_info(local_lyr, debug):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1227,7 +1346,7 @@ def get_cs_info(local_lyr, debug):
 def get_row_values_for_fields_with_floatvalue(lyr, table, fields, select_field, value):
 #    msg("--------------------------")
 #    msg("Executing get_row_values_for_selected_fields...")
-    start_time = time.clock()
+    span = instrumentation.start_span("get_row_values_for_fields_with_floatvalue")
 
     try:
         debug = 0
@@ -1286,8 +1405,8 @@ def get_row_values_for_fields_with_floatvalue(lyr, table, fields, select_field,
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1298,7 +1417,7 @@ def get_row_values_for_fields_with_floatvalue(lyr, table, fields, select_field,
 def get_row_values_for_fields(lyr, table, fields, select_field, value):
 #    msg("--------------------------")
 #    msg("Executing get_row_values_for_selected_fields...")
-    start_time = time.clock()
+    span = instrumentation.start_span("get_row_values_for_fields")
 
     try:
         debug = 0
@@ -1357,8 +1476,8 @@ def get_row_values_for_fields(lyr, table, fields, select_field, value):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1374,7 +1493,7 @@ def set_row_values_for_field(lyr, table, field, value, debug):
         msg("--------------------------")
         msg("Executing set_row_values_for_field...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("set_row_values_for_field")
 
     return_error = True
 
@@ -1411,8 +1530,8 @@ def set_row_values_for_field(lyr, table, field, value, debug):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1421,7 +1540,7 @@ def set_row_values_for_field(lyr, table, field, value, debug):
 
 
 def get_extent_layer(local_ws, local_layer):
-    start_time = time.clock()
+    span = instrumentation.start_span("get_extent_layer")
 
     try:
         debug = 0
@@ -1471,8 +1590,8 @@ def get_extent_layer(local_ws, local_layer):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1484,7 +1603,7 @@ def get_extent_feature(local_ws, local_features):
 
 #    msg("--------------------------")
 #    msg("Executing get_extent_area...")
-    start_time = time.clock()
+    span = instrumentation.start_span("get_extent_feature")
 
     try:
         debug = 0
@@ -1534,8 +1653,8 @@ def get_extent_feature(local_ws, local_features):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1547,7 +1666,7 @@ def get_extent_area(local_ws, local_features):
 
 #    msg("--------------------------")
 #    msg("Executing get_extent_area...")
-    start_time = time.clock()
+    span = instrumentation.start_span("get_extent_area")
 
     try:
         debug = 0
@@ -1599,8 +1718,8 @@ def get_extent_area(local_ws, local_features):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1614,14 +1733,14 @@ def check_max_number_of_split(ws, features, id_field, area_field, my_area_field,
         msg("--------------------------")
         msg("Executing check_max_number_of_split...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("check_max_number_of_split")
 
     try:
         check = True
 
         # check feature type
         input_type = arcpy.Describe(features).shapetype
-        units = arcpy.Describe(features).spatialReference.linearUnitName
+        linear_unit = arcpy.Describe(features).spatialReference.linearUnitName
         local_area_field = area_field
 
         # go to polygon to get SHAPE_Area
@@ -1636,11 +1755,9 @@ def check_max_number_of_split(ws, features, id_field, area_field, my_area_field,
             list_len = len(unique_field_values)
             largest_area = unique_field_values[list_len - 1]
 
-            if "Foot" in units:
-                largest_area *= 0.092903
-
-            if "Feet" in units:
-                largest_area *= 0.092903
+            # panel_size is in meters, the area in the square units of the data
+            if linear_unit:
+                largest_area *= units.conversion_factor(linear_unit, "Meters") ** 2
 
             number_of_panels = largest_area / (panel_size * panel_size)
 
@@ -1667,8 +1784,8 @@ def check_max_number_of_split(ws, features, id_field, area_field, my_area_field,
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1681,7 +1798,7 @@ def calculate_footprint_area(ws, features, area_field, my_area_field, join_field
         msg("--------------------------")
         msg("Executing calculate_footprint_area...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("calculate_footprint_area")
 
     try:
         temp_footprint = os.path.join(ws, "temp_footprint")
@@ -1716,8 +1833,8 @@ def calculate_footprint_area(ws, features, area_field, my_area_field, join_field
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1731,7 +1848,7 @@ def list_rasters_in_gdb(gdb, debug):
         msg("--------------------------")
         msg("Executing list_rasters_in_gdb...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("list_rasters_in_gdb")
 
     try:
         # list all rasters in a geodatabase, including inside Feature Datasets '''
@@ -1759,8 +1876,8 @@ def list_rasters_in_gdb(gdb, debug):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1773,7 +1890,7 @@ def list_fcs_in_gdb(gdb, debug):
         msg("--------------------------")
         msg("Executing list_fcs_in_gdb...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("list_fcs_in_gdb")
 
     try:
         # list all Feature Classes in a geodatabase, including inside Feature Datasets '''
@@ -1805,8 +1922,8 @@ def list_fcs_in_gdb(gdb, debug):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1847,7 +1964,7 @@ def threeD_enable_featurclass(ws, feature_class, elevation_surface, unique_ID, d
         msg("--------------------------")
         msg("Executing threeD_enable_featurclass...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("threeD_enable_featurclass")
 
     try:
         BASEELEVATIONfield = "BASEELEV"
@@ -1892,8 +2009,8 @@ def threeD_enable_featurclass(ws, feature_class, elevation_surface, unique_ID, d
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -1907,7 +2024,7 @@ def Point3DToObject(ws, rpk, in_features, elevation_attribute, buffer_attribute,
         msg("--------------------------")
         msg("Executing Point3DToObject...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("Point3DToObject")
 
     try:
 
@@ -1963,8 +2080,8 @@ def Point3DToObject(ws, rpk, in_features, elevation_attribute, buffer_attribute,
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -2133,41 +2250,15 @@ def unitConversion(layer_unit, input_unit, debug):
         msg("--------------------------")
         msg("Executing unitConversion...")
 
-    start_time = time.clock()
+    span = instrumentation.start_span("unitConversion")
 
     try:
 
         conversionFactor = 1
 
-        # to feet
-        if layer_unit == "Feet":
-            unitToFeetConversion = {'Inches': 0.0833333,
-                                    'Feet': 1,
-                                    'Yards': 3.000000096,
-                                    'Miles': 5280.00016896,
-                                    'Nautical Miles': 6076.11568,
-                                    'Millimeters': 0.00328084,
-                                    'Centimeters': 0.0328084,
-                                    'Decimeters': 0.328084,
-                                    'Meters': 3.28084,
-                                    'Kilometers': 3280.84}
-
-            conversionFactor = unitToFeetConversion[input_unit]
-
-        # to meters
-        if layer_unit == "Meters":
-            unitToMeterConversion = {'Inches': 0.0254,
-                                    'Feet': 0.3048,
-                                    'Yards': 0.9144,
-                                    'Miles': 1609.34,
-                                    'Nautical Miles': 1852,
-                                    'Millimeters': 0.001,
-                                    'Centimeters': 0.01,
-                                    'Decimeters': 0.1,
-                                    'Meters': 1,
-                                    'Kilometers': 1000}
-
-            conversionFactor = unitToMeterConversion[input_unit]
+        # to feet or meters
+        if layer_unit in ("Feet", "Meters"):
+            conversionFactor = units.conversion_factor(input_unit, layer_unit)
 
         msg_prefix = "Function unitConversion completed successfully."
         failed = False
@@ -2189,8 +2280,8 @@ def unitConversion(layer_unit, input_unit, debug):
         )
 
     finally:
-        end_time = time.clock()
-        msg_body = create_msg_body(msg_prefix, start_time, end_time)
+        span.end("failed" if failed else None)
+        msg_body = span.message(msg_prefix)
         if failed:
             msg(msg_body, ERROR)
         else:
@@ -2282,10 +2373,10 @@ def check_valid_input(input_features, need_projected, shape_type_list, need_z_va
                 cs_name, cs_vcs_name, is_projected = get_cs_info(input_features, 0)
 
                 if is_projected == need_projected:
-                    desc = arcpy.Describe(input_features)
+                    info = describe_dataset(input_features)
 
-                    if desc.shapeType in shape_type_list:
-                        z_values = desc.hasZ
+                    if info.shape_type in shape_type_list:
+                        z_values = info.has_z
                         if need_z_value:
                             if z_values == need_z_value:
                                 valid = True
@@ -2310,3 +2401,47 @@ def check_valid_input(input_features, need_projected, shape_type_list, need_z_va
         e = sys.exc_info()[1]
         arcpy.AddMessage("Unhandled exception: " + str(e.args[0]))
 
+
+
+def get_las_files(lasd):
+    # Returns the full paths of the LAS files in a LAS dataset (or LAS dataset layer).
+    # The files are listed from the LAS dataset itself, no statistics are computed. Errors are raised to
+    # the caller, an empty LAS dataset returns an empty list.
+    lasd_path = arcpy.Describe(lasd).catalogPath
+    lasd_folder = os.path.dirname(lasd_path)
+
+    las_files = []
+    for child in arcpy.Describe(lasd_path).children:
+        las_file = child.catalogPath
+        if not os.path.isabs(las_file):
+            las_file = os.path.join(lasd_folder, las_file)
+        if las_file.lower().endswith(".las") and las_file not in las_files:
+            las_files.append(las_file)
+
+    return las_files
+
+
+def save_grid_as_raster(grid, spec, out_raster, spatial_reference, nodata=-9999.0):
+    # Saves a NumPy grid (grid_lib.GridSpec layout, NaN is NoData) as a raster dataset
+    import numpy
+
+    values = numpy.where(numpy.isnan(grid), nodata, grid).astype(numpy.float32)
+    lower_left = arcpy.Point(spec.x_min, spec.y_max - spec.n_rows * spec.cell_size)
+
+    raster = arcpy.NumPyArrayToRaster(values, lower_left, spec.cell_size, spec.cell_size, nodata)
+    raster.save(out_raster)
+    arcpy.DefineProjection_management(out_raster, spatial_reference)
+
+    return out_raster
+
+
+def read_raster_as_grid(in_raster):
+    # Reads a raster dataset as a NumPy grid (NoData is NaN) and its grid_lib.GridSpec
+    import numpy
+    import grid_lib
+
+    desc = arcpy.Describe(in_raster)
+    grid = arcpy.RasterToNumPyArray(in_raster, nodata_to_value=numpy.nan).astype(numpy.float64)
+    spec = grid_lib.GridSpec(desc.extent.XMin, desc.extent.YMax, desc.meanCellWidth, grid.shape[0], grid.shape[1])
+
+    return grid, spec
@@ -1,27 +1,27 @@
 __author__ = 'dani7858'
 
 
-import arcpy
-from arcpy.sa import *
 import os
 import sys
 import common_lib
+import units
+import field_engine
 import csv
-import re
-
-lasd = arcpy.GetParameterAsText(0)
-buildings = arcpy.GetParameterAsText(1)
-threshold = arcpy.GetParameterAsText(2)
-cell_size = arcpy.GetParameterAsText(3)
-minimum_area = arcpy.GetParameterAsText(4)
-aoi = arcpy.GetParameterAsText(5)
-replace_changes = arcpy.GetParameterAsText(6)
-output_fps = arcpy.GetParameterAsText(7)
-
-aprx = arcpy.mp.ArcGISProject("CURRENT")
-gdb = aprx.defaultGeodatabase
-workspace = "in_memory"
-home_folder = aprx.homeFolder
+import grid_lib
+import ground_filter
+import las_io
+import parallel_lib
+import point_cache
+import void_fill
+import block_occupancy
+import instrumentation
+import overlay_lib
+import scratch_workspace
+import lazy_imports
+
+# arcpy and arcpy.sa are loaded when detect_footprint_changes runs, not on import
+arcpy = lazy_imports.lazy_import("arcpy")
+
 update_field = "Update_Status"
 iou_field = "IoU"
 
@@ -29,47 +29,6 @@ class NoChange(Exception):
     pass
 
 
-def get_metric_from_linear_unit(linear_unit):
-    unit_split = linear_unit.split(' ')
-    value = float(unit_split[0])
-    unit = unit_split[1]
-    unit_dict = {
-        "Kilometers": .001,
-        "Meters": 1,
-        "Decimeters": 10,
-        "Centimeters": 100,
-        "Millimeters": 1000,
-        "Feet": 3.28084,
-        "Inches": 39.3701,
-        "Miles": 0.000621371,
-        "Yards": 1.09361,
-        "NauticalMiles": 0.000539957
-    }
-    metric_value = value / unit_dict[unit]
-    return metric_value
-
-
-def get_metric_from_areal_unit(areal_unit):
-    unit_split = areal_unit.split(' ')
-    value = float(unit_split[0])
-    unit = unit_split[1]
-    unit_dict = {
-        "SquareKilometers": .000001,
-        "Hectares": 0.0001,
-        "SquareMeters": 1,
-        "SquareDecimeters": 100,
-        "SquareCentimeters": 10000,
-        "SquareMillimeters": 1000000,
-        "SquareFeet": 10.7639,
-        "Inches": 1550,
-        "Miles": 0.0000003861013863,
-        "Yards": 1.19599,
-        "Acres": 0.000247105
-    }
-    metric_value = value / unit_dict[unit]
-    return metric_value
-
-
 def get_files_from_lasd(las_dataset, outputdir):
     try:
         # Get LiDAR class codes
@@ -118,507 +77,603 @@ def get_lasd_extent(lasd, output_extent, work_folder, spatial_ref):
     return output_extent
 
 
+def processing_extent(mask):
+    # (x_min, y_min, x_max, y_max) of the mask, within the extent environment when one is set
+    mask_extent = arcpy.Describe(mask).extent
+    extent = [mask_extent.XMin, mask_extent.YMin, mask_extent.XMax, mask_extent.YMax]
+    env_extent = arcpy.env.extent
+    if env_extent is not None and hasattr(env_extent, "XMin"):
+        extent = [max(extent[0], env_extent.XMin), max(extent[1], env_extent.YMin),
+                  min(extent[2], env_extent.XMax), min(extent[3], env_extent.YMax)]
+
+    return tuple(extent)
+
+
 def get_area_field(fc):
     path_name = os.path.dirname(fc)
     if path_name == "in_memory":
         area_field = "geom_area"
-        fields = arcpy.ListFields(fc)
-        if area_field in [f.name for f in fields]:
-            arcpy.DeleteField_management(fc, area_field)
-        arcpy.AddField_management(fc, "geom_area", "FLOAT")
-        arcpy.CalculateField_management(fc, "geom_area", "!shape.area!", "PYTHON_9.3")
+        field_engine.calculate_fields(fc, [field_engine.AREA_TOKEN],
+                                      {area_field: ("FLOAT", field_engine.shape_area)})
 
     else:
-        area_field = arcpy.Describe(fc).areaFieldName
+        area_field = common_lib.describe_dataset(fc).area_field
 
     return area_field
 
 
-cell_size = re.sub("[,.]", ".", cell_size)
-min_area = re.sub("[,.]", ".", minimum_area)
-threshold = re.sub("[,.]", ".", threshold)
-m_cell_size = get_metric_from_linear_unit(cell_size)
-m_min_area = get_metric_from_areal_unit(minimum_area)
-m_threshold = get_metric_from_linear_unit(threshold)
-
-# Check for building classification
-# If building classification exists, create surface from building points and ground
-# If no building points exist, clip DSM
-las_desc = arcpy.Describe(lasd)
-mp_desc = arcpy.Describe(buildings)
-aoi_spatial_ref = None
-if arcpy.Exists(aoi):
-    aoi_desc = arcpy.Describe(aoi)
-    aoi_spatial_ref = aoi_desc.spatialReference
-update_stats = las_desc.needsUpdateStatistics
-las_spatial_ref = las_desc.spatialReference
-mp_spatial_ref = mp_desc.spatialReference
-
-if update_stats:
-    arcpy.AddMessage("Updating LAS Dataset Statistics")
-    arcpy.LasDatasetStatistics_management(lasd, "OVERWRITE_EXISTING_STATS")
-class_codes = las_desc.classCodes
-arcpy.AddMessage("Class codes detected: " + str(class_codes))
-class_list = [int(code) for code in class_codes.split(';')]
-try:
-    if os.path.exists(home_folder + "\\p20"):      # it is a package
-        home_folder = home_folder + "\\p20"
-
-    arcpy.AddMessage("Project Home Directory is: " + home_folder)
-
-    layerDirectory = home_folder + "\\layer_files"
-
-    if os.path.exists(layerDirectory):
-        common_lib.rename_file_extension(layerDirectory, ".txt", ".lyrx")
-
-    if las_spatial_ref.type == "Geographic":
-        arcpy.AddError("LAS Dataset is in a geographic coordinate system."
-                       " Please use the Extract LAS tool to re-project and try again")
-    if mp_spatial_ref.type == "Geographic":
-        arcpy.AddError("Multipatch feature class is in a geographic coordinate system."
-                       " Please use the Project tool to re-project and try again")
-
-    las_extent = os.path.join(workspace, "las_extent")
-    get_lasd_extent(lasd, las_extent, home_folder, las_spatial_ref)
-    aoi_proj = os.path.join(gdb, "aoi_proj")
-    mp_bldg_lyr = "mp_bldg_lyr"
-    arcpy.MakeFeatureLayer_management(buildings, mp_bldg_lyr)
+def detect_footprint_changes(lasd, buildings, threshold, cell_size, minimum_area, aoi, replace_changes, output_fps):
+    # Detect Footprint Changes: compares the buildings with the LAS dataset, footprints of new, demolished and
+    # changed buildings go to output_fps. threshold and cell_size are linear, minimum_area areal unit texts.
+    from arcpy.sa import Abs, Con, Expand, IsNull, Minus, Shrink, ZonalStatisticsAsTable
+
+    aprx = arcpy.mp.ArcGISProject("CURRENT")
+    home_folder = aprx.homeFolder
+    # intermediate data of this run, in a scratch gdb of its own and a namespace of in_memory
+    scratch = scratch_workspace.ScratchWorkspace(prefix="changes")
+    memory = scratch_workspace.ScratchWorkspace(prefix="changes", kind=scratch_workspace.MEMORY)
+
+    m_cell_size = units.linear(cell_size).meters
+    m_min_area = units.areal(minimum_area).meters
+    m_threshold = units.linear(threshold).meters
+
+    # Check for building classification
+    # If building classification exists, create surface from building points and ground
+    # If no building points exist, clip DSM
+    las_desc = arcpy.Describe(lasd)
+    mp_desc = arcpy.Describe(buildings)
+    aoi_spatial_ref = None
     if arcpy.Exists(aoi):
-        aoi_int = os.path.join(workspace, "aoi_int")
-        if aoi_spatial_ref != las_spatial_ref:
-            arcpy.Project_management(aoi, aoi_proj, las_spatial_ref)
-            arcpy.Intersect_analysis([aoi_proj, las_extent], aoi_int)
-            arcpy.env.mask = aoi_int
-        else:
-            arcpy.Intersect_analysis([aoi, las_extent], aoi_int)
-            arcpy.env.mask = aoi_int
-        arcpy.SelectLayerByLocation_management(mp_bldg_lyr, "INTERSECT", aoi_int)
-    else:
-        arcpy.env.mask = las_extent
-        arcpy.SelectLayerByLocation_management(mp_bldg_lyr, "INTERSECT", las_extent)
-    mp_m_per_unit = mp_spatial_ref.metersPerUnit
-    las_m_per_unit = las_spatial_ref.metersPerUnit
-
-    # Create multipatch footprints
-    mp_footprints = os.path.join(workspace, "mp_footprints")
-    arcpy.MultiPatchFootprint_3d(mp_bldg_lyr, mp_footprints)
-    fp_desc = arcpy.Describe(mp_footprints)
-    fp_oid = fp_desc.OIDFieldName
-
-    if 6 in class_list and 2 in class_list:
-        # Add update status and IoU field
-        arcpy.AddFields_management(mp_footprints, [[update_field, "TEXT"], [iou_field, "FLOAT"]])
-
-        # Create output fc
-        out_path = os.path.dirname(output_fps)
-        out_name = os.path.basename(output_fps)
-        arcpy.CreateFeatureclass_management(out_path, out_name, "POLYGON", mp_footprints)
-
-        # Create ground layer
-        arcpy.AddMessage("Creating las building surface")
-        las_bldg_lyr = "las_bldg_lyr"
-        arcpy.MakeLasDatasetLayer_management(lasd, las_bldg_lyr, [6])
-        
-        las_ground_layer = "las_ground_layer"
-        arcpy.MakeLasDatasetLayer_management(lasd, las_ground_layer, 2)
-
-        las_cell_size = round(m_cell_size / las_m_per_unit)
-
-        las_bldg_ras = os.path.join(workspace, "las_bldg_ras")
-        arcpy.LasDatasetToRaster_conversion(las_bldg_lyr, las_bldg_ras, "ELEVATION", 'BINNING MAXIMUM SIMPLE',
-                                            sampling_type='CELLSIZE',
-                                            sampling_value=las_cell_size)
-
-        las_ground_ras = os.path.join(workspace, "las_ground_ras")
-        arcpy.LasDatasetToRaster_conversion(las_ground_layer, las_ground_ras, "ELEVATION", 'BINNING MAXIMUM LINEAR',
-                                            sampling_type='CELLSIZE',
-                                            sampling_value=las_cell_size)
-
-        # convert vertical units to meter
-        bldg_ras = os.path.join(workspace, "bldg_ras")
-        ground_ras = os.path.join(workspace, "ground_ras")
-        if las_m_per_unit != 1:
-            arcpy.Times_3d(las_bldg_ras, las_m_per_unit, bldg_ras)
-            arcpy.Times_3d(las_ground_ras, las_m_per_unit, ground_ras)
-        else:
-            bldg_ras = las_bldg_ras
-            ground_ras = las_ground_ras
-
-        # Rasterize buildings
-        arcpy.AddMessage("Rasterizing 3D Buildings")
-        arcpy.env.snapRaster = bldg_ras
-        arcpy.env.cellSize = bldg_ras
-        mp_bldg_ras = os.path.join(workspace, "mp_bldg_ras")
-        arcpy.MultipatchToRaster_conversion(buildings, mp_bldg_ras)
-        mp_ras = os.path.join(workspace, "mp_ras")
-        if mp_m_per_unit != 1:
-            arcpy.Times_3d(mp_bldg_ras, mp_m_per_unit, mp_ras)
+        aoi_desc = arcpy.Describe(aoi)
+        aoi_spatial_ref = aoi_desc.spatialReference
+    update_stats = las_desc.needsUpdateStatistics
+    las_spatial_ref = las_desc.spatialReference
+    mp_spatial_ref = mp_desc.spatialReference
+
+    if update_stats:
+        arcpy.AddMessage("Updating LAS Dataset Statistics")
+        arcpy.LasDatasetStatistics_management(lasd, "OVERWRITE_EXISTING_STATS")
+    class_codes = las_desc.classCodes
+    arcpy.AddMessage("Class codes detected: " + str(class_codes))
+    class_list = [int(code) for code in class_codes.split(';')]
+    # raster environment of the caller, restored when the tool ends
+    environment = {name: getattr(arcpy.env, name) for name in ("snapRaster", "cellSize", "mask", "extent")}
+    try:
+        if os.path.exists(home_folder + "\\p20"):      # it is a package
+            home_folder = home_folder + "\\p20"
+
+        arcpy.AddMessage("Project Home Directory is: " + home_folder)
+
+        layerDirectory = home_folder + "\\layer_files"
+
+        if os.path.exists(layerDirectory):
+            common_lib.rename_file_extension(layerDirectory, ".txt", ".lyrx")
+
+        if las_spatial_ref.type == "Geographic":
+            arcpy.AddError("LAS Dataset is in a geographic coordinate system."
+                           " Please use the Extract LAS tool to re-project and try again")
+        if mp_spatial_ref.type == "Geographic":
+            arcpy.AddError("Multipatch feature class is in a geographic coordinate system."
+                           " Please use the Project tool to re-project and try again")
+
+        las_extent = memory.path("las_extent")
+        get_lasd_extent(lasd, las_extent, scratch.open().folder, las_spatial_ref)
+        aoi_proj = scratch.path("aoi_proj")
+        mp_bldg_lyr = memory.layer("mp_bldg_lyr")
+        arcpy.MakeFeatureLayer_management(buildings, mp_bldg_lyr)
+        if arcpy.Exists(aoi):
+            aoi_int = memory.path("aoi_int")
+            if aoi_spatial_ref != las_spatial_ref:
+                arcpy.Project_management(aoi, aoi_proj, las_spatial_ref)
+                arcpy.Intersect_analysis([aoi_proj, las_extent], aoi_int)
+                arcpy.env.mask = aoi_int
+            else:
+                arcpy.Intersect_analysis([aoi, las_extent], aoi_int)
+                arcpy.env.mask = aoi_int
+            arcpy.SelectLayerByLocation_management(mp_bldg_lyr, "INTERSECT", aoi_int)
         else:
-            mp_ras = mp_bldg_ras
-
-        # Combine building and ground rasters
-        las_bldg_null = IsNull(bldg_ras)
-        las_combined_ras = Con(las_bldg_null, ground_ras, bldg_ras, "VALUE = 1")
-
-        # Create comparison raster
-        arcpy.AddMessage("Creating comparison raster")
-        bldg_null_save = os.path.join(workspace, "bldgNull")
-        bldg_null = IsNull(mp_bldg_ras)
-        bldg_null.save(bldg_null_save)
-        combined_ras_save = os.path.join(workspace, "combined_ras")
-        combined_ras = Con(bldg_null, ground_ras, mp_ras, "VALUE = 1")
-        combined_ras.save(combined_ras_save)
-
-        # Subtract from reference raster
-        compare_ras_save = os.path.join(workspace, "compare_ras")
-        compare_ras = Minus(las_combined_ras, combined_ras)
-        abs_error = Abs(compare_ras)
-
-        # Compare las bldg raster to ground raster
-        ground_compare = Minus(las_combined_ras, ground_ras)
-
-        # Find area where no buildings exist in lidar
-        arcpy.AddMessage("Checking for demolished structures")
-        no_bldg_area = Con(ground_compare < 1, 1)
-        no_bldg_poly = os.path.join(gdb, "no_bldg_poly")
-
-        arcpy.RasterToPolygon_conversion(no_bldg_area, no_bldg_poly, "NO_SIMPLIFY")
-
-        # Select all mp footprints completely contained by no building area
-        footprint_lyr = "fp_lyr"
-        arcpy.MakeFeatureLayer_management(mp_footprints, footprint_lyr)
-        arcpy.SelectLayerByLocation_management(footprint_lyr, "COMPLETELY_WITHIN", no_bldg_poly)
-
-        poly_min_area = m_min_area / (las_m_per_unit ** 2)
-        if common_lib.get_fids_for_selection(footprint_lyr)[1] > 0:
-            # TODO: check Dan
-            demol_area = get_area_field(mp_footprints)
-            arcpy.SelectLayerByAttribute_management(footprint_lyr, "REMOVE_FROM_SELECTION",
-                                                    "{0} < {1}".format(demol_area, str(poly_min_area)))
-
-            arcpy.AddMessage("{0} demolished structures found"
-                             .format(str(common_lib.get_fids_for_selection(footprint_lyr)[1])))
-            arcpy.CalculateField_management(footprint_lyr, update_field, "'Demolished'")
-            arcpy.CopyFeatures_management(footprint_lyr, output_fps)
-            arcpy.DeleteField_management(output_fps, demol_area)
-            arcpy.DeleteFeatures_management(footprint_lyr)
-            # arcpy.MakeFeatureLayer_management(mp_footprints, footprint_lyr)
-
-        # Find partially demolished portions of buildings
-        partial_demo = os.path.join(workspace, "partial_demo")
-        arcpy.Clip_analysis(no_bldg_poly, mp_footprints, partial_demo)
-        arcpy.Delete_management(no_bldg_poly)
-        partial_demo_sp = os.path.join(workspace, "partial_demo_sp")
-        arcpy.MultipartToSinglepart_management(partial_demo, partial_demo_sp)
-
-        # Select large demo areas
-        poly_min_area = m_min_area / (las_m_per_unit ** 2)
-        demo_area = get_area_field(partial_demo_sp)
-        partial_demo_lg = os.path.join(workspace, "partial_demo_lg")
-
-        arcpy.Select_analysis(partial_demo_sp, partial_demo_lg, "{0} > {1}".format(demo_area, str(poly_min_area)))
-
-        # remove slivers
-        partial_demo_shrink = os.path.join(workspace, "demo_shrink")
-        arcpy.Buffer_analysis(partial_demo_lg, partial_demo_shrink, "-" + cell_size)
-        partial_demo_grow = os.path.join(workspace, "demo_grow")
-        arcpy.Buffer_analysis(partial_demo_shrink, partial_demo_grow, cell_size)
-        demo_grow_lg = os.path.join(workspace, "demo_grow_lg")
-        arcpy.Select_analysis(partial_demo_grow, demo_grow_lg, "{0} > {1}".format(demo_area, str(poly_min_area)))
-        partial_demo_lyr = "partial_demo_lyr"
-        arcpy.MakeFeatureLayer_management(partial_demo_lg, partial_demo_lyr)
-        arcpy.SelectLayerByLocation_management(partial_demo_lyr, "INTERSECT", demo_grow_lg,
-                                               invert_spatial_relationship="INVERT")
-        if common_lib.get_fids_for_selection(partial_demo_lyr)[1] > 0:
-            arcpy.DeleteFeatures_management(partial_demo_lyr)
-
-        # Find new areas
-        arcpy.AddMessage("Checking for new structures")
-        new_bldg_area = Con(((ground_compare > 0) & (bldg_null == 1)), 1)
-        new_bldg_shrink = Shrink(new_bldg_area, 1, 1)
-        new_bldg_grow = Expand(new_bldg_shrink, 1, 1)
-        new_bldg_poly = os.path.join(workspace, "new_bldg_poly")
-        if new_bldg_grow.maximum == 1:
-            arcpy.RasterToPolygon_conversion(new_bldg_grow, new_bldg_poly, "NO_SIMPLIFY")
-            new_bldg_area_field = get_area_field(new_bldg_poly)
-
-            # Select new areas that do not intersect existing footprints
-            new_bldg_lyr = "new_bldg_lyr"
-            arcpy.MakeFeatureLayer_management(new_bldg_poly, new_bldg_lyr)
-            arcpy.SelectLayerByAttribute_management(new_bldg_lyr, "NEW_SELECTION",
-                                                    "{0} < {1}".format(new_bldg_area_field, str(poly_min_area)))
-            if common_lib.get_fids_for_selection(new_bldg_lyr)[1] > 0:
-                arcpy.DeleteFeatures_management(new_bldg_lyr)
-                arcpy.SelectLayerByAttribute_management(new_bldg_lyr, "CLEAR_SELECTION")
-
-            new_bldg_reg = os.path.join(workspace, "new_bldg_reg")
-            arcpy.SelectLayerByLocation_management(new_bldg_lyr, "INTERSECT", mp_footprints,
-                                                   invert_spatial_relationship="INVERT")
-
-            if common_lib.get_fids_for_selection(new_bldg_lyr)[1] > 0:
-                arcpy.AddMessage("{0} new structures detected"
-                                 .format(str(common_lib.get_fids_for_selection(new_bldg_lyr)[1])))
-                # Eliminate holes from new buildings
-                new_bldg_elim = os.path.join(workspace, "new_bldg_elim")
-                arcpy.EliminatePolygonPart_management(new_bldg_lyr, new_bldg_elim, "AREA", minimum_area,
-                                                      part_option="CONTAINED_ONLY")
-                # Regularize new footprints
-                arcpy.RegularizeBuildingFootprint_3d(new_bldg_elim, new_bldg_reg, 'RIGHT_ANGLES_AND_DIAGONALS',
-                                                     tolerance=(las_cell_size * 2))
-                arcpy.DeleteFeatures_management(new_bldg_lyr)
-                arcpy.AddField_management(new_bldg_reg, update_field, "TEXT")
-                arcpy.CalculateField_management(new_bldg_reg, update_field, "'New'")
-                new_bldg_append = os.path.join(gdb, "new_bldg_append")
-                arcpy.CopyFeatures_management(new_bldg_reg, new_bldg_append)
-                arcpy.Append_management(new_bldg_append, output_fps, "NO_TEST")
-                arcpy.Delete_management(new_bldg_append)
-
-        # Select all buildings that intersect new or demolished areas
-        arcpy.AddMessage("Checking for structures with changed extents")
-        if arcpy.Exists(new_bldg_poly):
-            arcpy.SelectLayerByLocation_management(footprint_lyr, "INTERSECT", new_bldg_poly)
-        if arcpy.Exists(partial_demo_lg):
-            arcpy.SelectLayerByLocation_management(footprint_lyr, "INTERSECT", partial_demo_lg,
-                                                   selection_type="ADD_TO_SELECTION")
-
-        if common_lib.get_fids_for_selection(footprint_lyr)[1] > 0:
-            arcpy.AddMessage("{0} structures with changed extents detected"
-                             .format(str(common_lib.get_fids_for_selection(footprint_lyr)[1])))
-            if replace_changes == "true":
-                arcpy.AddMessage("Replacing changed footprints")
-                change_fps = os.path.join(workspace, "change_fps")
-                arcpy.CopyFeatures_management(footprint_lyr, change_fps)
-                change_region = os.path.join(workspace, "change_region")
-                arcpy.CopyFeatures_management(footprint_lyr, change_region)
+            arcpy.env.mask = las_extent
+            arcpy.SelectLayerByLocation_management(mp_bldg_lyr, "INTERSECT", las_extent)
+        mp_m_per_unit = mp_spatial_ref.metersPerUnit
+        las_m_per_unit = las_spatial_ref.metersPerUnit
+
+        # Create multipatch footprints
+        mp_footprints = memory.path("mp_footprints")
+        arcpy.MultiPatchFootprint_3d(mp_bldg_lyr, mp_footprints)
+
+        if 6 in class_list:
+            # Add update status and IoU field
+            arcpy.AddFields_management(mp_footprints, [[update_field, "TEXT"], [iou_field, "FLOAT"]])
+
+            # Create output fc
+            out_path = os.path.dirname(output_fps)
+            out_name = os.path.basename(output_fps)
+            arcpy.CreateFeatureclass_management(out_path, out_name, "POLYGON", mp_footprints)
+
+            # Create building surface from the class sorted point sidecars of the LAS files, only the
+            # building rows are read (was LasDatasetToRaster 'BINNING MAXIMUM SIMPLE' on a class 6 layer).
+            # The sidecars are kept in the scratch folder and reused while the LAS files do not change.
+            # The surface covers the processing extent (AOI or LAS extent) only, its cells are aligned to the
+            # LAS dataset extent like those of LasDatasetToRaster.
+            arcpy.AddMessage("Creating las building surface")
+            las_files = common_lib.get_las_files(lasd)
+            if not las_files:
+                raise ValueError("No LAS files found in " + str(lasd))
+
+            las_cell_size = round(m_cell_size / las_m_per_unit)
+            extent = processing_extent(arcpy.env.mask)
+            snap = (las_desc.extent.XMin, las_desc.extent.YMax)
+            extent_files = [f for f in las_files
+                            if las_io.bounds_intersect(las_io.header_bounds(las_io.read_header(f)), extent)]
+            if not extent_files:
+                raise ValueError("No LAS files in the processing extent")
+
+            sidecars = point_cache.cached_sidecars(extent_files, os.path.join(arcpy.env.scratchFolder,
+                                                                              point_cache.CACHE_FOLDER))
+            bldg_grid, bldg_spec = point_cache.binning_surface(sidecars, las_cell_size, [6], "MAXIMUM",
+                                                               void_fill.SIMPLE,
+                                                               workers=parallel_lib.default_workers(),
+                                                               extent=extent, snap=snap)
+            las_bldg_ras = memory.path("las_bldg_ras")
+            common_lib.save_grid_as_raster(bldg_grid, bldg_spec, las_bldg_ras, las_spatial_ref)
+
+            # the ground surface gets the cells of the building surface, Con and Minus do not resample
+            arcpy.env.snapRaster = las_bldg_ras
+            arcpy.env.extent = las_bldg_ras
+            las_ground_ras = memory.path("las_ground_ras")
+            if 2 in class_list:
+                las_ground_layer = "las_ground_layer"
+                arcpy.MakeLasDatasetLayer_management(lasd, las_ground_layer, 2)
+                arcpy.LasDatasetToRaster_conversion(las_ground_layer, las_ground_ras, "ELEVATION",
+                                                    'BINNING MAXIMUM LINEAR',
+                                                    sampling_type='CELLSIZE',
+                                                    sampling_value=las_cell_size)
+            else:
+                # no ground classification, filter the ground points in-process (LAS files are not edited)
+                arcpy.AddMessage("No Ground (2) class codes found. Classifying ground points")
+                ground_options = ground_filter.ground_options(las_m_per_unit)
+                ground_grid, ground_spec = ground_filter.ground_surface(las_files, las_cell_size, ground_options,
+                                                                        extent=grid_lib.grid_extent(bldg_spec),
+                                                                        snap=(bldg_spec.x_min, bldg_spec.y_max))
+                common_lib.save_grid_as_raster(ground_grid, ground_spec, las_ground_ras, las_spatial_ref)
+
+            # convert vertical units to meter
+            bldg_ras = memory.path("bldg_ras")
+            ground_ras = memory.path("ground_ras")
+            if las_m_per_unit != 1:
+                arcpy.Times_3d(las_bldg_ras, las_m_per_unit, bldg_ras)
+                arcpy.Times_3d(las_ground_ras, las_m_per_unit, ground_ras)
+            else:
+                bldg_ras = las_bldg_ras
+                ground_ras = las_ground_ras
+
+            # Rasterize buildings
+            arcpy.AddMessage("Rasterizing 3D Buildings")
+            arcpy.env.snapRaster = bldg_ras
+            arcpy.env.cellSize = bldg_ras
+            mp_bldg_ras = memory.path("mp_bldg_ras")
+            arcpy.MultipatchToRaster_conversion(buildings, mp_bldg_ras)
+            mp_ras = memory.path("mp_ras")
+            if mp_m_per_unit != 1:
+                arcpy.Times_3d(mp_bldg_ras, mp_m_per_unit, mp_ras)
+            else:
+                mp_ras = mp_bldg_ras
+
+            # Combine building and ground rasters
+            las_bldg_null = IsNull(bldg_ras)
+            las_combined_ras = Con(las_bldg_null, ground_ras, bldg_ras, "VALUE = 1")
+
+            # Create comparison raster
+            arcpy.AddMessage("Creating comparison raster")
+            bldg_null_save = memory.path("bldgNull")
+            bldg_null = IsNull(mp_bldg_ras)
+            bldg_null.save(bldg_null_save)
+            combined_ras_save = memory.path("combined_ras")
+            combined_ras = Con(bldg_null, ground_ras, mp_ras, "VALUE = 1")
+            combined_ras.save(combined_ras_save)
+
+            # Subtract from reference raster
+            compare_ras_save = memory.path("compare_ras")
+            compare_ras = Minus(las_combined_ras, combined_ras)
+            abs_error = Abs(compare_ras)
+
+            # Compare las bldg raster to ground raster
+            ground_compare = Minus(las_combined_ras, ground_ras)
+
+            # Only the blocks with lidar or reference building cells plus a one block halo are processed
+            occupied, blocks = block_occupancy.raster_occupancy(bldg_ras, None)
+            block_occupancy.raster_occupancy(mp_bldg_ras, None, blocks=blocks, occupied=occupied)
+            regions = block_occupancy.region_extents(occupied, blocks)
+            fraction = block_occupancy.covered_fraction(regions, grid_lib.grid_extent(blocks))
+            arcpy.AddMessage("Found {0} regions with building cells ({1}% of the raster extent)"
+                             .format(len(regions), round(100 * fraction, 1)))
+            # many regions, or regions that cover most of the raster, run as one full extent pass
+            regions = block_occupancy.choose_regions(regions, fraction)
+            passes = "the full extent" if regions[0][0] is None else str(len(regions)) + " regions"
+
+            # Find area where no buildings exist in lidar
+            arcpy.AddMessage("Checking for demolished structures")
+            no_bldg_poly = scratch.path("no_bldg_poly")
+            with instrumentation.span("demolished_areas") as pass_span:
+                region_polys = []
+                for i, (region, boxes) in enumerate(regions):
+                    block_occupancy.set_extent(region)
+                    no_bldg_area = Con(ground_compare < 1, 1)
+                    region_poly = memory.path("no_bldg_poly_" + str(i))
+                    arcpy.RasterToPolygon_conversion(no_bldg_area, region_poly, "NO_SIMPLIFY")
+                    if len(boxes) > 1:
+                        # ground polygons reach into the boxes of other regions
+                        clipped = block_occupancy.clip_to_boxes(region_poly, boxes, region_poly + "_clip")
+                        arcpy.Delete_management(region_poly)
+                        region_poly = clipped
+                    region_polys.append(region_poly)
+                block_occupancy.set_extent(None)
+                block_occupancy.merge_regions(region_polys, no_bldg_poly)
+                pass_span.count(regions=len(regions))
+            arcpy.AddMessage(pass_span.message("Checked " + passes + " for demolished structures."))
+
+            # Select all mp footprints completely contained by no building area
+            footprint_lyr = memory.layer("fp_lyr")
+            arcpy.MakeFeatureLayer_management(mp_footprints, footprint_lyr)
+            arcpy.SelectLayerByLocation_management(footprint_lyr, "COMPLETELY_WITHIN", no_bldg_poly)
+
+            poly_min_area = m_min_area / (las_m_per_unit ** 2)
+            if common_lib.get_fids_for_selection(footprint_lyr)[1] > 0:
+                # TODO: check Dan
+                demol_area = get_area_field(mp_footprints)
+                arcpy.SelectLayerByAttribute_management(footprint_lyr, "REMOVE_FROM_SELECTION",
+                                                        "{0} < {1}".format(demol_area, str(poly_min_area)))
+
+                arcpy.AddMessage("{0} demolished structures found"
+                                 .format(str(common_lib.get_fids_for_selection(footprint_lyr)[1])))
+                arcpy.CalculateField_management(footprint_lyr, update_field, "'Demolished'")
+                arcpy.CopyFeatures_management(footprint_lyr, output_fps)
+                arcpy.DeleteField_management(output_fps, demol_area)
                 arcpy.DeleteFeatures_management(footprint_lyr)
-                if arcpy.Exists(new_bldg_poly):
-                    arcpy.Append_management(new_bldg_poly, change_region, "NO_TEST")
-                arcpy.env.mask = change_region
-                change_areas = Con((ground_compare > 1), 1)
-                # polygonize change areas
-                if change_areas.maximum > 0:
-                    change_poly = os.path.join(workspace, "change_poly")
-                    arcpy.RasterToPolygon_conversion(change_areas, change_poly)
-                    change_area_field = get_area_field(change_poly)
-                    change_poly_lyr = "change_poly_lyr"
-                    arcpy.MakeFeatureLayer_management(change_poly, change_poly_lyr)
-                    arcpy.SelectLayerByAttribute_management(change_poly_lyr, "NEW_SELECTION",
-                                                            "{0} > {1}".format(change_area_field, poly_min_area))
-                    if common_lib.get_fids_for_selection(change_poly_lyr)[1] > 0:
-                        change_poly_elim = os.path.join(workspace, "change_poly_elim")
-                        arcpy.EliminatePolygonPart_management(change_poly_lyr, change_poly_elim, "AREA", minimum_area,
-                                                              part_option="CONTAINED_ONLY")
-                        change_poly_reg = os.path.join(workspace, "change_poly_reg")
-                        arcpy.RegularizeBuildingFootprint_3d(change_poly_elim, change_poly_reg,
-                                                             'RIGHT_ANGLES_AND_DIAGONALS', tolerance=(las_cell_size * 2))
-                        arcpy.AddFields_management(change_poly_reg, [[update_field, "TEXT"], [iou_field, "FLOAT"]])
-                        arcpy.CalculateField_management(change_poly_reg, update_field, "'Changed_Extent'")
-                        change_poly_local = os.path.join(gdb, "change_poly_loc")
-                        arcpy.CopyFeatures_management(change_poly_reg, change_poly_local)
-                        # Calculate change poly id
-                        change_poly_oid = arcpy.Describe(change_poly_local).OIDFieldName
-                        join_field = "cp_id"
-                        arcpy.AddField_management(change_poly_local, join_field, "LONG")
-                        arcpy.CalculateField_management(change_poly_local, join_field, "!{0}!".format(change_poly_oid))
-                        # Spatial Join change poly id to change footprints
-                        change_fp_join = os.path.join(workspace, "change_fp_join")
-                        arcpy.SpatialJoin_analysis(change_fps, change_poly_local, change_fp_join, "JOIN_ONE_TO_MANY")
-                        arcpy.DeleteField_management(change_poly_local, join_field)
-                        # Intersect change poly with change fps
-                        change_poly_int = os.path.join(gdb, "change_poly_int")
-                        arcpy.Intersect_analysis([change_poly_local, change_fp_join], change_poly_int)
-                        # union change poly with change fps
-                        change_poly_union = os.path.join(gdb, "change_poly_union")
-                        arcpy.Union_analysis([change_poly_local, change_fp_join], change_poly_union)
-                        # Create dictionary of IoU
-                        int_area_dict = {}
-                        union_area_dict = {}
-                        iou_dict = {}
-                        area_field = get_area_field(change_poly_int)
-                        change_fid_field = "FID_change_poly_loc"
-                        with arcpy.da.SearchCursor(change_poly_int, [change_fid_field, area_field]) as i_cur:
-                            for row in i_cur:
-                                if row[0] not in int_area_dict.keys():
-                                    int_area_dict[row[0]] = row[1]
-                                else:
-                                    int_area_dict[row[0]] = int_area_dict[row[0]] + row[1]
-                        with arcpy.da.SearchCursor(change_poly_union, [change_fid_field, area_field, join_field]) as u_cur:
-                            for row in u_cur:
-                                fid = row[0]
-                                if fid == -1:
-                                    fid = row[2]
-                                if fid not in union_area_dict.keys():
-                                    union_area_dict[fid] = row[1]
-                                else:
-                                    union_area_dict[fid] = union_area_dict[fid] + row[1]
-
-                        for i in int_area_dict.keys():
-                            if i in union_area_dict.keys():
-                                iou = int_area_dict[i] / union_area_dict[i]
-                                iou_dict[i] = iou
-                        # Apply IoU values to change polys
-                        iou_limit = 0.9
-                        with arcpy.da.UpdateCursor(change_poly_local, [change_poly_oid, iou_field]) as u_cur:
-                            for row in u_cur:
-                                if row[0] in iou_dict.keys():
-                                    val = iou_dict[row[0]]
-                                    if val > iou_limit:
-                                        arcpy.AddMessage("Deleting feature: " + str(row[0]))
-                                        u_cur.deleteRow()
-                                    else:
+                # arcpy.MakeFeatureLayer_management(mp_footprints, footprint_lyr)
+
+            # Find partially demolished portions of buildings
+            partial_demo = memory.path("partial_demo")
+            arcpy.Clip_analysis(no_bldg_poly, mp_footprints, partial_demo)
+            arcpy.Delete_management(no_bldg_poly)
+            partial_demo_sp = memory.path("partial_demo_sp")
+            arcpy.MultipartToSinglepart_management(partial_demo, partial_demo_sp)
+
+            # Select large demo areas
+            poly_min_area = m_min_area / (las_m_per_unit ** 2)
+            demo_area = get_area_field(partial_demo_sp)
+            partial_demo_lg = memory.path("partial_demo_lg")
+
+            arcpy.Select_analysis(partial_demo_sp, partial_demo_lg, "{0} > {1}".format(demo_area, str(poly_min_area)))
+
+            # remove slivers, the buffer distance in the units of the LAS data
+            sliver_distance = m_cell_size / las_m_per_unit
+            partial_demo_shrink = memory.path("demo_shrink")
+            arcpy.Buffer_analysis(partial_demo_lg, partial_demo_shrink, -sliver_distance)
+            partial_demo_grow = memory.path("demo_grow")
+            arcpy.Buffer_analysis(partial_demo_shrink, partial_demo_grow, sliver_distance)
+            demo_grow_lg = memory.path("demo_grow_lg")
+            arcpy.Select_analysis(partial_demo_grow, demo_grow_lg, "{0} > {1}".format(demo_area, str(poly_min_area)))
+            partial_demo_lyr = memory.layer("partial_demo_lyr")
+            arcpy.MakeFeatureLayer_management(partial_demo_lg, partial_demo_lyr)
+            arcpy.SelectLayerByLocation_management(partial_demo_lyr, "INTERSECT", demo_grow_lg,
+                                                   invert_spatial_relationship="INVERT")
+            if common_lib.get_fids_for_selection(partial_demo_lyr)[1] > 0:
+                arcpy.DeleteFeatures_management(partial_demo_lyr)
+
+            # Find new areas
+            arcpy.AddMessage("Checking for new structures")
+            new_bldg_poly = memory.path("new_bldg_poly")
+            with instrumentation.span("new_areas") as pass_span:
+                region_polys = []
+                for i, (region, boxes) in enumerate(regions):
+                    block_occupancy.set_extent(region)
+                    new_bldg_area = Con(((ground_compare > 0) & (bldg_null == 1)), 1)
+                    new_bldg_shrink = Shrink(new_bldg_area, 1, 1)
+                    new_bldg_grow = Expand(new_bldg_shrink, 1, 1)
+                    if new_bldg_grow.maximum == 1:
+                        region_poly = memory.path("new_bldg_poly_" + str(i))
+                        arcpy.RasterToPolygon_conversion(new_bldg_grow, region_poly, "NO_SIMPLIFY")
+                        if len(boxes) > 1:
+                            block_occupancy.delete_outside(region_poly, boxes)
+                        region_polys.append(region_poly)
+                block_occupancy.set_extent(None)
+                pass_span.count(regions=len(regions))
+            arcpy.AddMessage(pass_span.message("Checked " + passes + " for new structures."))
+
+            if region_polys:
+                block_occupancy.merge_regions(region_polys, new_bldg_poly)
+                new_bldg_area_field = get_area_field(new_bldg_poly)
+
+                # Select new areas that do not intersect existing footprints
+                new_bldg_lyr = memory.layer("new_bldg_lyr")
+                arcpy.MakeFeatureLayer_management(new_bldg_poly, new_bldg_lyr)
+                arcpy.SelectLayerByAttribute_management(new_bldg_lyr, "NEW_SELECTION",
+                                                        "{0} < {1}".format(new_bldg_area_field, str(poly_min_area)))
+                if common_lib.get_fids_for_selection(new_bldg_lyr)[1] > 0:
+                    arcpy.DeleteFeatures_management(new_bldg_lyr)
+                    arcpy.SelectLayerByAttribute_management(new_bldg_lyr, "CLEAR_SELECTION")
+
+                new_bldg_reg = memory.path("new_bldg_reg")
+                arcpy.SelectLayerByLocation_management(new_bldg_lyr, "INTERSECT", mp_footprints,
+                                                       invert_spatial_relationship="INVERT")
+
+                if common_lib.get_fids_for_selection(new_bldg_lyr)[1] > 0:
+                    arcpy.AddMessage("{0} new structures detected"
+                                     .format(str(common_lib.get_fids_for_selection(new_bldg_lyr)[1])))
+                    # Eliminate holes from new buildings
+                    new_bldg_elim = memory.path("new_bldg_elim")
+                    arcpy.EliminatePolygonPart_management(new_bldg_lyr, new_bldg_elim, "AREA", minimum_area,
+                                                          part_option="CONTAINED_ONLY")
+                    # Regularize new footprints
+                    arcpy.RegularizeBuildingFootprint_3d(new_bldg_elim, new_bldg_reg, 'RIGHT_ANGLES_AND_DIAGONALS',
+                                                         tolerance=(las_cell_size * 2))
+                    arcpy.DeleteFeatures_management(new_bldg_lyr)
+                    arcpy.AddField_management(new_bldg_reg, update_field, "TEXT")
+                    arcpy.CalculateField_management(new_bldg_reg, update_field, "'New'")
+                    new_bldg_append = scratch.path("new_bldg_append")
+                    arcpy.CopyFeatures_management(new_bldg_reg, new_bldg_append)
+                    arcpy.Append_management(new_bldg_append, output_fps, "NO_TEST")
+                    arcpy.Delete_management(new_bldg_append)
+
+            # Select all buildings that intersect new or demolished areas
+            arcpy.AddMessage("Checking for structures with changed extents")
+            if arcpy.Exists(new_bldg_poly):
+                arcpy.SelectLayerByLocation_management(footprint_lyr, "INTERSECT", new_bldg_poly)
+            if arcpy.Exists(partial_demo_lg):
+                arcpy.SelectLayerByLocation_management(footprint_lyr, "INTERSECT", partial_demo_lg,
+                                                       selection_type="ADD_TO_SELECTION")
+
+            if common_lib.get_fids_for_selection(footprint_lyr)[1] > 0:
+                arcpy.AddMessage("{0} structures with changed extents detected"
+                                 .format(str(common_lib.get_fids_for_selection(footprint_lyr)[1])))
+                if replace_changes == "true":
+                    arcpy.AddMessage("Replacing changed footprints")
+                    change_fps = memory.path("change_fps")
+                    arcpy.CopyFeatures_management(footprint_lyr, change_fps)
+                    change_region = memory.path("change_region")
+                    arcpy.CopyFeatures_management(footprint_lyr, change_region)
+                    arcpy.DeleteFeatures_management(footprint_lyr)
+                    if arcpy.Exists(new_bldg_poly):
+                        arcpy.Append_management(new_bldg_poly, change_region, "NO_TEST")
+                    arcpy.env.mask = change_region
+                    change_areas = Con((ground_compare > 1), 1)
+                    # polygonize change areas
+                    if change_areas.maximum > 0:
+                        change_poly = memory.path("change_poly")
+                        arcpy.RasterToPolygon_conversion(change_areas, change_poly)
+                        change_area_field = get_area_field(change_poly)
+                        change_poly_lyr = memory.layer("change_poly_lyr")
+                        arcpy.MakeFeatureLayer_management(change_poly, change_poly_lyr)
+                        arcpy.SelectLayerByAttribute_management(change_poly_lyr, "NEW_SELECTION",
+                                                                "{0} > {1}".format(change_area_field, poly_min_area))
+                        if common_lib.get_fids_for_selection(change_poly_lyr)[1] > 0:
+                            change_poly_elim = memory.path("change_poly_elim")
+                            arcpy.EliminatePolygonPart_management(change_poly_lyr, change_poly_elim, "AREA", minimum_area,
+                                                                  part_option="CONTAINED_ONLY")
+                            change_poly_reg = memory.path("change_poly_reg")
+                            arcpy.RegularizeBuildingFootprint_3d(change_poly_elim, change_poly_reg,
+                                                                 'RIGHT_ANGLES_AND_DIAGONALS', tolerance=(las_cell_size * 2))
+                            arcpy.AddFields_management(change_poly_reg, [[update_field, "TEXT"], [iou_field, "FLOAT"]])
+                            arcpy.CalculateField_management(change_poly_reg, update_field, "'Changed_Extent'")
+                            change_poly_local = scratch.path("change_poly_loc")
+                            arcpy.CopyFeatures_management(change_poly_reg, change_poly_local)
+                            # Calculate change poly id
+                            change_poly_oid = arcpy.Describe(change_poly_local).OIDFieldName
+                            join_field = "cp_id"
+                            arcpy.AddField_management(change_poly_local, join_field, "LONG")
+                            arcpy.CalculateField_management(change_poly_local, join_field, "!{0}!".format(change_poly_oid))
+                            # Spatial Join change poly id to change footprints
+                            change_fp_join = memory.path("change_fp_join")
+                            arcpy.SpatialJoin_analysis(change_fps, change_poly_local, change_fp_join, "JOIN_ONE_TO_MANY")
+                            arcpy.DeleteField_management(change_poly_local, join_field)
+                            # Intersect change poly with change fps
+                            change_poly_int = scratch.path("change_poly_int")
+                            arcpy.Intersect_analysis([change_poly_local, change_fp_join], change_poly_int)
+                            # union change poly with change fps
+                            change_poly_union = scratch.path("change_poly_union")
+                            arcpy.Union_analysis([change_poly_local, change_fp_join], change_poly_union)
+                            # Create dictionary of IoU
+                            area_field = get_area_field(change_poly_int)
+                            change_fid_field = "FID_change_poly_loc"
+                            with arcpy.da.SearchCursor(change_poly_int, [change_fid_field, area_field]) as i_cur:
+                                int_area_dict = overlay_lib.sum_areas_by_id(i_cur)
+                            with arcpy.da.SearchCursor(change_poly_union, [change_fid_field, area_field, join_field]) as u_cur:
+                                # union pieces outside the change poly belong to it through the join field
+                                union_area_dict = overlay_lib.sum_areas_by_id((row[2] if row[0] == -1 else row[0], row[1])
+                                                                              for row in u_cur)
+                            iou_dict = overlay_lib.iou_by_id(int_area_dict, union_area_dict)
+                            # Apply IoU values to change polys
+                            iou_limit = 0.9
+                            common_lib.delete_rows_by_ids(change_poly_local, change_poly_oid,
+                                                          [fid for fid, val in iou_dict.items() if val > iou_limit])
+                            with arcpy.da.UpdateCursor(change_poly_local, [change_poly_oid, iou_field]) as u_cur:
+                                for row in u_cur:
+                                    val = iou_dict.get(row[0])
+                                    if val is not None:
                                         row[1] = val
                                         u_cur.updateRow(row)
 
 
 
-                        arcpy.Append_management(change_poly_local, output_fps, "NO_TEST")
-                        arcpy.Delete_management(change_poly_local)
-                        arcpy.Delete_management(change_poly_int)
-                        arcpy.Delete_management(change_poly_union)
-            else:
-                arcpy.CalculateField_management(footprint_lyr, update_field, "'Changed_Extent'")
-                change_poly_local = os.path.join(gdb, "change_poly_loc")
-                arcpy.CopyFeatures_management(footprint_lyr, change_poly_local)
-                arcpy.Append_management(change_poly_local, output_fps, "NO_TEST")
-                arcpy.DeleteFeatures_management(footprint_lyr)
-                arcpy.Delete_management(change_poly_local)
-
-        # Identify remaining footprints that fall outside of accuracy tolerance
-        # Extract to building footprints
-        arcpy.AddMessage("Determining RMSE of remaining footprints")
-        mse_avg = ZonalStatistics(mp_footprints, fp_oid, abs_error, "MEAN")
-
-        rmse_field = "RMSE_new"
-        rmse_id = "RMSE_id"
-        if common_lib.field_exist(mp_footprints, rmse_field):
-            arcpy.DeleteField_management(mp_footprints, rmse_field)
-        if common_lib.field_exist(mp_footprints, rmse_id):
+                            arcpy.Append_management(change_poly_local, output_fps, "NO_TEST")
+                            arcpy.Delete_management(change_poly_local)
+                            arcpy.Delete_management(change_poly_int)
+                            arcpy.Delete_management(change_poly_union)
+                else:
+                    arcpy.CalculateField_management(footprint_lyr, update_field, "'Changed_Extent'")
+                    change_poly_local = scratch.path("change_poly_loc")
+                    arcpy.CopyFeatures_management(footprint_lyr, change_poly_local)
+                    arcpy.Append_management(change_poly_local, output_fps, "NO_TEST")
+                    arcpy.DeleteFeatures_management(footprint_lyr)
+                    arcpy.Delete_management(change_poly_local)
+
+            # Identify remaining footprints that fall outside of accuracy tolerance
+            # Extract to building footprints
+            arcpy.AddMessage("Determining RMSE of remaining footprints")
+            rmse_field = "RMSE_new"
+            rmse_id = "RMSE_id"
+            if common_lib.field_exist(mp_footprints, rmse_field):
+                arcpy.DeleteField_management(mp_footprints, rmse_field)
+            field_engine.calculate_fields(mp_footprints, [], {rmse_id: ("LONG", field_engine.copy_oid)})
+
+            # Mean error per footprint, region by region. A footprint is taken from the region that holds it.
+            label_points = {}
+            with arcpy.da.SearchCursor(mp_footprints, [rmse_id, "SHAPE@"]) as cursor:
+                for row in cursor:
+                    label_points[row[0]] = row[1].labelPoint
+            rmse_values = {}
+            with instrumentation.span("footprint_error") as pass_span:
+                for i, (region, boxes) in enumerate(regions):
+                    block_occupancy.set_extent(region)
+                    zonal_table = memory.path("zonal_mean_" + str(i))
+                    ZonalStatisticsAsTable(mp_footprints, rmse_id, abs_error, zonal_table, "DATA", "MEAN")
+                    with arcpy.da.SearchCursor(zonal_table, [rmse_id, "MEAN"]) as cursor:
+                        for row in cursor:
+                            point = label_points.get(row[0])
+                            if len(boxes) <= 1 or (point and block_occupancy.inside_boxes(point.X, point.Y, boxes)):
+                                rmse_values[row[0]] = row[1]
+                    arcpy.Delete_management(zonal_table)
+                block_occupancy.set_extent(None)
+                pass_span.count(regions=len(regions))
+            arcpy.AddMessage(pass_span.message("Computed the footprint error over " + passes + "."))
+
+            arcpy.AddField_management(mp_footprints, rmse_field, "FLOAT")
+            with arcpy.da.UpdateCursor(mp_footprints, [rmse_id, rmse_field]) as cursor:
+                for row in cursor:
+                    if row[0] in rmse_values:
+                        row[1] = rmse_values[row[0]]
+                        cursor.updateRow(row)
             arcpy.DeleteField_management(mp_footprints, rmse_id)
-        arcpy.AddField_management(mp_footprints, rmse_id, "LONG")
-        arcpy.CalculateField_management(mp_footprints, rmse_id, "!{0}!".format(fp_oid))
-
-        fp_points = os.path.join(workspace, "fp_points")
-        arcpy.FeatureToPoint_management(mp_footprints, fp_points, "INSIDE")
 
-        rmse_points = os.path.join(workspace, "rmse_points")
-        arcpy.sa.ExtractValuesToPoints(fp_points, mse_avg, rmse_points, "NONE", "VALUE_ONLY")
-
-        arcpy.AddField_management(rmse_points, rmse_field, "FLOAT")
-        arcpy.CalculateField_management(rmse_points, rmse_field, "!RASTERVALU!", "PYTHON_9.3", None)
-
-        arcpy.JoinField_management(mp_footprints, rmse_id, rmse_points, rmse_id, rmse_field)
-        arcpy.DeleteField_management(mp_footprints, rmse_id)
+            # Select buildings with error above threshold and append to output
+            arcpy.SelectLayerByAttribute_management(footprint_lyr, "NEW_SELECTION",
+                                                    "{0} > {1}".format(rmse_field, str(m_threshold)))
+
+            if common_lib.get_fids_for_selection(footprint_lyr)[1] > 0:
+                arcpy.AddMessage("{0} footprints found with RMSE outside threshold parameter"
+                                 .format(str(common_lib.get_fids_for_selection(footprint_lyr)[1])))
+                arcpy.CalculateField_management(footprint_lyr, update_field, "'Changed_Vertical'")
+                change_vert = scratch.path("changed_vertical")
+                arcpy.CopyFeatures_management(footprint_lyr, change_vert)
+                arcpy.Append_management(change_vert, output_fps, "NO_TEST")
+                arcpy.Delete_management(change_vert)
+            else:
+                arcpy.AddMessage("No remaining footprints found with RMSE outside threshold")
+        else:
 
-        # Select buildings with error above threshold and append to output
-        arcpy.SelectLayerByAttribute_management(footprint_lyr, "NEW_SELECTION",
-                                                "{0} > {1}".format(rmse_field, str(m_threshold)))
+            arcpy.AddError("Input LAS Dataset must contain Building (6) class codes.")
+            # omitClassCodes = [7, 12, 13, 14, 15, 16, 18]
+            # filter_list = []
+            # for row in class_list:
+            #     if row not in omitClassCodes:
+            #         filter_list.append(row)
+            #
+            # las_lyr = "las_lyr"
+            # arcpy.MakeLasDatasetLayer_management(lasd, las_lyr, filter_list)
+            #
+            # mp_cell_size = round(m_cell_size / mp_m_per_unit)
+            #
+            # # Rasterize buildings
+            # arcpy.AddMessage("Rasterizing 3D Buildings")
+            # mp_bldg_ras = os.path.join(workspace, "bldg_ras")
+            # arcpy.MultipatchToRaster_conversion(buildings, mp_bldg_ras)
+            # mp_ras = os.path.join(workspace, "mp_ras")
+            # if mp_m_per_unit != 1:
+            #     arcpy.Times_3d(mp_bldg_ras, mp_m_per_unit, mp_ras)
+            # else:
+            #     mp_ras = mp_bldg_ras
+            #
+            # arcpy.env.snapRaster = mp_ras
+            # arcpy.env.cellSize = mp_ras
+            # arcpy.env.mask = mp_ras
+            #
+            # arcpy.AddMessage("Creating lidar surface")
+            # las_bldg_ras = os.path.join(workspace, "las_bldg_ras")
+            # arcpy.LasDatasetToRaster_conversion(las_lyr, las_bldg_ras, "ELEVATION", 'BINNING MAXIMUM LINEAR')
+            #
+            # # convert vertical units to meter
+            # bldg_ras = os.path.join(workspace, "bldg_ras")
+            # if las_m_per_unit != 1:
+            #     arcpy.Times_3d(las_bldg_ras, las_m_per_unit, bldg_ras)
+            # else:
+            #     bldg_ras = las_bldg_ras
+            #
+            # # Subtract from reference raster
+            # arcpy.AddMessage("Comparing surfaces")
+            # compare_ras_save = os.path.join(workspace, "compare_ras")
+            # compare_ras = Minus(bldg_ras, mp_ras)
+            # compare_ras.save(compare_ras_save)
+            #
+            # # Square the result
+            # mse_ras = compare_ras * compare_ras
+            #
+            # # Exract to building footprints
+            # arcpy.AddMessage("Determining RMSE")
+            # mse_avg = ZonalStatistics(mp_footprints, fp_oid, mse_ras, "MEAN")
+            # rmse_id = "RMSE_id"
+            # if common_lib.field_exist(mp_footprints, rmse_id):
+            #     arcpy.DeleteField_management(mp_footprints, rmse_id)
+            # arcpy.AddField_management(mp_footprints, rmse_id, "LONG")
+            # arcpy.CalculateField_management(mp_footprints, rmse_id, "!{0}!".format(fp_oid))
+            #
+            # fp_points = os.path.join(workspace, "fp_points")
+            # arcpy.FeatureToPoint_management(mp_footprints, fp_points, "INSIDE")
+            #
+            # rmse_points = os.path.join(workspace, "rmse_points")
+            # arcpy.sa.ExtractValuesToPoints(fp_points, mse_avg, rmse_points, "NONE", "VALUE_ONLY")
+            #
+            # rmse_field = "RMSE_new"
+            # arcpy.AddField_management(rmse_points, rmse_field, "FLOAT")
+            # arcpy.CalculateField_management(rmse_points, rmse_field, "math.sqrt(!RASTERVALU!)", "PYTHON_9.3", None)
+            #
+            # if common_lib.field_exist(mp_footprints, rmse_field):
+            #     arcpy.DeleteField_management(mp_footprints, rmse_field)
+            #
+            # arcpy.JoinField_management(mp_footprints, rmse_id, rmse_points, rmse_id, rmse_field)
+            # arcpy.DeleteField_management(mp_footprints, rmse_id)
+            #
+            # # Select footprints outside threshold
+            # arcpy.Select_analysis(mp_footprints, output_fps, "{0} > {1}".format(rmse_field, str(m_threshold)))
+
+        if arcpy.Exists(aoi_proj):
+            arcpy.Delete_management(aoi_proj)
+
+
+    except arcpy.ExecuteWarning:
+        print(arcpy.GetMessages(1))
+        arcpy.AddWarning(arcpy.GetMessages(1))
+
+    except NoChange:
+        arcpy.AddWarning("No areas of change detected. Ensure the vertical tolerance and minimum area thresholds are within"
+                         " your requirements")
 
-        if common_lib.get_fids_for_selection(footprint_lyr)[1] > 0:
-            arcpy.AddMessage("{0} footprints found with RMSE outside threshold parameter"
-                             .format(str(common_lib.get_fids_for_selection(footprint_lyr)[1])))
-            arcpy.CalculateField_management(footprint_lyr, update_field, "'Changed_Vertical'")
-            change_vert = os.path.join(gdb, "changed_vertical")
-            arcpy.CopyFeatures_management(footprint_lyr, change_vert)
-            arcpy.Append_management(change_vert, output_fps, "NO_TEST")
-            arcpy.Delete_management(change_vert)
-        else:
-            arcpy.AddMessage("No remaining footprints found with RMSE outside threshold")
-    else:
+    except arcpy.ExecuteError:
+        print(arcpy.GetMessages(2))
+        arcpy.AddError(arcpy.GetMessages(2))
 
-        arcpy.AddError("Input LAS Dataset must contain both Ground (2), and Building (6) class codes.")
-        # omitClassCodes = [7, 12, 13, 14, 15, 16, 18]
-        # filter_list = []
-        # for row in class_list:
-        #     if row not in omitClassCodes:
-        #         filter_list.append(row)
-        #
-        # las_lyr = "las_lyr"
-        # arcpy.MakeLasDatasetLayer_management(lasd, las_lyr, filter_list)
-        #
-        # mp_cell_size = round(m_cell_size / mp_m_per_unit)
-        #
-        # # Rasterize buildings
-        # arcpy.AddMessage("Rasterizing 3D Buildings")
-        # mp_bldg_ras = os.path.join(workspace, "bldg_ras")
-        # arcpy.MultipatchToRaster_conversion(buildings, mp_bldg_ras)
-        # mp_ras = os.path.join(workspace, "mp_ras")
-        # if mp_m_per_unit != 1:
-        #     arcpy.Times_3d(mp_bldg_ras, mp_m_per_unit, mp_ras)
-        # else:
-        #     mp_ras = mp_bldg_ras
-        #
-        # arcpy.env.snapRaster = mp_ras
-        # arcpy.env.cellSize = mp_ras
-        # arcpy.env.mask = mp_ras
+    # Return any other type of error
+    except:
+        # By default any other errors will be caught here
         #
-        # arcpy.AddMessage("Creating lidar surface")
-        # las_bldg_ras = os.path.join(workspace, "las_bldg_ras")
-        # arcpy.LasDatasetToRaster_conversion(las_lyr, las_bldg_ras, "ELEVATION", 'BINNING MAXIMUM LINEAR')
-        #
-        # # convert vertical units to meter
-        # bldg_ras = os.path.join(workspace, "bldg_ras")
-        # if las_m_per_unit != 1:
-        #     arcpy.Times_3d(las_bldg_ras, las_m_per_unit, bldg_ras)
-        # else:
-        #     bldg_ras = las_bldg_ras
-        #
-        # # Subtract from reference raster
-        # arcpy.AddMessage("Comparing surfaces")
-        # compare_ras_save = os.path.join(workspace, "compare_ras")
-        # compare_ras = Minus(bldg_ras, mp_ras)
-        # compare_ras.save(compare_ras_save)
-        #
-        # # Square the result
-        # mse_ras = compare_ras * compare_ras
-        #
-        # # Exract to building footprints
-        # arcpy.AddMessage("Determining RMSE")
-        # mse_avg = ZonalStatistics(mp_footprints, fp_oid, mse_ras, "MEAN")
-        # rmse_id = "RMSE_id"
-        # if common_lib.field_exist(mp_footprints, rmse_id):
-        #     arcpy.DeleteField_management(mp_footprints, rmse_id)
-        # arcpy.AddField_management(mp_footprints, rmse_id, "LONG")
-        # arcpy.CalculateField_management(mp_footprints, rmse_id, "!{0}!".format(fp_oid))
-        #
-        # fp_points = os.path.join(workspace, "fp_points")
-        # arcpy.FeatureToPoint_management(mp_footprints, fp_points, "INSIDE")
-        #
-        # rmse_points = os.path.join(workspace, "rmse_points")
-        # arcpy.sa.ExtractValuesToPoints(fp_points, mse_avg, rmse_points, "NONE", "VALUE_ONLY")
-        #
-        # rmse_field = "RMSE_new"
-        # arcpy.AddField_management(rmse_points, rmse_field, "FLOAT")
-        # arcpy.CalculateField_management(rmse_points, rmse_field, "math.sqrt(!RASTERVALU!)", "PYTHON_9.3", None)
-        #
-        # if common_lib.field_exist(mp_footprints, rmse_field):
-        #     arcpy.DeleteField_management(mp_footprints, rmse_field)
-        #
-        # arcpy.JoinField_management(mp_footprints, rmse_id, rmse_points, rmse_id, rmse_field)
-        # arcpy.DeleteField_management(mp_footprints, rmse_id)
-        #
-        # # Select footprints outside threshold
-        # arcpy.Select_analysis(mp_footprints, output_fps, "{0} > {1}".format(rmse_field, str(m_threshold)))
+        e = sys.exc_info()[1]
+        print(e.args[0])
+        arcpy.AddError(e.args[0])
 
-    if arcpy.Exists(aoi_proj):
-        arcpy.Delete_management(aoi_proj)
+    finally:
+        block_occupancy.set_extent(None)
+        for name, value in environment.items():
+            setattr(arcpy.env, name, value)
+        memory.close()
+        scratch.close()
 
 
-except arcpy.ExecuteWarning:
-    print(arcpy.GetMessages(1))
-    arcpy.AddWarning(arcpy.GetMessages(1))
+def main():
+    # Describe results cached by an earlier run in this Python session may be stale
+    common_lib.invalidate_describe()
+    detect_footprint_changes(*[arcpy.GetParameterAsText(i) for i in range(8)])
 
-except NoChange:
-    arcpy.AddWarning("No areas of change detected. Ensure the vertical tolerance and minimum area thresholds are within"
-                     " your requirements")
 
-except arcpy.ExecuteError:
-    print(arcpy.GetMessages(2))
-    arcpy.AddError(arcpy.GetMessages(2))
+if __name__ == '__main__':
 
-# Return any other type of error
-except:
-    # By default any other errors will be caught here
-    #
-    e = sys.exc_info()[1]
-    print(e.args[0])
-    arcpy.AddError(e.args[0])
+    main()
@@ -15,21 +15,63 @@
 
 # -------------------------------------------------------------------------------
 
-import arcpy
 import sys
 import time
-import importlib
 
 import common_lib
-if 'common_lib' in sys.modules:
-    importlib.reload(common_lib)
 
 from common_lib import create_msg_body, msg
+import ground_filter
+import noise_filter
+import units
+import void_fill
+import lazy_imports
+
+arcpy = lazy_imports.lazy_import("arcpy")
 
 # Constants
 WARNING = "warning"
 
 
+def create_ground_surface(lc_lasd, lc_dem, lc_cell_size):
+    # Ground surface for LAS files without Ground (2) class codes.
+    # The ground points are kept as in-memory masks, the LAS files are not edited.
+    las_files = common_lib.get_las_files(lc_lasd)
+    if not las_files:
+        return None
+
+    spatial_ref = arcpy.Describe(lc_lasd).spatialReference
+    options = ground_filter.ground_options(spatial_ref.metersPerUnit)
+
+    surface, spec = ground_filter.ground_surface(las_files, lc_cell_size, options)
+
+    return common_lib.save_grid_as_raster(surface, spec, lc_dem, spatial_ref)
+
+
+def get_height_value(height, unit):
+    # Linear unit text ('-2 Meters') or number (in the unit of the data) as a value in the unit of the data
+    return units.linear(height, unit).to_unit(unit)
+
+
+def get_extent_value(extent):
+    # Processing extent text ('x_min y_min x_max y_max ...') as a tuple, None for the default extent
+    try:
+        return tuple(float(v) for v in extent.split(' ')[:4])
+    except (ValueError, AttributeError):
+        return None
+
+
+def classify_noise(las_files, lc_dem, lc_minimum_height, lc_maximum_height, lc_processing_extent, unit, m_per_unit):
+    # Relative height noise classification against the ground surface, in-process.
+    # Returns {las_file: noise mask}, the LAS files are not edited.
+    dtm, spec = common_lib.read_raster_as_grid(lc_dem)
+    options = noise_filter.noise_options(get_height_value(lc_minimum_height, unit),
+                                         get_height_value(lc_maximum_height, unit), m_per_unit,
+                                         extent=get_extent_value(lc_processing_extent))
+
+    return noise_filter.classify_noise(las_files, spec, dtm, options)
+
+
 def extract(lc_lasd, lc_ws, lc_cell_size, lc_ground_buildings, lc_output_elevation, lc_minimum_height,
             lc_maximum_height, lc_processing_extent, lc_noise, lc_log_dir, lc_debug, lc_memory_switch):
 
@@ -58,18 +100,24 @@ def extract(lc_lasd, lc_ws, lc_cell_size, lc_ground_buildings, lc_output_elevati
 
         class_code_list = common_lib.get_las_class_codes(lc_lasd, lc_log_dir)
 
-        if lc_ground_buildings and 6 in class_code_list:
-            class_code_list = [2, 6]
-
         ground_code = 2
+        las_has_ground = ground_code in class_code_list
+
+        if lc_ground_buildings and 6 in class_code_list:
+            if las_has_ground:
+                class_code_list = [2, 6]
+            else:
+                msg_body = create_msg_body("Ground points are not classified in the LAS files. "
+                                           "Creating Surface Elevation from all class codes.", 0, 0)
+                msg(msg_body, WARNING)
 
         # Generate DEM
-        if ground_code in class_code_list:
-            dem = arcpy.CreateUniqueName(lc_output_elevation + "_dtm")
+        dem = arcpy.CreateUniqueName(lc_output_elevation + "_dtm")
 
-            if arcpy.Exists(dem):
-                arcpy.Delete_management(dem)
+        if arcpy.Exists(dem):
+            arcpy.Delete_management(dem)
 
+        if las_has_ground:
             msg_body = create_msg_body("Creating Ground Elevation using the following class codes: " +
                                    str(ground_code), 0, 0)
             msg(msg_body)
@@ -83,10 +131,16 @@ def extract(lc_lasd, lc_ws, lc_cell_size, lc_ground_buildings, lc_output_elevati
                                                 'BINNING MAXIMUM LINEAR',
                                                 sampling_type='CELLSIZE',
                                                 sampling_value=lc_cell_size)
+        else:
+            msg_body = create_msg_body("Couldn't detect ground class code in las dataset. "
+                                       "Classifying ground points with the progressive morphological filter...", 0, 0)
+            msg(msg_body, WARNING)
 
-            lc_max_neighbors = "#"
-            lc_step_width = "#"
-            lc_step_height = "#"
+            dem = create_ground_surface(lc_lasd, dem, lc_cell_size)
+
+        if dem:
+            noise_masks = None
+            las_files = None
 
             if lc_noise:
                 # Classify noise points
@@ -94,11 +148,16 @@ def extract(lc_lasd, lc_ws, lc_cell_size, lc_ground_buildings, lc_output_elevati
                                            lc_maximum_height + " above ground as noise.", 0, 0)
                 msg(msg_body)
 
-                arcpy.ClassifyLasNoise_3d(lc_lasd, method='RELATIVE_HEIGHT', edit_las='CLASSIFY',
-                                           withheld='WITHHELD', ground=dem,
-                                           low_z=lc_minimum_height, high_z=lc_maximum_height,
-                                           max_neighbors=lc_max_neighbors, step_width=lc_step_width, step_height=lc_step_height,
-                                           extent=lc_processing_extent)
+                # noise is kept as in-memory masks and left out of the surface, the LAS files are not edited
+                # (was arcpy.ClassifyLasNoise_3d RELATIVE_HEIGHT with CLASSIFY and WITHHELD)
+                las_files = common_lib.get_las_files(lc_lasd)
+                if las_files:
+                    noise_masks = classify_noise(las_files, dem, lc_minimum_height, lc_maximum_height,
+                                                 lc_processing_extent, unit, desc.spatialReference.metersPerUnit)
+
+                    noise_count = sum(int(mask.sum()) for mask in noise_masks.values())
+                    msg_body = create_msg_body("Found " + str(noise_count) + " noise points.", 0, 0)
+                    msg(msg_body)
             else:
                 # Classify noise points
                 msg_body = create_msg_body("Noise will not be classified.", 0, 0)
@@ -114,13 +173,21 @@ def extract(lc_lasd, lc_ws, lc_cell_size, lc_ground_buildings, lc_output_elevati
                                        str(class_code_list), 0, 0)
             msg(msg_body)
 
-            dsm_ld_layer = arcpy.CreateUniqueName('dsm_ld_lyr')
-            arcpy.management.MakeLasDatasetLayer(lc_lasd, dsm_ld_layer, class_code=class_code_list, return_values=["Last return"])
+            if noise_masks:
+                # same points as the LAS dataset layer below, without the noise points
+                surface, spec = void_fill.binning_surface_from_las(las_files, lc_cell_size, "MAXIMUM",
+                                                                   void_fill.LINEAR, class_codes=class_code_list,
+                                                                   last_return=True, exclude=noise_masks)
+                common_lib.save_grid_as_raster(surface, spec, dsm, desc.spatialReference)
+            else:
+                dsm_ld_layer = arcpy.CreateUniqueName('dsm_ld_lyr')
+                arcpy.management.MakeLasDatasetLayer(lc_lasd, dsm_ld_layer, class_code=class_code_list,
+                                                     return_values=["Last return"])
 
-            arcpy.conversion.LasDatasetToRaster(dsm_ld_layer, dsm, 'ELEVATION',
-                                                'BINNING MAXIMUM LINEAR',
-                                                sampling_type='CELLSIZE',
-                                                sampling_value=lc_cell_size)
+                arcpy.conversion.LasDatasetToRaster(dsm_ld_layer, dsm, 'ELEVATION',
+                                                    'BINNING MAXIMUM LINEAR',
+                                                    sampling_type='CELLSIZE',
+                                                    sampling_value=lc_cell_size)
 
             # create ndsm
             msg_body = create_msg_body("Creating normalized Surface Elevation using " +
@@ -135,7 +202,7 @@ def extract(lc_lasd, lc_ws, lc_cell_size, lc_ground_buildings, lc_output_elevati
 
             arcpy.Minus_3d(dsm, dem, ndsm)
         else:
-            msg_body = create_msg_body("Couldn't detect ground class code in las dataset. Exiting...", 0, 0)
+            msg_body = create_msg_body("Couldn't create a ground surface from the las dataset. Exiting...", 0, 0)
             msg(msg_body, WARNING)
 
         return dem, dsm, ndsm
@@ -0,0 +1,310 @@
+# -------------------------------------------------------------------------------
+# Name:        evaluate_footprints
+# Purpose:     Accuracy and throughput regression harness: runs the footprint pipeline on a synthetic city
+#              (see synthetic_city) and compares the footprints with the true buildings: per building IoU,
+#              boundary F-score and vertex count. The result can be saved as a baseline and later runs
+#              compared against it.
+#
+#              python evaluate_footprints.py --out result.json [--baseline baseline.json] [--save-baseline]
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+import benchmark
+import building_classifier
+import grid_lib
+import las_io
+import overlay_lib
+import synthetic_city
+import tile_stream
+
+# Constants, in meters
+EVAL_CELL_SIZE = 0.1              # raster resolution of the overlay of true and extracted footprints
+BOUNDARY_TOLERANCE = 1.0          # boundary points closer than this to the other boundary count as matched
+BOUNDARY_SPACING = 0.25           # boundaries are sampled at this spacing
+DETECTED_IOU = 0.5                # a true building with at least this IoU counts as detected
+RESULT_VERSION = 1
+
+# Allowed change against a baseline before a run counts as a regression
+MAX_IOU_LOSS = 0.01
+MAX_BOUNDARY_F_LOSS = 0.02
+MAX_RECALL_LOSS = 0.0
+MAX_THROUGHPUT_LOSS = 0.25        # fraction of the baseline points per second, timings are noisy
+
+
+def ring_bounds(rings):
+    outer = np.asarray(rings[0], dtype=np.float64)
+    return outer[:, 0].min(), outer[:, 1].min(), outer[:, 0].max(), outer[:, 1].max()
+
+
+def boundary_points(rings, spacing=BOUNDARY_SPACING):
+    # Points along all rings of a footprint, about spacing apart
+    points = []
+    for ring in rings:
+        ring = np.asarray(ring, dtype=np.float64)
+        for start, end in zip(ring[:-1], ring[1:]):
+            steps = max(1, int(np.ceil(np.hypot(*(end - start)) / spacing)))
+            t = np.arange(steps)[:, None] / steps
+            points.append(start + t * (end - start))
+
+    return np.vstack(points) if points else np.zeros((0, 2))
+
+
+def segments(rings_list):
+    # All ring segments of a list of footprints as (n, 2, 2)
+    out = [np.stack([np.asarray(r, dtype=np.float64)[:-1], np.asarray(r, dtype=np.float64)[1:]], axis=1)
+           for rings in rings_list for r in rings]
+    return np.concatenate(out) if out else np.zeros((0, 2, 2))
+
+
+def distance_to_segments(points, segs):
+    # Distance of every point to the nearest segment
+    if segs.shape[0] == 0:
+        return np.full(points.shape[0], np.inf)
+
+    start = segs[None, :, 0, :]
+    d = segs[None, :, 1, :] - start
+    length2 = (d ** 2).sum(axis=-1)
+    t = np.clip(((points[:, None, :] - start) * d).sum(axis=-1) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+    nearest = start + t[..., None] * d
+
+    return np.sqrt(((points[:, None, :] - nearest) ** 2).sum(axis=-1)).min(axis=1)
+
+
+def boundary_f_score(true_rings, found_rings_list, tolerance=BOUNDARY_TOLERANCE):
+    # F-score of the boundary samples of the true and the extracted footprints within tolerance
+    if not found_rings_list:
+        return 0.0
+
+    true_points = boundary_points(true_rings)
+    found_points = np.vstack([boundary_points(r) for r in found_rings_list])
+    recall = (distance_to_segments(true_points, segments(found_rings_list)) <= tolerance).mean()
+    precision = (distance_to_segments(found_points, segments([true_rings])) <= tolerance).mean()
+
+    return float(2 * precision * recall / (precision + recall)) if precision + recall else 0.0
+
+
+def vertex_count(rings):
+    return sum(len(ring) - 1 for ring in rings)
+
+
+def evaluate(truth, footprints, tolerance=BOUNDARY_TOLERANCE):
+    # Compares the extracted footprints ([[outer ring, holes...], ...] in map units) with the true buildings.
+    # Returns the per building records and the summary.
+    found_bounds = np.array([ring_bounds(f) for f in footprints]) if footprints else np.zeros((0, 4))
+    matched_found = np.zeros(len(footprints), dtype=bool)
+
+    intersection_rows = []
+    union_rows = []
+    records = []
+    for building in truth["buildings"]:
+        b_id = building["id"]
+        x_min, y_min, x_max, y_max = ring_bounds(building["rings"])
+        near = np.flatnonzero((found_bounds[:, 0] <= x_max) & (found_bounds[:, 2] >= x_min) &
+                              (found_bounds[:, 1] <= y_max) & (found_bounds[:, 3] >= y_min))
+
+        # overlay of the building and the nearby footprints on a fine grid around them
+        bounds = [x_min, y_min, x_max, y_max]
+        for n in near:
+            bounds = [min(bounds[0], found_bounds[n, 0]), min(bounds[1], found_bounds[n, 1]),
+                      max(bounds[2], found_bounds[n, 2]), max(bounds[3], found_bounds[n, 3])]
+        spec = grid_lib.grid_spec_from_extent(bounds[0], bounds[1], bounds[2], bounds[3], EVAL_CELL_SIZE)
+        true_mask = synthetic_city.rasterize_rings(spec, [building["rings"]]) > 0
+        found_labels = synthetic_city.rasterize_rings(spec, [footprints[n] for n in near], near + 1)
+
+        cell_area = EVAL_CELL_SIZE ** 2
+        overlapping = []
+        for n in near:
+            overlap = np.count_nonzero(true_mask & (found_labels == n + 1))
+            if overlap:
+                # the same pieces the Intersect of detect_footprint_changes gives
+                intersection_rows.append((b_id, overlap * cell_area))
+                overlapping.append(n)
+        matched_found[overlapping] = True
+        union = true_mask | np.isin(found_labels, np.array(overlapping) + 1)
+        union_rows.append((b_id, np.count_nonzero(union) * cell_area))
+
+        found_rings = [footprints[n] for n in overlapping]
+        records.append({"id": b_id, "shape": building["shape"], "area": round(building["area"], 2),
+                        "footprints": len(overlapping),
+                        "boundary_f": round(boundary_f_score(building["rings"], found_rings, tolerance), 4),
+                        "true_vertices": vertex_count(building["rings"]),
+                        "vertices": sum(vertex_count(r) for r in found_rings)})
+
+    iou = overlay_lib.iou_by_id(overlay_lib.sum_areas_by_id(intersection_rows),
+                               overlay_lib.sum_areas_by_id(union_rows))
+    for record in records:
+        record["iou"] = round(iou.get(record["id"], 0.0), 4)
+
+    return records, summarize(records, int((~matched_found).sum()))
+
+
+def summarize(records, false_positives):
+    ious = np.array([r["iou"] for r in records])
+    detected = int((ious >= DETECTED_IOU).sum())
+    summary = {"buildings": len(records),
+               "detected": detected,
+               "recall": round(detected / len(records), 4) if records else None,
+               "false_positives": false_positives,
+               "mean_iou": round(float(ious.mean()), 4) if records else None,
+               "median_iou": round(float(np.median(ious)), 4) if records else None,
+               "mean_boundary_f": round(float(np.mean([r["boundary_f"] for r in records])), 4) if records else None,
+               "true_vertices": sum(r["true_vertices"] for r in records),
+               "vertices": sum(r["vertices"] for r in records),
+               "by_shape": {}}
+    for shape in synthetic_city.SHAPES:
+        shape_ious = [r["iou"] for r in records if r["shape"] == shape]
+        if shape_ious:
+            summary["by_shape"][shape] = {"buildings": len(shape_ious), "mean_iou": round(float(np.mean(shape_ious)), 4)}
+
+    return summary
+
+
+def regularize(footprints, tolerance):
+    # Regularized footprints (RegularizeBuildingFootprint, RIGHT_ANGLES) as rings, None without arcpy
+    arcpy = benchmark._arcpy()
+    if arcpy is None:
+        return None
+
+    arcpy.env.overwriteOutput = True
+    arcpy.CheckOutExtension("3D")
+    spatial_reference = arcpy.SpatialReference(32613)
+    draft = "in_memory/evaluate_footprints"
+    regularized = "in_memory/evaluate_regularized"
+    with tile_stream.FootprintWriter(draft, spatial_reference, message=lambda text: None) as writer:
+        writer({"las_file": "", "footprints": footprints, "cut": 0})
+    arcpy.ddd.RegularizeBuildingFootprint(draft, regularized, "RIGHT_ANGLES", "{0} Meters".format(tolerance))
+
+    out = []
+    with arcpy.da.SearchCursor(regularized, ["SHAPE@"]) as cursor:
+        for row in cursor:
+            for part in row[0]:
+                # rings of a part are separated by None
+                rings, ring = [], []
+                for point in part:
+                    if point is None:
+                        rings.append(ring)
+                        ring = []
+                    else:
+                        ring.append([point.X, point.Y])
+                rings.append(ring)
+                out.append(rings)
+    for dataset in (draft, regularized):
+        arcpy.Delete_management(dataset)
+
+    return out
+
+
+def run_pipeline(truth, cell_size, min_area, workers):
+    # Draft footprints of the synthetic city through the tile stream. Returns the footprints and the throughput.
+    las_files = truth["las_files"]
+    options = building_classifier.building_options(benchmark.MIN_HEIGHT, benchmark.CLASSIFY_MIN_AREA, 1.0)
+    tiles = []
+    start_time = time.perf_counter()
+    stages = tile_stream.stream_footprints(las_files, tiles.append, options, cell_size, min_area, workers=workers)
+    seconds = time.perf_counter() - start_time
+
+    points = sum(las_io.read_header(f).point_count for f in las_files)
+    footprints = [parts for tile in sorted(tiles, key=lambda t: t["number"]) for parts in tile["footprints"]]
+    throughput = {"seconds": round(seconds, 4), "points_per_s": round(points / seconds, 1),
+                  "polygons_per_s": round(len(footprints) / seconds, 1), "stages": stages,
+                  "cut_footprints": sum(tile["cut"] for tile in tiles)}
+
+    return footprints, throughput
+
+
+def compare_to_baseline(result, baseline):
+    # Regressions of result against baseline, as messages. Empty when the run is as good as the baseline.
+    regressions = []
+    for output, values in result["outputs"].items():
+        base = baseline.get("outputs", {}).get(output)
+        if not base:
+            continue
+        now, before = values["summary"], base["summary"]
+        for key, loss in (("mean_iou", MAX_IOU_LOSS), ("mean_boundary_f", MAX_BOUNDARY_F_LOSS),
+                          ("recall", MAX_RECALL_LOSS)):
+            if now[key] is not None and before[key] is not None and now[key] < before[key] - loss - 1e-9:
+                regressions.append("{0} {1}: {2} < baseline {3}".format(output, key, now[key], before[key]))
+
+    now = result["throughput"]["points_per_s"]
+    before = baseline.get("throughput", {}).get("points_per_s")
+    if before and now < before * (1 - MAX_THROUGHPUT_LOSS):
+        regressions.append("points_per_s: {0} < baseline {1}".format(now, before))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Footprint accuracy and throughput against a synthetic city")
+    parser.add_argument("--out", help="JSON result file")
+    parser.add_argument("--folder", help="folder of the synthetic city, a temporary folder when not given")
+    parser.add_argument("--tiles", type=int, nargs=2, default=(2, 2), metavar=("X", "Y"))
+    parser.add_argument("--tile-size", type=float, default=synthetic_city.DEFAULT_TILE_SIZE)
+    parser.add_argument("--density", type=float, default=synthetic_city.DEFAULT_DENSITY, help="points per m2")
+    parser.add_argument("--seed", type=int, default=synthetic_city.DEFAULT_SEED)
+    parser.add_argument("--cell-size", type=float, default=benchmark.DEFAULT_CELL_SIZE)
+    parser.add_argument("--min-area", type=float, default=benchmark.DEFAULT_MIN_AREA)
+    parser.add_argument("--tolerance", type=float, default=BOUNDARY_TOLERANCE, help="boundary F-score tolerance")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="write the result to the --baseline file")
+    parser.add_argument("--buildings", action="store_true", help="include the per building records")
+    args = parser.parse_args()
+
+    folder = args.folder or tempfile.mkdtemp(prefix="building_evaluation_")
+    synthetic_city.generate_city(folder, args.tiles[0], args.tiles[1], args.tile_size, args.density, args.seed)
+    truth = synthetic_city.load_truth(folder)
+
+    footprints, throughput = run_pipeline(truth, args.cell_size, args.min_area, args.workers)
+    outputs = {"draft": footprints}
+    regularized = regularize(footprints, benchmark.REGULARIZE_TOLERANCE)
+    if regularized is not None:
+        outputs["regularized"] = regularized
+
+    result = {"version": RESULT_VERSION,
+              "dataset": {"tiles": len(truth["las_files"]), "tile_size": args.tile_size, "density": args.density,
+                          "seed": args.seed, "points": truth["point_count"], "buildings": len(truth["buildings"])},
+              "parameters": {"cell_size": args.cell_size, "min_area": args.min_area, "tolerance": args.tolerance,
+                             "workers": args.workers},
+              "environment": benchmark.environment(),
+              "throughput": throughput,
+              "outputs": {}}
+    for name, polygons in outputs.items():
+        records, summary = evaluate(truth, polygons, args.tolerance)
+        result["outputs"][name] = {"summary": summary}
+        if args.buildings:
+            result["outputs"][name]["buildings"] = records
+
+    regressions = []
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=1)
+    elif args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare_to_baseline(result, json.load(f))
+        result["regressions"] = regressions
+
+    text = json.dumps(result, indent=1)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
+
+    for regression in regressions:
+        print("Regression: " + regression, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
@@ -16,30 +16,22 @@
 # -------------------------------------------------------------------------------
 
 import arcpy
-import sys
-import importlib
 import elevation_from_las
 import os
 import re
-
-if 'elevation_from_las' in sys.modules:
-    importlib.reload(elevation_from_las)
 import common_lib
-if 'common_lib' in sys.modules:
-    importlib.reload(common_lib)  # force reload of the module
-import time
-from common_lib import create_msg_body, msg, trace
+import scratch_workspace
+import instrumentation
+from common_lib import msg, trace
 
 # debugging switches
 debugging = 0
 if debugging == 1:
     enableLogging = True
-    DeleteIntermediateData = False
     verbose = 1
     in_memory_switch = False
 else:
     enableLogging = False
-    DeleteIntermediateData = True
     verbose = 0
     in_memory_switch = False
 
@@ -111,6 +103,10 @@ class FunctionError(Exception):
 # ----------------------------Main Function---------------------------- #
 
 def main():
+    # Describe results cached by an earlier run in this Python session may be stale
+    common_lib.invalidate_describe()
+    scratch = None
+    span = None
     try:
         # Get Attributes from User
         if debugging == 0:
@@ -148,12 +144,13 @@ def main():
         if os.path.exists(layer_directory):
             common_lib.rename_file_extension(layer_directory, ".txt", ".lyrx")
 
-        ############# Create folders and intermediate gdb, if needed
-        scratch_ws = common_lib.create_gdb(home_directory, "Intermediate.gdb")
+        # scratch gdb of this run, deleted with the intermediate data when the tool ends
+        scratch = scratch_workspace.ScratchWorkspace(home_directory, TOOLNAME, keep=debugging == 1).open()
+        scratch_ws = scratch.workspace
         arcpy.env.workspace = scratch_ws
         arcpy.env.overwriteOutput = True
 
-        start_time = time.clock()
+        span = instrumentation.start_span("extract_elevation_from_las")
 
         # check if input exists
         if arcpy.Exists(input_las_dataset):
@@ -193,26 +190,15 @@ def main():
                         arcpy.SetParameter(11, output_layer2)
                         arcpy.SetParameter(12, output_layer3)
 
-                        end_time = time.clock()
-                        msg_body = create_msg_body("extract_elevation_from_las completed successfully.", start_time, end_time)
+                        span.end()
+                        msg_body = span.message("extract_elevation_from_las completed successfully.")
                         msg(msg_body)
                     else:
-                        end_time = time.clock()
-                        msg_body = create_msg_body("No elevation surfaces created. Exiting...", start_time, end_time)
+                        span.end()
+                        msg_body = span.message("No elevation surfaces created. Exiting...")
                         msg(msg_body, WARNING)
 
                 arcpy.ClearWorkspaceCache_management()
-
-                if DeleteIntermediateData:
-                    fcs = common_lib.listFcsInGDB(scratch_ws)
-
-                    msg_prefix = "Deleting intermediate data..."
-
-                    msg_body = common_lib.create_msg_body(msg_prefix, 0, 0)
-                    common_lib.msg(msg_body)
-
-                    for fc in fcs:
-                        arcpy.Delete_management(fc)
             else:
                 arcpy.AddError("Input data is not valid. Check your data.")
                 arcpy.AddMessage("Only projected coordinate systems are supported.")
@@ -276,6 +262,11 @@ def main():
         msg("with error message:  %s" % synerror, ERROR)
 
     finally:
+        if span is not None:
+            # a span that was not ended on a success path ended with an error
+            span.end("failed")
+        if scratch is not None:
+            scratch.close()
         arcpy.CheckInExtension("3D")
 
 if __name__ == '__main__':
@@ -0,0 +1,118 @@
+# -------------------------------------------------------------------------------
+# Name:        field_engine
+# Purpose:     Bulk attribute calculation: the input columns of a table are read once into NumPy arrays
+#              (arcpy.da.TableToNumPyArray), the derived fields are computed vectorized and written back in one
+#              arcpy.da.ExtendTable pass, instead of an AddField / CalculateField chain per field.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import numpy as np
+
+# Constants
+OID_TOKEN = "OID@"
+AREA_TOKEN = "SHAPE@AREA"
+LENGTH_TOKEN = "SHAPE@LENGTH"
+JOIN_FIELD = "_engine_oid"        # OIDs of the rows in the written array
+TEXT_LENGTH = 255
+
+# geodatabase field type: dtype of the column, ExtendTable adds the field with the matching type
+FIELD_DTYPES = {"SHORT": np.int16,
+                "LONG": np.int32,
+                "FLOAT": np.float32,
+                "DOUBLE": np.float64,
+                "DATE": "<M8[us]",
+                "TEXT": "<U{0}".format(TEXT_LENGTH)}
+
+
+class FieldEngineError(Exception):
+
+    """
+    Raised for an unknown field type or a derived column that does not have a value per row.
+    """
+
+    pass
+
+
+def derive_columns(columns, fields):
+    # Computes the derived fields from the input columns ({name: array}).
+    # fields: {field name: (field type, function(columns) -> array, or a value for every row)}
+    # Returns {field name: array of the dtype of the field type}.
+    n = len(columns[OID_TOKEN]) if OID_TOKEN in columns else len(next(iter(columns.values())))
+    derived = {}
+    for name, (field_type, value) in fields.items():
+        if field_type not in FIELD_DTYPES:
+            raise FieldEngineError("Unknown field type " + str(field_type) + " for field " + name + ".")
+        values = np.asarray(value(columns) if callable(value) else value)
+        if values.ndim == 0:
+            values = np.full(n, values)
+        if values.shape != (n,):
+            raise FieldEngineError("Field " + name + " has " + str(values.size) + " values for " + str(n) + " rows.")
+        derived[name] = values.astype(FIELD_DTYPES[field_type])
+
+    return derived
+
+
+def read_columns(table, fields, where_clause=None, null_value=None):
+    # The fields (names or tokens like SHAPE@AREA) and the OIDs of the rows of table as {name: array}
+    import arcpy
+
+    names = [OID_TOKEN] + [f for f in fields if f != OID_TOKEN]
+    array = arcpy.da.TableToNumPyArray(table, names, where_clause, null_value=null_value)
+
+    return {name: array[name] for name in array.dtype.names}
+
+
+def extend_table(table, oids, derived):
+    # Writes the derived columns to table in one pass, matched on the OIDs. Existing fields of the same name
+    # are replaced (see common_lib.delete_add_field).
+    import arcpy
+    import common_lib
+
+    if not derived:
+        return
+
+    catalog_path = common_lib.describe_dataset(table).catalog_path
+    existing = [f.name.lower() for f in arcpy.ListFields(catalog_path)]
+    replaced = [name for name in derived if name.lower() in existing]
+    if replaced:
+        arcpy.DeleteField_management(catalog_path, replaced)
+
+    dtype = [(JOIN_FIELD, np.int32)] + [(name, values.dtype) for name, values in derived.items()]
+    out = np.empty(len(oids), dtype=dtype)
+    out[JOIN_FIELD] = oids
+    for name, values in derived.items():
+        out[name] = values
+
+    oid_field = common_lib.describe_dataset(catalog_path).oid_field
+    arcpy.da.ExtendTable(catalog_path, oid_field, out, JOIN_FIELD)
+    if JOIN_FIELD.lower() in [f.name.lower() for f in arcpy.ListFields(catalog_path)]:
+        arcpy.DeleteField_management(catalog_path, JOIN_FIELD)
+
+
+def calculate_fields(table, inputs, fields, where_clause=None, null_value=None):
+    # Adds (or replaces) the fields of table: reads the input columns once, computes the fields
+    # ({field name: (field type, function(columns) or value)}, see derive_columns) and writes them in one pass.
+    # Returns the number of rows.
+    columns = read_columns(table, inputs, where_clause, null_value)
+    derived = derive_columns(columns, fields)
+    extend_table(table, columns[OID_TOKEN], derived)
+
+    return len(columns[OID_TOKEN])
+
+
+def copy_oid(columns):
+    return columns[OID_TOKEN]
+
+
+def shape_area(columns):
+    return columns[AREA_TOKEN]
+
+
+def compactness(columns):
+    # 4 pi area / perimeter^2, 1 for a circle
+    length = columns[LENGTH_TOKEN]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(length > 0, 4 * np.pi * columns[AREA_TOKEN] / length ** 2, 0.0)
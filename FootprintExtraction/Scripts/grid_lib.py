@@ -0,0 +1,292 @@
+# -------------------------------------------------------------------------------
+# Name:        grid_lib
+# Purpose:     Contains common functions for in-process point gridding and
+#              block-wise raster processing with NumPy
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+# Constants
+BINNING_METHODS = ("MAXIMUM", "MINIMUM", "AVERAGE", "COUNT")
+
+# Grid definition: upper left corner, square cell size and array shape.
+# Row 0 is the northern most row, same as arcpy.RasterToNumPyArray.
+GridSpec = namedtuple("GridSpec", ["x_min", "y_max", "cell_size", "n_rows", "n_cols"])
+
+
+def grid_spec_from_extent(x_min, y_min, x_max, y_max, cell_size):
+    n_cols = max(1, int(math.ceil((x_max - x_min) / cell_size)))
+    n_rows = max(1, int(math.ceil((y_max - y_min) / cell_size)))
+
+    # make sure the points on the max edges fall inside the grid
+    if x_min + n_cols * cell_size <= x_max:
+        n_cols += 1
+    if y_max - n_rows * cell_size >= y_min:
+        n_rows += 1
+
+    return GridSpec(float(x_min), float(y_max), float(cell_size), n_rows, n_cols)
+
+
+def snap_extent(x_min, y_min, x_max, y_max, cell_size, origin):
+    # Extent grown to whole cells of the grid that has a cell corner at origin (x, y), like the snapRaster
+    # environment. Grids of the snapped extents line up cell for cell.
+    x_min = origin[0] + math.floor((x_min - origin[0]) / cell_size) * cell_size
+    y_max = origin[1] + math.ceil((y_max - origin[1]) / cell_size) * cell_size
+
+    return x_min, y_min, x_max, y_max
+
+
+def grid_extent(spec):
+    return (spec.x_min, spec.y_max - spec.n_rows * spec.cell_size,
+            spec.x_min + spec.n_cols * spec.cell_size, spec.y_max)
+
+
+def window_spec(spec, bounds):
+    # Returns the GridSpec of the cells of spec that cover bounds (x_min, y_min, x_max, y_max),
+    # plus the row and column offset of that window in spec
+    col0 = max(int(math.floor((bounds[0] - spec.x_min) / spec.cell_size)), 0)
+    row0 = max(int(math.floor((spec.y_max - bounds[3]) / spec.cell_size)), 0)
+    col1 = min(int(math.floor((bounds[2] - spec.x_min) / spec.cell_size)) + 1, spec.n_cols)
+    row1 = min(int(math.floor((spec.y_max - bounds[1]) / spec.cell_size)) + 1, spec.n_rows)
+
+    window = GridSpec(spec.x_min + col0 * spec.cell_size, spec.y_max - row0 * spec.cell_size, spec.cell_size,
+                      max(row1 - row0, 0), max(col1 - col0, 0))
+
+    return window, row0, col0
+
+
+def cell_index(spec, x, y):
+    # Returns row, col and a mask of the coordinates that fall inside the grid
+    col = np.floor((np.asarray(x, dtype=np.float64) - spec.x_min) / spec.cell_size).astype(np.int64)
+    row = np.floor((spec.y_max - np.asarray(y, dtype=np.float64)) / spec.cell_size).astype(np.int64)
+    inside = (row >= 0) & (row < spec.n_rows) & (col >= 0) & (col < spec.n_cols)
+
+    return row, col, inside
+
+
+def cell_centers(spec, rows, cols):
+    x = spec.x_min + (np.asarray(cols) + 0.5) * spec.cell_size
+    y = spec.y_max - (np.asarray(rows) + 0.5) * spec.cell_size
+    return x, y
+
+
+def bin_points(spec, x, y, z, method="MAXIMUM", mask=None):
+    # Bins point values into the grid (LasDatasetToRaster BINNING equivalent).
+    # mask: optional boolean array, points where mask is True are excluded (e.g. noise).
+    # Empty cells are NaN, except for COUNT where they are 0.
+    if method not in BINNING_METHODS:
+        raise ValueError("Unsupported binning method: " + str(method))
+
+    row, col, inside = cell_index(spec, x, y)
+    if mask is not None:
+        inside &= ~np.asarray(mask, dtype=bool)
+
+    flat = row[inside] * spec.n_cols + col[inside]
+    size = spec.n_rows * spec.n_cols
+
+    if method == "COUNT":
+        return np.bincount(flat, minlength=size).reshape(spec.n_rows, spec.n_cols)
+
+    values = np.asarray(z, dtype=np.float64)[inside]
+
+    if method == "MAXIMUM":
+        out = np.full(size, -np.inf)
+        np.maximum.at(out, flat, values)
+    elif method == "MINIMUM":
+        out = np.full(size, np.inf)
+        np.minimum.at(out, flat, values)
+    else:
+        counts = np.bincount(flat, minlength=size)
+        sums = np.bincount(flat, weights=values, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = sums / counts
+
+    out[~np.isfinite(out)] = np.nan
+
+    return out.reshape(spec.n_rows, spec.n_cols)
+
+
+def iter_blocks(shape, block_size, halo=0):
+    # Yields (block_row, block_col, window, core, inner) for every block of a 2D array.
+    # window: slices of the block including halo (clipped to the array)
+    # core: slices of the block without halo
+    # inner: slices of the core relative to the window
+    n_b_rows = -(-shape[0] // block_size)
+    n_b_cols = -(-shape[1] // block_size)
+
+    for b_row in range(n_b_rows):
+        for b_col in range(n_b_cols):
+            window, core, inner = block_window(shape, block_size, b_row, b_col, halo)
+            yield b_row, b_col, window, core, inner
+
+
+def block_window(shape, block_size, b_row, b_col, halo=0):
+    # Same as iter_blocks, for a single block
+    n_rows, n_cols = shape[0], shape[1]
+    r0 = b_row * block_size
+    c0 = b_col * block_size
+    r1 = min(r0 + block_size, n_rows)
+    c1 = min(c0 + block_size, n_cols)
+    wr0 = max(r0 - halo, 0)
+    wr1 = min(r1 + halo, n_rows)
+    wc0 = max(c0 - halo, 0)
+    wc1 = min(c1 + halo, n_cols)
+
+    window = (slice(wr0, wr1), slice(wc0, wc1))
+    core = (slice(r0, r1), slice(c0, c1))
+    inner = (slice(r0 - wr0, r1 - wr0), slice(c0 - wc0, c1 - wc0))
+
+    return window, core, inner
+
+
+def block_any(mask, block_size):
+    # Reduces a boolean array to one flag per block (True if any cell in the block is True)
+    n_rows, n_cols = mask.shape
+    n_b_rows = -(-n_rows // block_size)
+    n_b_cols = -(-n_cols // block_size)
+
+    padded = np.zeros((n_b_rows * block_size, n_b_cols * block_size), dtype=bool)
+    padded[:n_rows, :n_cols] = mask
+
+    return padded.reshape(n_b_rows, block_size, n_b_cols, block_size).any(axis=(1, 3))
+
+
+def label_components(mask, connectivity=4):
+    # Labels the connected regions of a boolean array (1..n, 0 is background). Returns labels, n.
+    # Union find with min-label hooking and pointer jumping, vectorized over all cell pairs.
+    mask = np.asarray(mask, dtype=bool)
+    n_rows, n_cols = mask.shape
+    labels = np.zeros(mask.shape, dtype=np.int64)
+
+    cells = np.flatnonzero(mask)
+    if cells.size == 0:
+        return labels, 0
+
+    # compact ids for the cells in the mask
+    ids = np.full(mask.size, -1, dtype=np.int64)
+    ids[cells] = np.arange(cells.size)
+    ids = ids.reshape(mask.shape)
+
+    pairs = [(ids[:, :-1][mask[:, :-1] & mask[:, 1:]], ids[:, 1:][mask[:, :-1] & mask[:, 1:]]),
+             (ids[:-1, :][mask[:-1, :] & mask[1:, :]], ids[1:, :][mask[:-1, :] & mask[1:, :]])]
+    if connectivity == 8:
+        pairs.append((ids[:-1, :-1][mask[:-1, :-1] & mask[1:, 1:]], ids[1:, 1:][mask[:-1, :-1] & mask[1:, 1:]]))
+        pairs.append((ids[:-1, 1:][mask[:-1, 1:] & mask[1:, :-1]], ids[1:, :-1][mask[:-1, 1:] & mask[1:, :-1]]))
+
+    a = np.concatenate([p[0] for p in pairs])
+    b = np.concatenate([p[1] for p in pairs])
+    parent = np.arange(cells.size, dtype=np.int64)
+
+    while a.size:
+        root_a = parent[a]
+        root_b = parent[b]
+        differ = root_a != root_b
+        if not differ.any():
+            break
+
+        # keep only the pairs that are not yet joined
+        a = a[differ]
+        b = b[differ]
+        root_a = root_a[differ]
+        root_b = root_b[differ]
+
+        low = np.minimum(root_a, root_b)
+        np.minimum.at(parent, root_a, low)
+        np.minimum.at(parent, root_b, low)
+
+        # pointer jumping until every cell points at its root
+        while True:
+            grand_parent = parent[parent]
+            if np.array_equal(grand_parent, parent):
+                break
+            parent = grand_parent
+
+    roots, compact = np.unique(parent, return_inverse=True)
+    labels.ravel()[cells] = compact + 1
+
+    return labels, roots.size
+
+
+def sample_bilinear(spec, grid, x, y):
+    # Bilinear interpolation of grid values at the coordinates (cell values are at the cell centers).
+    # NaN corners are left out of the weighting, NaN is returned where all 4 corners are NaN.
+    # Coordinates outside the grid get the value of the nearest edge.
+    n_rows, n_cols = grid.shape
+    fx = (np.asarray(x, dtype=np.float64) - spec.x_min) / spec.cell_size - 0.5
+    fy = (spec.y_max - np.asarray(y, dtype=np.float64)) / spec.cell_size - 0.5
+    fx = np.clip(fx, 0, n_cols - 1)
+    fy = np.clip(fy, 0, n_rows - 1)
+
+    c0 = np.minimum(fx.astype(np.int64), max(n_cols - 2, 0))
+    r0 = np.minimum(fy.astype(np.int64), max(n_rows - 2, 0))
+    c1 = np.minimum(c0 + 1, n_cols - 1)
+    r1 = np.minimum(r0 + 1, n_rows - 1)
+    tx = fx - c0
+    ty = fy - r0
+
+    total = np.zeros(fx.shape)
+    weight = np.zeros(fx.shape)
+    for rows, cols, w in ((r0, c0, (1 - tx) * (1 - ty)), (r0, c1, tx * (1 - ty)),
+                          (r1, c0, (1 - tx) * ty), (r1, c1, tx * ty)):
+        values = grid[rows, cols]
+        valid = ~np.isnan(values)
+        total += np.where(valid, values * w, 0.0)
+        weight += np.where(valid, w, 0.0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = total / weight
+
+    out[weight == 0] = np.nan
+
+    return out
+
+
+def _running_extreme(a, size, axis, func, pad_value):
+    # van Herk / Gil-Werman running min or max over a centered window, O(n) independent of size
+    r = size // 2
+    a = np.moveaxis(a, axis, -1)
+    n = a.shape[-1]
+    n_blocks = -(-(n + 2 * r) // size)
+    total = n_blocks * size
+
+    padded = np.full(a.shape[:-1] + (total,), pad_value, dtype=a.dtype)
+    padded[..., r:r + n] = a
+    blocks = padded.reshape(a.shape[:-1] + (n_blocks, size))
+
+    forward = func.accumulate(blocks, axis=-1).reshape(padded.shape)
+    backward = func.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(padded.shape)
+
+    out = func(backward[..., 0:n], forward[..., size - 1:size - 1 + n])
+
+    return np.moveaxis(out, -1, axis)
+
+
+def min_filter(a, size):
+    # Square window minimum (erosion). NaN cells are ignored, windows with only NaN cells return NaN.
+    size = int(size) | 1
+    work = np.where(np.isnan(a), np.inf, a)
+    out = _running_extreme(_running_extreme(work, size, 0, np.minimum, np.inf), size, 1, np.minimum, np.inf)
+    out[np.isinf(out)] = np.nan
+
+    return out
+
+
+def max_filter(a, size):
+    # Square window maximum (dilation). NaN cells are ignored, windows with only NaN cells return NaN.
+    size = int(size) | 1
+    work = np.where(np.isnan(a), -np.inf, a)
+    out = _running_extreme(_running_extreme(work, size, 0, np.maximum, -np.inf), size, 1, np.maximum, -np.inf)
+    out[np.isinf(out)] = np.nan
+
+    return out
+
+
+def opening(a, size):
+    return max_filter(min_filter(a, size), size)
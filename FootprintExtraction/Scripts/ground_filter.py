@@ -0,0 +1,174 @@
+# -------------------------------------------------------------------------------
+# Name:        ground_filter
+# Purpose:     Progressive morphological ground filter (Zhang et al. 2003) on the gridded
+#              minimum surface, for LAS files without Ground (2) class codes
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import grid_lib
+import las_io
+import parallel_lib
+import void_fill
+
+# Constants, in meters. Use ground_options() to convert them to the units of the data.
+DEFAULT_SLOPE = 0.3               # maximum terrain slope (rise over run)
+DEFAULT_INITIAL_HEIGHT = 0.3      # elevation difference threshold for the smallest window
+DEFAULT_MAX_HEIGHT = 3.0          # elevation difference threshold cap
+DEFAULT_MAX_WINDOW = 40.0         # largest window, should exceed the size of the largest building
+DEFAULT_BLOCK_SIZE = 1024         # cells per block when filtering large grids
+
+
+def ground_options(m_per_unit, slope=DEFAULT_SLOPE, initial_height=DEFAULT_INITIAL_HEIGHT,
+                   max_height=DEFAULT_MAX_HEIGHT, max_window=DEFAULT_MAX_WINDOW):
+    # Converts the metric filter parameters to the xy/z units of the data
+    return {"slope": slope,
+            "initial_height": initial_height / m_per_unit,
+            "max_height": max_height / m_per_unit,
+            "max_window": max_window / m_per_unit}
+
+
+def window_sizes(cell_size, max_window):
+    # Exponentially growing windows: 3, 5, 9, 17, ... cells, up to max_window (in xy units)
+    sizes = []
+    k = 0
+    while True:
+        size = 2 * 2 ** k + 1
+        sizes.append(size)
+        if size * cell_size >= max_window:
+            break
+        k += 1
+
+    return sizes
+
+
+def halo_distance(cell_size, max_window):
+    # Reach of the opening sequence in xy units, every opening widens the area that affects a cell by
+    # size - 1 cells. Tiles and blocks are read with this halo so both sides of a seam see the same ground.
+    return sum(size - 1 for size in window_sizes(cell_size, max_window)) * cell_size
+
+
+def ground_cells(surface, cell_size, slope=DEFAULT_SLOPE, initial_height=DEFAULT_INITIAL_HEIGHT,
+                 max_height=DEFAULT_MAX_HEIGHT, max_window=DEFAULT_MAX_WINDOW, block_size=DEFAULT_BLOCK_SIZE,
+                 workers=1):
+    # Returns a boolean grid of the cells of the minimum surface that are ground.
+    # Large grids are filtered in blocks, the halo covers the reach of all openings.
+    sizes = window_sizes(cell_size, max_window)
+    halo = sum(size - 1 for size in sizes)
+
+    if max(surface.shape) <= block_size + 2 * halo:
+        return _pmf(surface, cell_size, sizes, slope, initial_height, max_height)
+
+    out = np.zeros(surface.shape, dtype=bool)
+    blocks = list(grid_lib.iter_blocks(surface.shape, block_size, halo))
+
+    def process(block):
+        _, _, window, core, inner = block
+        return core, _pmf(surface[window], cell_size, sizes, slope, initial_height, max_height)[inner]
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(process, blocks))
+    else:
+        results = [process(block) for block in blocks]
+
+    for core, values in results:
+        out[core] = values
+
+    return out
+
+
+def _pmf(surface, cell_size, sizes, slope, initial_height, max_height):
+    non_ground = np.zeros(surface.shape, dtype=bool)
+    current = surface
+
+    for k, size in enumerate(sizes):
+        opened = grid_lib.opening(current, size)
+
+        if k == 0:
+            threshold = initial_height
+        else:
+            threshold = min(slope * (size - sizes[k - 1]) * cell_size + initial_height, max_height)
+
+        with np.errstate(invalid="ignore"):
+            non_ground |= (current - opened) > threshold
+
+        current = opened
+
+    return ~non_ground & ~np.isnan(surface)
+
+
+def ground_surface_from_points(spec, x, y, z, options, fill_method=void_fill.LINEAR, workers=1):
+    # Minimum surface -> ground cells -> void filled ground surface
+    surface = grid_lib.bin_points(spec, x, y, z, "MINIMUM")
+    ground = ground_cells(surface, spec.cell_size, workers=workers, **options)
+
+    return void_fill.fill_voids(np.where(ground, surface, np.nan), method=fill_method, workers=workers)
+
+
+def classify_ground_tile(las_file, neighbour_files, cell_size, options, halo=None):
+    # Returns a boolean array with True for the ground points of las_file.
+    # Points of the neighbouring files within the reach of the openings (halo, see halo_distance) are added
+    # so the tile edges are filtered the same way as the tile interior.
+    if halo is None:
+        halo = halo_distance(cell_size, options["max_window"])
+    header = las_io.read_header(las_file)
+    bounds = las_io.header_bounds(header, halo)
+
+    x, y, z, index = las_io.read_xyz(las_file)
+    xs, ys, zs = [x], [y], [z]
+    for neighbour in neighbour_files:
+        nx, ny, nz, _ = las_io.read_xyz(neighbour, bounds)
+        xs.append(nx)
+        ys.append(ny)
+        zs.append(nz)
+
+    spec = grid_lib.grid_spec_from_extent(bounds[0], bounds[1], bounds[2], bounds[3], cell_size)
+    dtm = ground_surface_from_points(spec, np.concatenate(xs), np.concatenate(ys), np.concatenate(zs), options)
+
+    dz = z - grid_lib.sample_bilinear(spec, dtm, x, y)
+    with np.errstate(invalid="ignore"):
+        is_ground = (dz <= options["initial_height"]) & (dz >= -options["max_height"])
+
+    mask = np.zeros(header.point_count, dtype=bool)
+    mask[index] = is_ground
+
+    return mask
+
+
+def classify_ground(las_files, cell_size, options, workers=None):
+    # Tile parallel ground classification. Returns {las_file: ground mask} with the masks kept in memory.
+    headers = [las_io.read_header(f) for f in las_files]
+    halo = halo_distance(cell_size, options["max_window"])
+    tasks = []
+    for i, las_file in enumerate(las_files):
+        neighbours = [las_files[n] for n in las_io.find_neighbours(headers, i, halo)]
+        tasks.append((las_file, neighbours, cell_size, options, halo))
+
+    masks = parallel_lib.run_tasks(classify_ground_tile, tasks, workers)
+
+    return dict(zip(las_files, masks))
+
+
+def ground_surface(las_files, cell_size, options, masks=None, fill_method=void_fill.LINEAR, workers=None,
+                   extent=None, snap=None):
+    # Ground elevation surface over all files ('BINNING MAXIMUM LINEAR' of the ground points).
+    # extent, snap: see void_fill.binning_surface_from_tiles, only the files within the reach of the filter
+    # (see halo_distance) of the extent are classified.
+    # Returns the surface and its GridSpec.
+    if extent is not None:
+        halo = halo_distance(cell_size, options["max_window"])
+        reach = (extent[0] - halo, extent[1] - halo, extent[2] + halo, extent[3] + halo)
+        las_files = [f for f in las_files if las_io.bounds_intersect(las_io.header_bounds(las_io.read_header(f)),
+                                                                     reach)]
+    if masks is None:
+        masks = classify_ground(las_files, cell_size, options, workers)
+
+    return void_fill.binning_surface_from_las(las_files, cell_size, "MAXIMUM", fill_method, select=masks,
+                                              workers=workers or 1, extent=extent, snap=snap)
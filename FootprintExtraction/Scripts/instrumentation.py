@@ -0,0 +1,271 @@
+# -------------------------------------------------------------------------------
+# Name:        instrumentation
+# Purpose:     Nested timing spans for the stages and helper functions: wall and CPU time, peak memory growth
+#              and item counters (points, cells, polygons). Finished spans are written as JSON lines and
+#              summarized in a table at the end of a run.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import sys
+import json
+import math
+import time
+import functools
+import threading
+
+# Constants
+SUMMARY_COLUMNS = ("span", "calls", "seconds", "cpu_seconds", "rss_mb", "counters")
+PATH_SEPARATOR = "/"
+
+_local = threading.local()
+_lock = threading.Lock()
+_finished = []
+_output = None
+
+
+def peak_worker_rss():
+    # Peak resident memory in bytes of the largest finished child process (e.g. the workers of a process pool
+    # after its shutdown), None when it can not be read (Windows) or no child process has finished
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if not peak:
+        return None
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def peak_rss():
+    # Peak resident memory of this process in bytes, None when it can not be read
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (ImportError, AttributeError, OSError):
+        pass
+
+    return None
+
+
+def elapsed_text(seconds):
+    # "1 minute 5 seconds." / "2.35 seconds.", the wording of common_lib.create_msg_body
+    minutes = int(math.floor(seconds / 60))
+    if minutes > 0:
+        secs = int(round(seconds - 60 * minutes))
+        return str(minutes) + (" minute " if minutes == 1 else " minutes ") + str(secs) + \
+            (" second." if secs == 1 else " seconds.")
+
+    secs = round(seconds, 2)
+    return str(secs) + (" second." if secs == 1 else " seconds.")
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+class Span(object):
+
+    """
+    One timed section. Use span() as context manager, traced() as decorator, or start_span() / end()
+    where the section does not fit in one block (e.g. a try / finally).
+    """
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.counters = {}
+        self.parent = None
+        self.path = name
+        self.depth = 0
+        self.start_time = self.end_time = None
+        self.error = None
+
+    def start(self):
+        stack = _stack()
+        if stack:
+            self.parent = stack[-1]
+            self.path = self.parent.path + PATH_SEPARATOR + self.name
+            self.depth = self.parent.depth + 1
+        stack.append(self)
+
+        self.start_rss = peak_rss()
+        self.start_cpu = time.process_time()
+        self.start_time = time.perf_counter()
+        return self
+
+    def end(self, error=None):
+        # Records the span once, later calls return the same elapsed time
+        if self.end_time is not None:
+            return self.elapsed
+
+        self.end_time = time.perf_counter()
+        self.cpu_seconds = time.process_time() - self.start_cpu
+        end_rss = peak_rss()
+        # growth of the peak memory of the process while the span ran
+        self.rss_delta = end_rss - self.start_rss if end_rss is not None and self.start_rss is not None else None
+        self.error = error
+
+        stack = _stack()
+        if self in stack:
+            stack.remove(self)
+        _record(self)
+
+        return self.elapsed
+
+    @property
+    def elapsed(self):
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        return end_time - self.start_time
+
+    def count(self, **counters):
+        # Adds to the item counters of the span, e.g. span.count(points=n, cells=m)
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        return self
+
+    def message(self, msg_prefix=""):
+        # The message after a function ran: msg_prefix and the elapsed time
+        return (msg_prefix + "  Elapsed time: " if msg_prefix else "Elapsed time: ") + elapsed_text(self.elapsed)
+
+    def record(self):
+        return {"span": self.path, "name": self.name, "depth": self.depth,
+                "start": round(self.start_time, 6), "seconds": round(self.elapsed, 6),
+                "cpu_seconds": round(self.cpu_seconds, 6),
+                "rss_delta_mb": round(self.rss_delta / 2 ** 20, 3) if self.rss_delta is not None else None,
+                "counters": self.counters, "attributes": self.attributes, "error": self.error}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end(str(exc_value) if exc_type is not None else None)
+        return False
+
+
+def span(name, **attributes):
+    # with span("rasterize", tile=name) as s: ... s.count(cells=n)
+    return Span(name, **attributes)
+
+
+def start_span(name, **attributes):
+    return Span(name, **attributes).start()
+
+
+def current_span():
+    # The innermost open span of this thread, None outside of any span
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def count(**counters):
+    # Adds to the counters of the innermost open span, does nothing outside of a span
+    current = current_span()
+    if current is not None:
+        current.count(**counters)
+
+
+def traced(name=None):
+    # Decorator: every call of the function is a span (named after the function by default)
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(name or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def _record(finished):
+    with _lock:
+        _finished.append(finished)
+        if _output is not None:
+            _output.write(json.dumps(finished.record(), default=str) + "\n")
+            _output.flush()
+
+
+def set_output(path):
+    # Writes every finished span as a JSON line to path (appended), None stops writing
+    global _output
+    with _lock:
+        if _output is not None:
+            _output.close()
+        _output = open(path, "a") if path else None
+
+
+def reset():
+    # Forgets the finished spans, e.g. at the start of a tool run
+    with _lock:
+        del _finished[:]
+
+
+def summary():
+    # Finished spans per path, in the order they first started (a parent before its children):
+    # [{"span", "calls", "seconds", "cpu_seconds", "rss_mb", "counters"}]
+    rows = {}
+    first_start = {}
+    with _lock:
+        spans = list(_finished)
+    for finished in spans:
+        row = rows.setdefault(finished.path, {"span": finished.path, "calls": 0, "seconds": 0.0,
+                                              "cpu_seconds": 0.0, "rss_mb": 0.0, "counters": {}})
+        first_start[finished.path] = min(first_start.get(finished.path, finished.start_time), finished.start_time)
+        row["calls"] += 1
+        row["seconds"] += finished.elapsed
+        row["cpu_seconds"] += finished.cpu_seconds
+        if finished.rss_delta:
+            row["rss_mb"] += finished.rss_delta / 2 ** 20
+        for name, value in finished.counters.items():
+            row["counters"][name] = row["counters"].get(name, 0) + value
+
+    return sorted(rows.values(), key=lambda r: first_start[r["span"]])
+
+
+def summary_table():
+    # The summary as fixed width text lines, counters with their rate per second
+    lines = []
+    rows = summary()
+    if not rows:
+        return lines
+
+    width = max(len("span"), max(len(r["span"]) for r in rows))
+    lines.append("{0:<{w}} {1:>6} {2:>10} {3:>10} {4:>8}  {5}".format(*SUMMARY_COLUMNS, w=width))
+    for row in rows:
+        counters = ", ".join("{0} {1} ({2:.0f}/s)".format(name, value, value / row["seconds"] if row["seconds"] else 0)
+                             for name, value in sorted(row["counters"].items()))
+        lines.append("{0:<{w}} {1:>6} {2:>10.3f} {3:>10.3f} {4:>8.1f}  {5}".format(
+            row["span"], row["calls"], row["seconds"], row["cpu_seconds"], row["rss_mb"], counters, w=width))
+
+    return lines
+
+
+def report(message=print):
+    # Sends the summary table to message (e.g. arcpy.AddMessage)
+    for line in summary_table():
+        message(line)
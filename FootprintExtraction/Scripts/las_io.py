@@ -0,0 +1,181 @@
+# -------------------------------------------------------------------------------
+# Name:        las_io
+# Purpose:     Minimal LAS 1.0 - 1.4 reader using NumPy memory maps
+#              (uncompressed .las only)
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# Constants
+GROUND = 2
+BUILDING = 6
+LOW_NOISE = 7
+HIGH_NOISE = 18
+
+LasHeader = namedtuple("LasHeader", ["path", "version", "header_size", "offset_to_points", "number_of_vlrs",
+                                     "point_format", "record_length", "point_count", "scale", "offset",
+                                     "min", "max", "evlr_start", "number_of_evlrs"])
+
+
+class LasFormatError(Exception):
+
+    """
+    Raised when a file is not a supported LAS file.
+    """
+
+    pass
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        data = f.read(375)
+
+    if len(data) < 227 or data[0:4] != b"LASF":
+        raise LasFormatError(path + " is not a LAS file.")
+
+    version = (data[24], data[25])
+    header_size, offset_to_points, number_of_vlrs = struct.unpack_from("<HII", data, 94)
+    point_format, record_length, legacy_count = struct.unpack_from("<BHI", data, 104)
+
+    # bits 6 and 7 of the point format are set for LAZ compressed data
+    if point_format & 0xC0:
+        raise LasFormatError(path + " is compressed (LAZ). Only uncompressed LAS files are supported.")
+
+    scale = struct.unpack_from("<3d", data, 131)
+    offset = struct.unpack_from("<3d", data, 155)
+    max_x, min_x, max_y, min_y, max_z, min_z = struct.unpack_from("<6d", data, 179)
+
+    evlr_start = 0
+    number_of_evlrs = 0
+    point_count = legacy_count
+    if version >= (1, 4) and header_size >= 375:
+        evlr_start, number_of_evlrs, point_count = struct.unpack_from("<QIQ", data, 235)
+
+    return LasHeader(path, version, header_size, offset_to_points, number_of_vlrs, point_format, record_length,
+                     point_count, scale, offset, (min_x, min_y, min_z), (max_x, max_y, max_z), evlr_start,
+                     number_of_evlrs)
+
+
+def point_dtype(point_format, record_length):
+    # Fields that the toolbox uses, at their offsets in the point record. The remaining bytes of the
+    # record (gps time, colors, wave packets, extra bytes) are skipped.
+    if point_format <= 5:
+        fields = [("X", "<i4", 0), ("Y", "<i4", 4), ("Z", "<i4", 8), ("intensity", "<u2", 12),
+                  ("return_byte", "u1", 14), ("class_byte", "u1", 15), ("scan_angle_rank", "i1", 16),
+                  ("user_data", "u1", 17), ("point_source_id", "<u2", 18)]
+    elif point_format <= 10:
+        fields = [("X", "<i4", 0), ("Y", "<i4", 4), ("Z", "<i4", 8), ("intensity", "<u2", 12),
+                  ("return_byte", "u1", 14), ("class_flags", "u1", 15), ("classification", "u1", 16),
+                  ("user_data", "u1", 17), ("scan_angle", "<i2", 18), ("point_source_id", "<u2", 20)]
+    else:
+        raise LasFormatError("Unsupported point data record format: " + str(point_format))
+
+    return np.dtype({"names": [f[0] for f in fields],
+                     "formats": [f[1] for f in fields],
+                     "offsets": [f[2] for f in fields],
+                     "itemsize": record_length})
+
+
+def read_points(path, header=None, mode="r"):
+    # Returns the header and a memory mapped structured array of the point records
+    if header is None:
+        header = read_header(path)
+
+    if header.point_count == 0:
+        return header, np.zeros(0, dtype=point_dtype(header.point_format, header.record_length))
+
+    points = np.memmap(path, dtype=point_dtype(header.point_format, header.record_length), mode=mode,
+                       offset=header.offset_to_points, shape=(header.point_count,))
+
+    return header, points
+
+
+def scaled_xyz(header, points):
+    x = points["X"] * header.scale[0] + header.offset[0]
+    y = points["Y"] * header.scale[1] + header.offset[1]
+    z = points["Z"] * header.scale[2] + header.offset[2]
+
+    return x, y, z
+
+
+def classification(header, points):
+    if header.point_format <= 5:
+        return points["class_byte"] & 0x1F
+
+    return np.asarray(points["classification"])
+
+
+def return_numbers(header, points):
+    # Returns return number and number of returns
+    if header.point_format <= 5:
+        return points["return_byte"] & 0x07, (points["return_byte"] >> 3) & 0x07
+
+    return points["return_byte"] & 0x0F, (points["return_byte"] >> 4) & 0x0F
+
+
+def withheld(header, points):
+    if header.point_format <= 5:
+        return (points["class_byte"] & 0x80) != 0
+
+    return (points["class_flags"] & 0x04) != 0
+
+
+def point_filter(header, points, class_codes=None, last_return=False):
+    # Mask of the not withheld points with one of the class codes (all codes when None),
+    # optionally only last returns. Same filter as a LAS dataset layer.
+    keep = ~withheld(header, points)
+
+    if class_codes is not None:
+        keep &= np.isin(classification(header, points), list(class_codes))
+
+    if last_return:
+        number, count = return_numbers(header, points)
+        keep &= number == count
+
+    return keep
+
+
+def read_xyz(path, bounds=None):
+    # Reads the scaled coordinates of a file, optionally only the points inside bounds (x_min, y_min, x_max, y_max).
+    # Withheld points are skipped, same as EXCLUDE_WITHHELD in a LAS dataset layer.
+    header, points = read_points(path)
+    x, y, z = scaled_xyz(header, points)
+    keep = ~withheld(header, points)
+
+    if bounds is not None:
+        keep &= (x >= bounds[0]) & (y >= bounds[1]) & (x <= bounds[2]) & (y <= bounds[3])
+
+    return x[keep], y[keep], z[keep], np.flatnonzero(keep)
+
+
+def bounds_intersect(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def header_bounds(header, buffer=0.0):
+    return (header.min[0] - buffer, header.min[1] - buffer, header.max[0] + buffer, header.max[1] + buffer)
+
+
+def find_neighbours(headers, index, buffer):
+    # Returns the indexes of the files whose extent intersects the buffered extent of headers[index]
+    bounds = header_bounds(headers[index], buffer)
+
+    return [i for i, h in enumerate(headers) if i != index and bounds_intersect(bounds, header_bounds(h))]
+
+
+def list_las_files(folder, recursive=False):
+    las_files = []
+    for root, dirs, files in os.walk(folder):
+        las_files.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(".las"))
+        if not recursive:
+            break
+
+    return las_files
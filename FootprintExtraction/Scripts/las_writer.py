@@ -0,0 +1,203 @@
+# -------------------------------------------------------------------------------
+# Name:        las_writer
+# Purpose:     In-place classification patching and subset writing for uncompressed LAS files
+#              (counterpart of las_io)
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import math
+import shutil
+import struct
+
+import numpy as np
+
+import las_io
+
+# Constants
+MAX_LEGACY_CLASS = 31             # point formats 0 - 5 store the class in 5 bits
+COPY_CHUNK_SIZE = 1 << 20         # point records per write when writing subsets
+
+
+def patch_classification(las_file, indices, classes=None, withhold=False):
+    # Writes new class codes and/or sets the withheld flag of the point records at indices, in place through
+    # a writable memory map. Only the records at indices are read and written, so the I/O follows the number
+    # of changed points, not the file size.
+    # classes: new class code of every record in indices (or one code for all), None keeps the class codes.
+    # withhold: True (or one flag per record in indices) sets the withheld flag. Withheld flags are never
+    #           cleared, points that were withheld before stay withheld.
+    # The other bits of the class byte (synthetic, key-point, overlap) are kept.
+    # Returns the number of patched points and the histogram of their class codes after patching
+    # (256 bins, np.bincount of the class codes).
+    # The LAS header has no per-class counts, there is nothing to update in the header for a reclassification.
+    header = las_io.read_header(las_file)
+    indices = np.asarray(indices, dtype=np.int64)
+    if indices.size == 0:
+        return 0, np.zeros(256, dtype=np.int64)
+
+    if indices.min() < 0 or indices.max() >= header.point_count:
+        raise las_io.LasFormatError(las_file + ": point index out of range, the file has " +
+                                    str(header.point_count) + " points.")
+
+    if classes is not None:
+        classes = np.broadcast_to(np.asarray(classes), indices.shape)
+        if header.point_format <= 5 and classes.max() > MAX_LEGACY_CLASS:
+            raise las_io.LasFormatError(las_file + ": point format " + str(header.point_format) +
+                                        " can not store class codes above " + str(MAX_LEGACY_CLASS) + ".")
+        classes = classes.astype(np.uint8)
+    withhold = np.broadcast_to(np.asarray(withhold, dtype=bool), indices.shape)
+
+    _, points = las_io.read_points(las_file, header, mode="r+")
+
+    if header.point_format <= 5:
+        field = points["class_byte"]
+        value = field[indices]
+        if classes is not None:
+            value = (value & 0xE0) | classes
+        field[indices] = np.where(withhold, value | 0x80, value)
+        patched = value & 0x1F
+    else:
+        if classes is not None:
+            points["classification"][indices] = classes
+        if withhold.any():
+            field = points["class_flags"]
+            field[indices] = np.where(withhold, field[indices] | 0x04, field[indices])
+        patched = points["classification"][indices]
+
+    histogram = np.bincount(patched, minlength=256)
+    points.flush()
+    del points
+
+    return indices.size, histogram
+
+
+def write_subset(las_file, out_file, mask):
+    # Writes the point records of las_file where mask is True to a new LAS file, for example the building points.
+    # Header and VLRs are copied, the point counts, return counts and bounds are updated.
+    # Extended VLRs (LAS 1.4) are copied behind the points.
+    header, points = las_io.read_points(las_file)
+    keep = np.flatnonzero(mask)
+
+    with open(las_file, "rb") as f:
+        head = bytearray(f.read(header.offset_to_points))
+
+    # point counts and bounds of the subset
+    x_min = y_min = z_min = x_max = y_max = z_max = 0.0
+    if keep.size:
+        x, y, z = las_io.scaled_xyz(header, points[keep])
+        x_min, y_min, z_min = x.min(), y.min(), z.min()
+        x_max, y_max, z_max = x.max(), y.max(), z.max()
+
+    number, _ = las_io.return_numbers(header, points)
+    by_return = np.bincount(number[keep], minlength=16)[1:16]
+
+    struct.pack_into("<I", head, 107, keep.size if keep.size <= 0xFFFFFFFF and header.point_format <= 5 else 0)
+    struct.pack_into("<5I", head, 111, *[int(n) if header.point_format <= 5 else 0 for n in by_return[:5]])
+    struct.pack_into("<6d", head, 179, x_max, x_min, y_max, y_min, z_max, z_min)
+
+    if header.version >= (1, 4) and header.header_size >= 375:
+        evlr_start = header.offset_to_points + keep.size * header.record_length if header.number_of_evlrs else 0
+        struct.pack_into("<QIQ", head, 235, evlr_start, header.number_of_evlrs, keep.size)
+        struct.pack_into("<15Q", head, 255, *[int(n) for n in by_return])
+    if header.version >= (1, 3) and header.header_size >= 235:
+        # waveform records are not copied
+        struct.pack_into("<Q", head, 227, 0)
+
+    with open(out_file, "wb") as out:
+        out.write(head)
+
+        raw = np.memmap(las_file, dtype=np.dtype((np.void, header.record_length)), mode="r",
+                        offset=header.offset_to_points, shape=(header.point_count,)) if header.point_count else None
+        for c0 in range(0, keep.size, COPY_CHUNK_SIZE):
+            out.write(raw[keep[c0:c0 + COPY_CHUNK_SIZE]].tobytes())
+        del raw
+
+        if header.number_of_evlrs and header.evlr_start:
+            with open(las_file, "rb") as f:
+                f.seek(header.evlr_start)
+                shutil.copyfileobj(f, out)
+
+    return out_file
+
+
+def write_points(out_file, x, y, z, classes, return_number=None, number_of_returns=None, scale=(0.01, 0.01, 0.01),
+                 offset=None, intensity=None):
+    # Writes a new LAS 1.2 file, point format 0, without VLRs (e.g. synthetic test data).
+    # offset: the minimum of the coordinates when None, rounded down to a multiple of 1000 * scale.
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    z = np.asarray(z, dtype=np.float64)
+    n = x.size
+    if return_number is None:
+        return_number = np.ones(n, dtype=np.uint8)
+    if number_of_returns is None:
+        number_of_returns = return_number
+
+    classes = np.asarray(classes)
+    if n and classes.max() > MAX_LEGACY_CLASS:
+        raise las_io.LasFormatError(out_file + ": point format 0 can not store class codes above " +
+                                    str(MAX_LEGACY_CLASS) + ".")
+
+    if offset is None:
+        offset = tuple(math.floor(v.min() / (1000 * s)) * 1000 * s if n else 0.0 for v, s in zip((x, y, z), scale))
+
+    points = np.zeros(n, dtype=las_io.point_dtype(0, 20))
+    bounds = []
+    for name, values, s, o in zip(("X", "Y", "Z"), (x, y, z), scale, offset):
+        points[name] = np.round((values - o) / s).astype(np.int32)
+        # bounds of the stored (rounded) coordinates
+        bounds += [points[name].max() * s + o, points[name].min() * s + o] if n else [0.0, 0.0]
+    points["return_byte"] = (np.asarray(return_number, dtype=np.uint8) & 0x07) | \
+        ((np.asarray(number_of_returns, dtype=np.uint8) & 0x07) << 3)
+    points["class_byte"] = classes.astype(np.uint8)
+    if intensity is not None:
+        points["intensity"] = intensity
+
+    head = bytearray(227)
+    head[0:4] = b"LASF"
+    head[24:26] = bytes((1, 2))
+    head[58:58 + 31] = b"LAS Building Extraction Toolbox"
+    struct.pack_into("<HHHIIBHI", head, 90, 1, 2000, 227, 227, 0, 0, 20, n)
+    by_return = np.bincount(np.asarray(return_number, dtype=np.int64), minlength=6)[1:6] if n else [0] * 5
+    struct.pack_into("<5I", head, 111, *[int(v) for v in by_return])
+    struct.pack_into("<3d", head, 131, *scale)
+    struct.pack_into("<3d", head, 155, *offset)
+    struct.pack_into("<6d", head, 179, *bounds)
+
+    with open(out_file, "wb") as out:
+        out.write(head)
+        for c0 in range(0, n, COPY_CHUNK_SIZE):
+            out.write(points[c0:c0 + COPY_CHUNK_SIZE].tobytes())
+
+    return out_file
+
+
+def apply_classification(results, withhold=None):
+    # Patches the results of a classifier ({las_file: class array or .npy file}, see
+    # building_classifier.classify_buildings) into the LAS files.
+    # withhold: optional {las_file: mask of the points to withhold}, e.g. the masks of noise_filter.classify_noise.
+    # The results hold a class code for every point, so the class column of every file is read to find the
+    # changed points. Only the changed and withheld points are written.
+    # Returns {las_file: number of changed points}.
+    changed = {}
+    for las_file, classes in results.items():
+        if isinstance(classes, str):
+            classes = np.load(classes, mmap_mode="r")
+        header, points = las_io.read_points(las_file)
+        if np.size(classes) != header.point_count:
+            raise las_io.LasFormatError(las_file + ": expected " + str(header.point_count) + " class codes, got " +
+                                        str(np.size(classes)) + ".")
+
+        indices = np.flatnonzero(las_io.classification(header, points) != classes)
+        flags = False
+        if withhold and las_file in withhold:
+            mask = np.asarray(withhold[las_file], dtype=bool)
+            indices = np.union1d(indices, np.flatnonzero(mask & ~las_io.withheld(header, points)))
+            flags = mask[indices]
+        del points
+
+        changed[las_file], _ = patch_classification(las_file, indices, np.asarray(classes)[indices], flags)
+
+    return changed
@@ -0,0 +1,44 @@
+# -------------------------------------------------------------------------------
+# Name:        lazy_imports
+# Purpose:     Modules that are only loaded when one of their attributes is used. Scripts bind arcpy with
+#              lazy_import("arcpy"), importing a script (e.g. in a worker process) then costs milliseconds.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import sys
+import importlib.util
+
+
+class MissingModule(object):
+
+    """
+    Stands in for a module that is not installed, using it raises the ImportError.
+    """
+
+    def __init__(self, name):
+        self.__name = name
+
+    def __getattr__(self, attribute):
+        raise ImportError("No module named '" + self.__name + "' (needed for " + attribute + ").")
+
+
+def lazy_import(name):
+    # The module name, loaded on the first attribute access (importlib.util.LazyLoader).
+    # An imported module is returned as is, a module that is not installed as a MissingModule.
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return MissingModule(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    return module
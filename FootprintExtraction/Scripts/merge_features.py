@@ -18,7 +18,10 @@
 import arcpy
 import os
 import sys
+import datetime
+import numpy as np
 import common_lib
+import field_engine
 from common_lib import create_msg_body, msg
 
 # Constants
@@ -34,9 +37,8 @@ def merge_features(scratch_ws, lc_input_features, lc_merge_features, select_fiel
         if lc_input_features and lc_merge_features:
             arcpy.AddMessage("Setting merge date on merge features...")
             date_field = "merge_date"
-            common_lib.delete_add_field(lc_merge_features, date_field, "DATE")
-            arcpy.CalculateField_management(lc_merge_features, date_field,
-                                            "time.strftime('%d/%m/%Y')", "PYTHON_9.3", "")
+            field_engine.calculate_fields(lc_merge_features, [],
+                                          {date_field: ("DATE", np.datetime64(datetime.date.today()))})
 
             # create point feature class showing
             point_fc = os.path.join(scratch_ws, "temp_point")
@@ -52,7 +54,6 @@ def merge_features(scratch_ws, lc_input_features, lc_merge_features, select_fiel
             arcpy.FeatureToPoint_management(lc_merge_features, point_fc, "INSIDE")
 
             point_field = "point_elevation"
-            common_lib.delete_add_field(point_fc, point_field, "DOUBLE")
 
             z_unit = common_lib.get_z_unit(point_fc, 0)
 
@@ -61,8 +62,8 @@ def merge_features(scratch_ws, lc_input_features, lc_merge_features, select_fiel
             else:
                 offset = 10
 
-            expression = "round(float(!Z_Max!), 2) + " + str(offset)
-            arcpy.CalculateField_management(point_fc, point_field, expression, "PYTHON_9.3", None)
+            field_engine.calculate_fields(point_fc, ["Z_Max"],
+                                          {point_field: ("DOUBLE", lambda c: np.round(c["Z_Max"], 2) + offset)})
 
             arcpy.FeatureTo3DByAttribute_3d(point_fc, point_fc_3d, point_field, None)
 
@@ -16,24 +16,16 @@
 # -------------------------------------------------------------------------------
 
 import arcpy
-import sys
-import importlib
 import os
 import merge_features
 import common_lib
-import time
+import scratch_workspace
+import instrumentation
 from common_lib import create_msg_body, msg, trace
 
 UPDATE_STATUS_FIELD = "Update_Status"
 
-if 'merge_features' in sys.modules:
-    importlib.reload(merge_features)
-
-if 'common_lib' in sys.modules:
-    importlib.reload(common_lib)  # force reload of the module
-
 enableLogging = False
-DeleteIntermediateData = True
 verbose = 0
 in_memory_switch = False
 
@@ -71,6 +63,10 @@ class FunctionError(Exception):
 # ----------------------------Main Function---------------------------- #
 
 def main():
+    # Describe results cached by an earlier run in this Python session may be stale
+    common_lib.invalidate_describe()
+    scratch = None
+    span = None
     try:
         # Get Attributes from User
             # User input
@@ -97,10 +93,11 @@ def main():
         if os.path.exists(layer_directory):
             common_lib.rename_file_extension(layer_directory, ".txt", ".lyrx")
 
-        # Create folders and intermediate gdb, if needed
-        scratch_ws = common_lib.create_gdb(home_directory, "Intermediate.gdb")
+        # scratch gdb of this run, deleted with the intermediate data when the tool ends
+        scratch = scratch_workspace.ScratchWorkspace(home_directory, TOOLNAME).open()
+        scratch_ws = scratch.workspace
 
-        start_time = time.clock()
+        span = instrumentation.start_span("merge_features")
 
         # check if input exists
         if arcpy.Exists(input_layer) and arcpy.Exists(merge_layer):
@@ -167,27 +164,16 @@ def main():
                     arcpy.SetParameter(3, output_layer1)
                     arcpy.SetParameter(4, output_layer2)
 
-                    end_time = time.clock()
-                    msg_body = create_msg_body("merge_features completed successfully.", start_time, end_time)
+                    span.end()
+                    msg_body = span.message("merge_features completed successfully.")
                     msg(msg_body)
                 else:
-                    end_time = time.clock()
-                    msg_body = create_msg_body("No merge features created. Exiting...", start_time, end_time)
+                    span.end()
+                    msg_body = span.message("No merge features created. Exiting...")
                     msg(msg_body, WARNING)
 
             arcpy.ClearWorkspaceCache_management()
 
-            if DeleteIntermediateData:
-                fcs = common_lib.listFcsInGDB(scratch_ws)
-
-                msg_prefix = "Deleting intermediate data..."
-
-                msg_body = common_lib.create_msg_body(msg_prefix, 0, 0)
-                common_lib.msg(msg_body)
-
-                for fc in fcs:
-                    arcpy.Delete_management(fc)
-
             # end main code
 
     except LicenseError3D:
@@ -216,6 +202,11 @@ def main():
         msg("with error message:  %s" % synerror, ERROR)
 
     finally:
+        if span is not None:
+            # a span that was not ended on a success path ended with an error
+            span.end("failed")
+        if scratch is not None:
+            scratch.close()
         arcpy.CheckInExtension("3D")
 
 
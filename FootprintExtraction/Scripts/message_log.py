@@ -0,0 +1,223 @@
+# -------------------------------------------------------------------------------
+# Name:        message_log
+# Purpose:     Message backend for common_lib.msg. Repeated info messages are coalesced, the geoprocessing
+#              messages are then written in the calling thread (arcpy messages must come from the tool's own
+#              thread, while the tool runs) and the file and stderr / JSON lines sinks are put on a queue and
+#              written by a listener thread, so a loop that reports every tile or feature does not wait on file I/O.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+
+# Constants
+LOGGER_NAME = "building_extraction"
+LOG_FORMAT_ENV = "BUILDING_EXTRACTION_LOG"  # "json" for JSON lines on stderr when running without arcpy
+COALESCE_SECONDS = 2.0                      # similar info messages are written at most once per interval
+FILE_FORMAT = "%(asctime)s %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_DIGITS = re.compile(r"\d+(\.\d+)?")
+
+_listener = None
+_queue = None
+_coalescer = None
+_queued_handlers = []
+
+
+def message_key(text):
+    # Messages that only differ in their numbers are similar, "Processed tile 3 of 40" ~ "Processed tile 4 of 40"
+    return _DIGITS.sub("#", text)
+
+
+class CoalescingHandler(logging.Handler):
+
+    """
+    Passes the records to its handlers, similar info messages at most once per interval. The last one of
+    the similar messages held back is written with their count when the interval has passed (or on flush).
+    Warnings and errors are always passed on.
+    """
+
+    def __init__(self, handlers, interval=COALESCE_SECONDS):
+        logging.Handler.__init__(self)
+        self.handlers = list(handlers)
+        self.interval = interval
+        # message key: [time written, held back records count, last held back record]
+        self.pending = {}
+
+    def _write(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _write_held_back(self, key):
+        written, count, record = self.pending[key]
+        if count:
+            record.msg = "{0} (+{1} similar message{2})".format(record.getMessage(), count, "" if count == 1 else "s")
+            record.args = None
+            self._write(record)
+        del self.pending[key]
+
+    def emit(self, record):
+        now = time.monotonic()
+        # the similar messages of past intervals are written first, in the order they came
+        for key in [k for k, p in self.pending.items() if now - p[0] >= self.interval]:
+            self._write_held_back(key)
+
+        if record.levelno > logging.INFO:
+            self._write(record)
+            return
+
+        key = message_key(record.getMessage())
+        if key in self.pending:
+            self.pending[key][1] += 1
+            self.pending[key][2] = record
+        else:
+            self.pending[key] = [now, 0, None]
+            self._write(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            for key in list(self.pending):
+                self._write_held_back(key)
+            for handler in self.handlers:
+                handler.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        for handler in self.handlers:
+            handler.close()
+        logging.Handler.close(self)
+
+
+class ArcpyHandler(logging.Handler):
+
+    """
+    Writes the records to the geoprocessing messages. The message functions can be replaced,
+    e.g. by the messages object of a toolbox tool.
+    """
+
+    def __init__(self, add_message=None, add_warning=None, add_error=None):
+        logging.Handler.__init__(self)
+        if add_message is None or add_warning is None or add_error is None:
+            import arcpy
+            add_message = add_message or arcpy.AddMessage
+            add_warning = add_warning or arcpy.AddWarning
+            add_error = add_error or arcpy.AddError
+        self.add_message = add_message
+        self.add_warning = add_warning
+        self.add_error = add_error
+
+    def emit(self, record):
+        try:
+            text = record.getMessage()
+            if record.levelno >= logging.ERROR:
+                self.add_error(text)
+            elif record.levelno >= logging.WARNING:
+                self.add_warning(text)
+            else:
+                self.add_message(text)
+        except Exception:
+            self.handleError(record)
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        return json.dumps({"time": round(record.created, 3), "level": record.levelname,
+                           "message": record.getMessage()})
+
+
+def file_handler(log_file):
+    handler = logging.FileHandler(log_file)
+    handler.setFormatter(logging.Formatter(FILE_FORMAT, DATE_FORMAT))
+    return handler
+
+
+def stream_handler(json_lines=None, stream=None):
+    # Plain text or JSON lines (json_lines, default from LOG_FORMAT_ENV) on stderr, for runs without arcpy
+    if json_lines is None:
+        json_lines = os.environ.get(LOG_FORMAT_ENV, "").lower() == "json"
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if json_lines else logging.Formatter("%(levelname)s %(message)s"))
+    return handler
+
+
+def message_handler():
+    # The geoprocessing messages when arcpy is available, stderr otherwise
+    try:
+        return ArcpyHandler()
+    except ImportError:
+        return stream_handler()
+
+
+def start(handlers=None, interval=COALESCE_SECONDS):
+    # Starts the message backend with the handlers (default: message_handler()). The messages are coalesced
+    # in the calling thread, ArcpyHandlers write them right away, the other handlers are run by the listener
+    # thread. A running backend is stopped first. Returns the logger the messages go to.
+    global _listener, _queue, _coalescer, _queued_handlers
+    stop()
+
+    handlers = handlers if handlers is not None else [message_handler()]
+    direct = [h for h in handlers if isinstance(h, ArcpyHandler)]
+    _queued_handlers = [h for h in handlers if not isinstance(h, ArcpyHandler)]
+
+    _queue = queue.Queue()
+    _listener = logging.handlers.QueueListener(_queue, *_queued_handlers, respect_handler_level=True)
+    _listener.start()
+    _coalescer = CoalescingHandler(direct + [logging.handlers.QueueHandler(_queue)], interval)
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers = [_coalescer]
+    logger.setLevel(logging.INFO)
+    # the messages are only written by the sinks above
+    logger.propagate = False
+
+    return logger
+
+
+def is_started():
+    return _listener is not None
+
+
+def log(level, text):
+    logging.getLogger(LOGGER_NAME).log(level, text)
+
+
+def flush():
+    # Writes the held back similar messages and waits until the queued messages are written
+    if _listener is None:
+        return
+    _coalescer.flush()
+    _queue.join()
+
+
+def stop():
+    # Writes the held back and queued messages and stops the listener thread
+    global _listener, _queue, _coalescer, _queued_handlers
+    if _listener is None:
+        return
+
+    logging.getLogger(LOGGER_NAME).handlers = []
+    _coalescer.close()
+    _listener.stop()
+    for handler in _queued_handlers:
+        handler.close()
+    _listener = _queue = _coalescer = None
+    _queued_handlers = []
+
+
+atexit.register(stop)
@@ -0,0 +1,322 @@
+# -------------------------------------------------------------------------------
+# Name:        neighbour_index
+# Purpose:     Voxel hash grid for radius and k-nearest neighbour queries on LAS points.
+#              Build once per tile, reuse for every point level stage.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+import las_io
+
+# Constants
+DEFAULT_CHUNK_SIZE = 8192         # queries per batch, bounds the memory of the candidate arrays
+MAX_DENSE_VOXELS = 1 << 25        # voxel grids up to this size use a direct lookup table
+TILE_CACHE_SIZE = 2               # tile indexes kept per process by tile_index()
+KNN_MAX_RINGS = 4                 # default reach of query_knn in voxels, (2 * 4 + 1)^3 neighbour voxels in 3D
+
+_TILE_CACHE = OrderedDict()
+
+
+class VoxelIndex(object):
+
+    """
+    Points sorted by packed voxel key (np.argsort), with the start and count of every occupied voxel.
+    Works in 3D, or in 2D when no z values are given.
+    Pure NumPy: about 0.2 to 0.4M radius queries per second per core (7 to 32 neighbours per query),
+    a compiled index for millions of queries per second is out of scope.
+    """
+
+    def __init__(self, x, y, z=None, voxel_size=1.0):
+        coords = [np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)]
+        if z is not None:
+            coords.append(np.asarray(z, dtype=np.float64))
+        points = np.column_stack(coords)
+
+        self.voxel_size = float(voxel_size)
+        self.dimension = points.shape[1]
+        self.size = points.shape[0]
+        self.origin = points.min(axis=0) if self.size else np.zeros(self.dimension)
+
+        ijk = self._voxel_coords(points)
+        self.dims = (ijk.max(axis=0) + 1) if self.size else np.ones(self.dimension, dtype=np.int64)
+        keys = _pack(ijk, self.dims)
+
+        self.order = np.argsort(keys, kind="stable")
+        self.points = points[self.order]
+        self.axes = [np.ascontiguousarray(self.points[:, axis]) for axis in range(self.dimension)]
+        sorted_keys = keys[self.order]
+
+        self.keys, starts, counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+        # slot -1 (empty voxel) reads the trailing 0
+        self.starts = np.append(starts, 0)
+        self.counts = np.append(counts, 0)
+
+        # direct lookup table when the voxel grid is small enough, else binary search on the keys
+        self.dense = None
+        n_voxels = int(np.prod(self.dims.astype(np.float64)))
+        if n_voxels <= MAX_DENSE_VOXELS:
+            self.dense = np.full(n_voxels, -1, dtype=np.int64)
+            self.dense[self.keys] = np.arange(self.keys.size)
+
+    def _voxel_coords(self, points):
+        return np.floor((points - self.origin) / self.voxel_size).astype(np.int64)
+
+    def _slots(self, keys):
+        # position of the voxels in self.keys, -1 for empty voxels
+        if self.dense is not None:
+            return self.dense[keys]
+
+        slot = np.searchsorted(self.keys, keys)
+        slot[slot >= self.keys.size] = 0
+        slot[self.keys[slot] != keys] = -1
+
+        return slot
+
+    def _lookup(self, v_ijk, offsets):
+        # start and count of the neighbour voxels of every voxel, shaped (voxels, offsets).
+        # Count 0 for empty voxels or voxels outside the grid.
+        slots = np.full((v_ijk.shape[0], offsets.shape[0]), -1, dtype=np.int64)
+        if self.size == 0:
+            return self.starts[slots], self.counts[slots]
+
+        # voxels away from the grid edge: neighbour keys from the packed key and packed offsets
+        reach = int(offsets.max())
+        inner = np.all((v_ijk >= reach) & (v_ijk < self.dims - reach), axis=1)
+        keys = _pack(v_ijk[inner], self.dims)[:, None] + _pack(offsets, self.dims)[None, :]
+        slots[inner] = self._slots(keys)
+
+        # voxels at the grid edge: test every neighbour
+        ijk = (v_ijk[~inner][:, None, :] + offsets[None, :, :]).reshape(-1, self.dimension)
+        inside = np.all((ijk >= 0) & (ijk < self.dims), axis=1)
+        edge = np.full(ijk.shape[0], -1, dtype=np.int64)
+        edge[inside] = self._slots(_pack(ijk[inside], self.dims))
+        slots[~inner] = edge.reshape(-1, offsets.shape[0])
+
+        return self.starts[slots], self.counts[slots]
+
+    def _query_points(self, x, y, z):
+        coords = [np.asarray(x, dtype=np.float64).ravel(), np.asarray(y, dtype=np.float64).ravel()]
+        if self.dimension == 3:
+            if z is None:
+                raise ValueError("3D index needs z values for the query points.")
+            coords.append(np.asarray(z, dtype=np.float64).ravel())
+
+        return np.column_stack(coords)
+
+    def _offsets(self, reach):
+        ranges = [np.arange(-reach, reach + 1)] * self.dimension
+        return np.stack(np.meshgrid(*ranges, indexing="ij"), axis=-1).reshape(-1, self.dimension)
+
+    def _group_queries(self, queries):
+        # Sorts the queries by voxel. Returns the sort order, the coords of the query voxels and the
+        # first query and number of queries of every voxel.
+        q_ijk = self._voxel_coords(queries)
+        low = q_ijk.min(axis=0)
+        keys = _pack(q_ijk - low, q_ijk.max(axis=0) - low + 1)
+
+        order = np.argsort(keys, kind="stable")
+        _, first, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+        return order, q_ijk[order[first]], first, counts
+
+    def _candidates(self, v_ijk, q_counts, offsets):
+        # Candidates of the queries of a run of query voxels, grouped by query:
+        # (number of candidates per query, sorted point positions).
+        # The neighbour voxels are looked up once per query voxel, their point ranges form a
+        # position template that every query of the voxel shares.
+        n_voxels = v_ijk.shape[0]
+        starts, counts = self._lookup(v_ijk, offsets)
+
+        found = counts > 0
+        voxel_id = np.nonzero(found)[0]
+        starts = starts[found]
+        counts = counts[found]
+
+        run_start = np.cumsum(counts) - counts
+        template = np.arange(int(counts.sum())) + np.repeat(starts - run_start, counts)
+        t_size = np.bincount(voxel_id, counts, minlength=n_voxels).astype(np.int64)
+        t_start = np.cumsum(t_size) - t_size
+
+        # every query takes the template of its voxel
+        q_voxel = np.repeat(np.arange(n_voxels), q_counts)
+        size = t_size[q_voxel]
+        run_start = np.cumsum(size) - size
+        position = template[np.arange(int(size.sum())) + np.repeat(t_start[q_voxel] - run_start, size)]
+
+        return size, position
+
+    def _radius_chunks(self, queries, radius, exclude_self, chunk_size):
+        # Yields (counts, sorted point positions, squared distances) of the neighbours per run of
+        # query voxels, with the queries in voxel order. Also returns the voxel order of the queries.
+        order, v_ijk, first, q_counts = self._group_queries(queries)
+        offsets = self._offsets(int(math.ceil(radius / self.voxel_size)))
+        q_axes = [queries[order, axis] for axis in range(self.dimension)]
+        r2 = radius * radius
+
+        # runs of query voxels with about chunk_size queries
+        bounds = np.searchsorted(first, np.arange(0, queries.shape[0], chunk_size))
+        bounds = np.append(np.unique(bounds), first.size)
+
+        def chunks():
+            for v0, v1 in zip(bounds[:-1], bounds[1:]):
+                q0 = first[v0]
+                q1 = q0 + q_counts[v0:v1].sum()
+                size, position = self._candidates(v_ijk[v0:v1], q_counts[v0:v1], offsets)
+
+                d2 = np.zeros(position.size)
+                for axis in range(self.dimension):
+                    d = self.axes[axis][position]
+                    d -= np.repeat(q_axes[axis][q0:q1], size)
+                    d *= d
+                    d2 += d
+                keep = d2 <= r2
+                if exclude_self:
+                    keep &= d2 > 0
+
+                # candidates are grouped by query, neighbours per query from the running count
+                kept = np.concatenate(([0], np.cumsum(keep)))
+                counts = np.diff(kept[np.concatenate(([0], np.cumsum(size)))])
+
+                yield counts, position[keep], d2[keep]
+
+        return order, chunks()
+
+    def query_radius(self, x, y, z=None, radius=1.0, exclude_self=False, return_distance=False,
+                     chunk_size=DEFAULT_CHUNK_SIZE):
+        # Returns CSR style (indptr, indices[, distances]) of the points within radius of every query point.
+        # indices refer to the input order of the indexed points.
+        # exclude_self drops neighbours at distance 0 (for queries on the indexed points themselves).
+        # Fastest with a voxel size close to the radius.
+        queries = self._query_points(x, y, z)
+        n = queries.shape[0]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        if n == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return (indptr, empty, np.zeros(0)) if return_distance else (indptr, empty)
+
+        order, chunks = self._radius_chunks(queries, radius, exclude_self, chunk_size)
+        counts = []
+        indices = []
+        distances = []
+        for chunk_counts, position, d2 in chunks:
+            counts.append(chunk_counts)
+            indices.append(self.order[position])
+            if return_distance:
+                distances.append(np.sqrt(d2))
+
+        # back from voxel order to query order
+        s_counts = np.concatenate(counts)
+        s_indptr = np.cumsum(s_counts) - s_counts
+        q_counts = np.empty(n, dtype=np.int64)
+        q_counts[order] = s_counts
+        np.cumsum(q_counts, out=indptr[1:])
+
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n)
+        source = np.arange(int(indptr[-1])) + np.repeat(s_indptr[rank] - indptr[:-1], q_counts)
+        indices = np.concatenate(indices)[source]
+
+        if return_distance:
+            return indptr, indices, np.concatenate(distances)[source]
+
+        return indptr, indices
+
+    def count_radius(self, x, y, z=None, radius=1.0, exclude_self=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        # Number of points within radius of every query point
+        queries = self._query_points(x, y, z)
+        counts = np.zeros(queries.shape[0], dtype=np.int64)
+        if queries.shape[0] == 0:
+            return counts
+
+        order, chunks = self._radius_chunks(queries, radius, exclude_self, chunk_size)
+        counts[order] = np.concatenate([chunk_counts for chunk_counts, _, _ in chunks])
+
+        return counts
+
+    def query_knn(self, x, y, z=None, k=8, exclude_self=False, max_radius=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        # Returns (indices, distances), both shaped (n queries, k), sorted by distance.
+        # Missing neighbours (fewer than k points within max_radius) are -1 / inf.
+        # The search radius grows per query until k neighbours are found, so the result is exact within
+        # max_radius. max_radius defaults to KNN_MAX_RINGS voxels: the search visits (2 * reach + 1)^3
+        # voxels per query voxel, so isolated points (e.g. noise far from the tile) must not grow the
+        # radius to the extent of the tile.
+        if max_radius is None:
+            max_radius = KNN_MAX_RINGS * self.voxel_size
+
+        queries = self._query_points(x, y, z)
+        n = queries.shape[0]
+        out_index = np.full((n, k), -1, dtype=np.int64)
+        out_dist = np.full((n, k), np.inf)
+
+        # distance to the farthest corner of the indexed points, beyond it the search can not find more
+        if self.size:
+            far = np.maximum(np.abs(queries - self.points.min(axis=0)), np.abs(queries - self.points.max(axis=0)))
+            limit = np.sqrt((far ** 2).sum(axis=1))
+        else:
+            limit = np.zeros(n)
+
+        pending = np.arange(n)
+        radius = self.voxel_size
+        while pending.size:
+            radius = min(radius, max_radius)
+
+            indptr, indices, dist = self.query_radius(*[queries[pending, a] for a in range(self.dimension)],
+                                                      radius=radius, exclude_self=exclude_self,
+                                                      return_distance=True, chunk_size=chunk_size)
+            found = np.diff(indptr)
+            done = (found >= k) | (radius >= limit[pending]) | (radius >= max_radius)
+
+            if done.any():
+                # sort every query's neighbours by distance (one float key: query id + distance scaled
+                # to [0, 1)), keep the first k
+                query_id = np.repeat(np.arange(pending.size), found)
+                order = np.argsort(query_id + dist / (radius * (1.0 + 1e-9)))
+                rank = np.arange(order.size) - np.repeat(indptr[:-1], found)
+                take = (rank < k) & done[query_id[order]]
+
+                rows = pending[query_id[order][take]]
+                out_index[rows, rank[take]] = indices[order][take]
+                out_dist[rows, rank[take]] = dist[order][take]
+
+            pending = pending[~done]
+            radius *= 2.0
+
+        return out_index, out_dist
+
+
+def _pack(ijk, dims):
+    # key of voxel coords in a grid of dims voxels, axis 0 varies fastest (linear, so offsets can be
+    # packed as well)
+    key = ijk[:, 0].copy()
+    stride = 1
+    for axis in range(1, ijk.shape[1]):
+        stride *= int(dims[axis - 1])
+        key += ijk[:, axis] * stride
+
+    return key
+
+
+def tile_index(las_file, voxel_size, dimension=3):
+    # Index of the (not withheld) points of a LAS file, cached per process so every point level
+    # stage of a tile uses the same index. Returns (index, point positions in the file).
+    key = (os.path.abspath(las_file), os.path.getmtime(las_file), float(voxel_size), dimension)
+    if key in _TILE_CACHE:
+        _TILE_CACHE.move_to_end(key)
+        return _TILE_CACHE[key]
+
+    x, y, z, positions = las_io.read_xyz(las_file)
+    index = VoxelIndex(x, y, z if dimension == 3 else None, voxel_size)
+
+    _TILE_CACHE[key] = (index, positions)
+    while len(_TILE_CACHE) > TILE_CACHE_SIZE:
+        _TILE_CACHE.popitem(last=False)
+
+    return index, positions
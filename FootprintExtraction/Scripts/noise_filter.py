@@ -0,0 +1,102 @@
+# -------------------------------------------------------------------------------
+# Name:        noise_filter
+# Purpose:     In-process relative height noise classification (ClassifyLasNoise RELATIVE_HEIGHT
+#              equivalent) that returns point masks instead of editing the LAS files
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import numpy as np
+
+import grid_lib
+import las_io
+import neighbour_index
+import parallel_lib
+
+# Constants, in meters. Use noise_options() to convert them to the units of the data.
+DEFAULT_ISOLATION_RADIUS = 2.0    # search radius of the isolated point test
+DEFAULT_MIN_NEIGHBOURS = 1        # points with fewer other points within the radius are isolated
+
+
+def noise_options(minimum_height, maximum_height, m_per_unit, isolated=False,
+                  isolation_radius=DEFAULT_ISOLATION_RADIUS, min_neighbours=DEFAULT_MIN_NEIGHBOURS, extent=None):
+    # minimum_height and maximum_height in the units of the data, relative to the ground
+    # (points lower than minimum_height or higher than maximum_height are noise).
+    # isolated: also flag points with fewer than min_neighbours other points within isolation_radius (meters).
+    # extent: optional (x_min, y_min, x_max, y_max), points outside are never noise.
+    return {"minimum_height": minimum_height,
+            "maximum_height": maximum_height,
+            "isolation_radius": isolation_radius / m_per_unit if isolated else None,
+            "min_neighbours": min_neighbours,
+            "extent": extent}
+
+
+def relative_height_noise(spec, dtm, x, y, z, minimum_height, maximum_height):
+    # Points outside [minimum_height, maximum_height] above the bilinear sampled ground surface.
+    # Points where the ground surface is NoData are not flagged.
+    with np.errstate(invalid="ignore"):
+        height = z - grid_lib.sample_bilinear(spec, dtm, x, y)
+        return (height < minimum_height) | (height > maximum_height)
+
+
+def isolated_points(index, x, y, z, radius, min_neighbours, halo=None):
+    # Points of a tile with fewer than min_neighbours other points within radius.
+    # index: neighbour_index.VoxelIndex of the tile points.
+    # halo: optional (x, y, z) of the points of the neighbouring tiles. Only the points that look isolated
+    # within the tile are tested against the halo, these are few.
+    counts = index.count_radius(x, y, z, radius=radius, exclude_self=True)
+
+    if halo is not None and halo[0].size:
+        check = np.flatnonzero(counts < min_neighbours)
+        if check.size:
+            halo_index = neighbour_index.VoxelIndex(halo[0], halo[1], halo[2], radius)
+            counts[check] += halo_index.count_radius(x[check], y[check], z[check], radius=radius)
+
+    return counts < min_neighbours
+
+
+def classify_noise_tile(las_file, neighbour_files, spec, dtm, options):
+    # Returns a boolean array with True for the noise points of las_file.
+    # spec and dtm: ground surface covering the file (a window of the dataset ground surface).
+    header = las_io.read_header(las_file)
+    x, y, z, index = las_io.read_xyz(las_file)
+
+    noise = relative_height_noise(spec, dtm, x, y, z, options["minimum_height"], options["maximum_height"])
+
+    radius = options["isolation_radius"]
+    if radius:
+        tile_index, _ = neighbour_index.tile_index(las_file, radius)
+        bounds = las_io.header_bounds(header, radius)
+        halo = [np.concatenate(a) for a in zip(*[las_io.read_xyz(f, bounds)[:3] for f in neighbour_files])] \
+            if neighbour_files else None
+        noise |= isolated_points(tile_index, x, y, z, radius, options["min_neighbours"], halo)
+
+    extent = options["extent"]
+    if extent:
+        noise &= (x >= extent[0]) & (y >= extent[1]) & (x <= extent[2]) & (y <= extent[3])
+
+    mask = np.zeros(header.point_count, dtype=bool)
+    mask[index] = noise
+
+    return mask
+
+
+def classify_noise(las_files, spec, dtm, options, workers=None):
+    # Tile parallel noise classification against the ground surface (dtm, spec) of the dataset.
+    # Returns {las_file: noise mask}, the masks can be passed to the rasterizers to leave the noise out.
+    headers = [las_io.read_header(f) for f in las_files]
+    halo = options["isolation_radius"] or 0.0
+
+    tasks = []
+    for i, las_file in enumerate(las_files):
+        # only the ground cells around the file are sent to the worker
+        tile_spec, row0, col0 = grid_lib.window_spec(spec, las_io.header_bounds(headers[i], 2 * spec.cell_size))
+        tile_dtm = dtm[row0:row0 + tile_spec.n_rows, col0:col0 + tile_spec.n_cols]
+        neighbours = [las_files[n] for n in las_io.find_neighbours(headers, i, halo)] if halo else []
+        tasks.append((las_file, neighbours, tile_spec, tile_dtm, options))
+
+    masks = parallel_lib.run_tasks(classify_noise_tile, tasks, workers)
+
+    return dict(zip(las_files, masks))
@@ -0,0 +1,28 @@
+# -------------------------------------------------------------------------------
+# Name:        overlay_lib
+# Purpose:     Contains common functions for the area statistics of polygon overlays
+#              (Intersect / Union pieces), without arcpy
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+
+def sum_areas_by_id(rows):
+    # Sums the areas of polygon pieces per id, rows of (id, area) (e.g. a cursor on an Intersect or Union output)
+    areas = {}
+    for fid, area in rows:
+        areas[fid] = areas.get(fid, 0) + area
+
+    return areas
+
+
+def iou_by_id(intersection_areas, union_areas):
+    # Intersection over union per id, for the ids with an intersection and a union area
+    iou = {}
+    for fid, area in intersection_areas.items():
+        if union_areas.get(fid):
+            iou[fid] = area / union_areas[fid]
+
+    return iou
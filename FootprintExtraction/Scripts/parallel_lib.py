@@ -0,0 +1,166 @@
+# -------------------------------------------------------------------------------
+# Name:        parallel_lib
+# Purpose:     Contains common functions for running tile work in worker processes
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import sys
+import multiprocessing
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Constants
+LICENCE_EXTENSIONS = ("3D", "Spatial")
+MAX_TASKS_PER_WORKER = 50           # tasks before a warm worker is replaced
+WORKER_SCRATCH_PREFIX = "worker"
+
+# licence extension: status of the check out, in a warm worker
+worker_licences = {}
+
+
+def default_workers():
+    # leave one core for ArcGIS Pro
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def set_python_executable():
+    # Inside ArcGIS Pro sys.executable is ArcGISPro.exe, worker processes must be started with the
+    # python of the active conda environment instead.
+    if os.path.basename(sys.executable).lower().startswith("arcgispro"):
+        python_exe = os.path.join(sys.exec_prefix, "pythonw.exe")
+        if not os.path.exists(python_exe):
+            python_exe = os.path.join(sys.exec_prefix, "python.exe")
+        multiprocessing.set_executable(python_exe)
+
+
+def process_pool(workers=None):
+    set_python_executable()
+
+    return ProcessPoolExecutor(max_workers=workers or default_workers())
+
+
+def init_arcpy_worker(extensions, scratch_workspace=None):
+    # Initializer of the WarmPool workers: imports arcpy, checks out the licence extensions and sets the
+    # environment once per process. Every worker gets its own scratch folder (see scratch_workspace), so the
+    # workers do not lock each other's scratch data, it is deleted when the worker ends.
+    # Without arcpy (e.g. NumPy only tasks) there is nothing to do. The licences are checked in again when the
+    # process ends.
+    try:
+        import arcpy
+    except ImportError:
+        return
+
+    for extension in extensions:
+        worker_licences[extension] = arcpy.CheckOutExtension(extension)
+
+    arcpy.env.overwriteOutput = True
+    if scratch_workspace:
+        import multiprocessing.util
+        from scratch_workspace import ScratchWorkspace, FOLDER
+
+        worker_scratch = ScratchWorkspace(scratch_workspace, WORKER_SCRATCH_PREFIX, FOLDER).open()
+        # the finalizers of multiprocessing run when a worker ends, atexit functions do not
+        multiprocessing.util.Finalize(None, worker_scratch.close, exitpriority=10)
+        arcpy.env.scratchWorkspace = worker_scratch.workspace
+
+
+def run_tasks(function, tasks, workers=None):
+    # Runs function(*task) for every task and returns the results in task order.
+    # Runs in process when there is only 1 worker or 1 task.
+    tasks = list(tasks)
+    workers = workers or default_workers()
+
+    if workers <= 1 or len(tasks) <= 1:
+        return [function(*task) for task in tasks]
+
+    with process_pool(min(workers, len(tasks))) as executor:
+        futures = [executor.submit(function, *task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+class WarmPool(object):
+
+    """
+    Process pool whose workers import arcpy, check out the licences and set the environment once (see
+    init_arcpy_worker) and then run many tasks. To contain the memory arcpy leaks per tool call the workers are
+    replaced after about max_tasks tasks each: after workers * max_tasks tasks the pool is drained and new
+    tasks go to a new pool. (max_tasks_per_child is missing before Python 3.11 and can deadlock in 3.11 when a
+    worker is replaced.) At most workers tasks are submitted at a time, submit waits for a free slot, so there
+    are never more than workers processes and the tasks do not queue up in a pool that is to be replaced.
+    """
+
+    def __init__(self, workers=None, extensions=LICENCE_EXTENSIONS, scratch_workspace=None,
+                 max_tasks=MAX_TASKS_PER_WORKER):
+        self.workers = workers or default_workers()
+        self.initargs = (tuple(extensions), scratch_workspace)
+        self.max_tasks = max_tasks
+        self.submitted = 0
+        self._executor = None
+        # a slot per worker, taken by submit and given back when the task is done
+        self._slots = threading.BoundedSemaphore(self.workers)
+
+    def _new_executor(self):
+        set_python_executable()
+
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_arcpy_worker, initargs=self.initargs)
+
+    def _release_slot(self, future):
+        self._slots.release()
+
+    def submit(self, function, *args):
+        if self._executor is not None and self.max_tasks and self.submitted >= self.workers * self.max_tasks:
+            # the running tasks finish (and the old workers end) before the new pool starts its workers
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._executor is None:
+            self._executor = self._new_executor()
+            self.submitted = 0
+
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        self.submitted += 1
+        future.add_done_callback(self._release_slot)
+        return future
+
+    def run_tasks(self, function, tasks):
+        # Runs function(*task) for every task and returns the results in task order. The tasks are submitted
+        # as the workers become free.
+        futures = [self.submit(function, *task) for task in tasks]
+        return [future.result() for future in futures]
+
+    def run_unordered(self, function, tasks):
+        # Yields the result of function(*task) for every task as the tasks complete. A task is submitted when
+        # a worker is free, so the caller gets the first results (e.g. to report progress) while tasks are
+        # still to be submitted.
+        pending = set()
+        for task in tasks:
+            if len(pending) >= self.workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(self.submit(function, *task))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        return False
@@ -0,0 +1,199 @@
+# -------------------------------------------------------------------------------
+# Name:        pipeline_lib
+# Purpose:     Small DAG executor for the extraction stages. Completed stages are recorded in a
+#              checkpoint manifest, a re-run resumes from the first stage whose inputs or parameters changed.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import json
+import time
+import hashlib
+
+import instrumentation
+import profiling
+
+# Constants
+MANIFEST_FILE = "pipeline_manifest.json"
+MANIFEST_VERSION = 1
+
+
+class PipelineError(Exception):
+
+    """
+    Raised when the stages of a pipeline can not be ordered (unknown or circular dependency).
+    """
+
+    pass
+
+
+def path_fingerprint(path):
+    # [size, modification time] of a file, of every file for a folder (e.g. a file geodatabase), None if missing
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    if os.path.isdir(path):
+        files = []
+        for folder, _, names in os.walk(path):
+            for name in sorted(names):
+                if name.lower().endswith(".lock"):
+                    continue
+                full_name = os.path.join(folder, name)
+                stat = os.stat(full_name)
+                files.append([os.path.relpath(full_name, path), stat.st_size, stat.st_mtime_ns])
+        return sorted(files)
+
+    return None
+
+
+def output_exists(path):
+    # Datasets inside a geodatabase are not files, arcpy checks those
+    if ".gdb" in path.lower() and not path.lower().endswith(".gdb"):
+        import arcpy
+        return arcpy.Exists(path)
+
+    return os.path.exists(path)
+
+
+class Stage(object):
+
+    def __init__(self, name, function, inputs=(), outputs=(), params=None, depends=(), updates=()):
+        # function: called without arguments to run the stage
+        # inputs: files / folders read by the stage, outputs: datasets written by the stage
+        # params: parameters of the stage (JSON serializable), depends: names of the upstream stages
+        # updates: input files the stage edits in place (e.g. LAS files that are classified)
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.depends = list(depends)
+        self.updates = list(updates)
+
+
+class Pipeline(object):
+
+    def __init__(self, folder, manifest_file=MANIFEST_FILE, message=print, profile_folder=None):
+        # profile_folder: every stage that runs is profiled to this folder (see profiling), None to not profile
+        self.manifest_file = os.path.join(folder, manifest_file)
+        self.message = message
+        self.profile_folder = profile_folder
+        self.stages = {}
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+
+        return {"version": MANIFEST_VERSION, "settings": {}, "stages": {}, "files": {}}
+
+    def save_manifest(self):
+        # written to a temporary file first, a crash never leaves a partial manifest
+        temp_file = self.manifest_file + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(temp_file, self.manifest_file)
+
+    def setting(self, key, default):
+        # Value kept across runs (e.g. the name of the output geodatabase of the first run)
+        settings = self.manifest["settings"]
+        if key not in settings:
+            settings[key] = default
+            self.save_manifest()
+
+        return settings[key]
+
+    def add_stage(self, name, function, inputs=(), outputs=(), params=None, depends=(), updates=()):
+        self.stages[name] = Stage(name, function, inputs, outputs, params, depends, updates)
+        return self.stages[name]
+
+    def order(self):
+        # Stages in dependency order, stages without a dependency between them keep the order they were added
+        ordered = []
+        done = set()
+        pending = list(self.stages.values())
+        for stage in pending:
+            for name in stage.depends:
+                if name not in self.stages:
+                    raise PipelineError("Stage " + stage.name + " depends on the unknown stage " + name + ".")
+
+        while pending:
+            ready = [s for s in pending if all(d in done for d in s.depends)]
+            if not ready:
+                raise PipelineError("Circular dependency between the stages " +
+                                    ", ".join(s.name for s in pending) + ".")
+            ordered.append(ready[0])
+            done.add(ready[0].name)
+            pending.remove(ready[0])
+
+        return ordered
+
+    def fingerprint(self, stage):
+        # Hash of the parameters, the current state of the inputs and the completed runs of the upstream stages
+        inputs = []
+        for path in stage.inputs:
+            inputs.append([path, self._input_fingerprint(path)])
+
+        upstream = [[name, self.manifest["stages"].get(name, {}).get("completed")] for name in stage.depends]
+        content = json.dumps({"name": stage.name, "params": stage.params, "inputs": inputs, "upstream": upstream},
+                             sort_keys=True, default=str)
+
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def _input_fingerprint(self, path):
+        # Files edited in place by a completed stage count as unchanged while they still have the state
+        # that stage left them in
+        fingerprint = path_fingerprint(path)
+        record = self.manifest["files"].get(os.path.abspath(path))
+        if record and fingerprint == record["after"]:
+            return record["before"]
+
+        return fingerprint
+
+    def is_current(self, stage):
+        record = self.manifest["stages"].get(stage.name)
+        if not record or record.get("fingerprint") != self.fingerprint(stage):
+            return False
+
+        return all(output_exists(path) for path in stage.outputs)
+
+    def run(self):
+        # Runs the stages that are not current, in dependency order. Returns the names of the stages that ran.
+        executed = []
+        for stage in self.order():
+            if self.is_current(stage):
+                self.message("Stage {0} is up to date, skipped".format(stage.name))
+                continue
+
+            fingerprint = self.fingerprint(stage)
+            before = {os.path.abspath(p): self._input_fingerprint(p) for p in stage.updates}
+
+            self.message("Running stage {0}".format(stage.name))
+            # the record of a stage is removed before it runs, a failed stage is never current
+            self.manifest["stages"].pop(stage.name, None)
+            self.save_manifest()
+
+            with instrumentation.span(stage.name) as stage_span:
+                if self.profile_folder:
+                    with profiling.StageProfile(self.profile_folder, stage.name):
+                        stage.function()
+                else:
+                    stage.function()
+
+            for path, fingerprint_before in before.items():
+                self.manifest["files"][path] = {"before": fingerprint_before, "after": path_fingerprint(path)}
+            self.manifest["stages"][stage.name] = {"fingerprint": fingerprint,
+                                                   "completed": time.time(),
+                                                   "seconds": round(stage_span.elapsed, 3),
+                                                   "outputs": stage.outputs}
+            self.save_manifest()
+            executed.append(stage.name)
+
+        return executed
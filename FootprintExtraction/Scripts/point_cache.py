@@ -0,0 +1,203 @@
+# -------------------------------------------------------------------------------
+# Name:        point_cache
+# Purpose:     Compact per tile point sidecar: quantized X/Y/Z, class and return columns
+#              sorted by class, so later stages only map the classes they need
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import json
+import shutil
+import uuid
+
+import numpy as np
+
+import las_io
+import parallel_lib
+import void_fill
+
+# Constants
+SIDECAR_EXTENSION = ".pts"
+SIDECAR_VERSION = 1
+HEADER_FILE = "header.json"
+CACHE_FOLDER = "point_cache"      # sidecar folder of cached_sidecars in the scratch folder
+COLUMNS = ("x", "y", "z", "class", "returns", "index")
+
+# Sidecar layout, one folder per tile (<tile>.pts):
+#   header.json  source file, scale / offset, bounds and the [start, stop) row range of every class
+#   x.npy, y.npy, z.npy  int32, the record values of the LAS file (scaled with scale / offset)
+#   class.npy    uint8 class code
+#   returns.npy  uint8 return number (low 4 bits) and number of returns (high 4 bits)
+#   index.npy    position of the point in the LAS file
+# A sidecar is written to a temporary folder next to it and renamed into place when it is complete, so runs
+# sharing a cache folder never see (or mix) the columns of a sidecar that is still being written.
+
+
+def sidecar_path(las_file, folder):
+    return os.path.join(folder, os.path.splitext(os.path.basename(las_file))[0] + SIDECAR_EXTENSION)
+
+
+def write_sidecar(las_file, folder, classes=None, exclude=None):
+    # Writes the sidecar of a LAS file. classes: class codes of all point records (e.g. a classifier result),
+    # the classification of the file when None. Withheld points and the points in exclude (e.g. noise) are left out.
+    header, points = las_io.read_points(las_file)
+    if classes is None:
+        classes = las_io.classification(header, points)
+    classes = np.asarray(classes, dtype=np.uint8)
+
+    keep = ~las_io.withheld(header, points)
+    if exclude is not None:
+        keep &= ~exclude
+    index = np.flatnonzero(keep)
+
+    # sort by class, every class becomes one contiguous row range (radix sort for uint8)
+    index = index[np.argsort(classes[index], kind="stable")]
+    sorted_classes = classes[index]
+    codes, starts, counts = np.unique(sorted_classes, return_index=True, return_counts=True)
+
+    number, count = las_io.return_numbers(header, points)
+
+    path = sidecar_path(las_file, folder)
+    temp_path = "{0}.{1}.tmp".format(path, uuid.uuid4().hex)
+    os.makedirs(temp_path)
+
+    columns = {"x": points["X"][index], "y": points["Y"][index], "z": points["Z"][index],
+               "class": sorted_classes,
+               "returns": (np.asarray(number[index], dtype=np.uint8) | (np.asarray(count[index], dtype=np.uint8) << 4)),
+               "index": index}
+    for name in COLUMNS:
+        np.save(os.path.join(temp_path, name + ".npy"), np.ascontiguousarray(columns[name]))
+
+    stat = os.stat(las_file)
+    sidecar_header = {"version": SIDECAR_VERSION,
+                      "source": os.path.abspath(las_file),
+                      "source_size": stat.st_size,
+                      "source_mtime": stat.st_mtime,
+                      "point_count": int(index.size),
+                      "scale": list(header.scale),
+                      "offset": list(header.offset),
+                      "min": list(header.min),
+                      "max": list(header.max),
+                      "classes": {str(int(c)): [int(s), int(s + n)] for c, s, n in zip(codes, starts, counts)}}
+
+    # header last, a sidecar without header is incomplete
+    with open(os.path.join(temp_path, HEADER_FILE), "w") as f:
+        json.dump(sidecar_header, f, indent=1)
+
+    _move_into_place(temp_path, path, las_file)
+
+    return path
+
+
+def _move_into_place(temp_path, path, las_file):
+    # A folder can not be renamed over an existing one, the old sidecar is renamed aside first. When another
+    # run put a current sidecar in place in between (or the old one is open, e.g. memory mapped on Windows,
+    # and current) that one is kept.
+    try:
+        if os.path.exists(path):
+            old_path = "{0}.{1}.old".format(path, uuid.uuid4().hex)
+            os.replace(path, old_path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(temp_path, path)
+    except OSError:
+        if not is_current(path, las_file):
+            raise
+    finally:
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+
+def read_header(path):
+    with open(os.path.join(path, HEADER_FILE), "r") as f:
+        return json.load(f)
+
+
+def is_current(path, las_file):
+    # True if the sidecar exists and was written from the current version of las_file
+    if not os.path.exists(os.path.join(path, HEADER_FILE)):
+        return False
+
+    header = read_header(path)
+    stat = os.stat(las_file)
+
+    return header["version"] == SIDECAR_VERSION and header["source_size"] == stat.st_size and \
+        header["source_mtime"] == stat.st_mtime
+
+
+def class_rows(header, class_codes):
+    # Row ranges of the class codes, codes without points are left out
+    return [tuple(header["classes"][str(c)]) for c in class_codes if str(c) in header["classes"]]
+
+
+def read_columns(path, class_codes, columns=("x", "y", "z")):
+    # Raw column values of the points with the class codes. The columns are memory mapped, only the
+    # row ranges of the requested classes are read.
+    header = read_header(path)
+    rows = class_rows(header, class_codes)
+
+    out = []
+    for name in columns:
+        column = np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+        out.append(np.concatenate([column[start:stop] for start, stop in rows]) if rows else column[0:0].copy())
+
+    return out
+
+
+def read_xyz(path, class_codes, last_return=False):
+    # Scaled coordinates of the points with the class codes
+    header = read_header(path)
+    columns = ("x", "y", "z", "returns") if last_return else ("x", "y", "z")
+    values = read_columns(path, class_codes, columns)
+
+    if last_return:
+        returns = values.pop()
+        keep = (returns & 0x0F) == (returns >> 4)
+        values = [v[keep] for v in values]
+
+    return [v * s + o for v, s, o in zip(values, header["scale"], header["offset"])]
+
+
+def write_sidecars(las_files, folder, results=None, exclude=None, workers=None):
+    # Sidecars for a set of files. results: optional classifier output {las_file: class array or .npy file},
+    # exclude: optional {las_file: mask} of points to leave out. Returns {las_file: sidecar path}.
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    tasks = []
+    for las_file in las_files:
+        classes = results[las_file] if results else None
+        if isinstance(classes, str):
+            classes = np.load(classes)
+        tasks.append((las_file, folder, classes, exclude[las_file] if exclude else None))
+
+    paths = parallel_lib.run_tasks(write_sidecar, tasks, workers)
+
+    return dict(zip(las_files, paths))
+
+
+def cached_sidecars(las_files, folder, workers=None):
+    # Sidecars of the LAS files in a cache folder, only missing sidecars and those of changed LAS files are
+    # (re)written. The classification of the files is used and withheld points are left out.
+    # Returns the sidecar paths in the order of las_files.
+    paths = [sidecar_path(f, folder) for f in las_files]
+    stale = [f for f, p in zip(las_files, paths) if not is_current(p, f)]
+    if stale:
+        write_sidecars(stale, folder, workers=workers)
+
+    return paths
+
+
+def binning_surface(paths, cell_size, class_codes, method="MAXIMUM", fill_method=void_fill.LINEAR,
+                    last_return=False, workers=1, extent=None, snap=None):
+    # Surface from the sidecars, only the rows of the class codes are read.
+    # Same result as void_fill.binning_surface_from_las on the LAS files with the same filter.
+    # extent, snap: see void_fill.binning_surface_from_tiles
+    headers = [read_header(p) for p in paths]
+    bounds = [(h["min"][0], h["min"][1], h["max"][0], h["max"][1]) for h in headers]
+
+    def load(i):
+        return read_xyz(paths[i], class_codes, last_return)
+
+    return void_fill.binning_surface_from_tiles(bounds, load, cell_size, method, fill_method, workers, extent, snap)
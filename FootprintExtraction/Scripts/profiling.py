@@ -0,0 +1,109 @@
+# -------------------------------------------------------------------------------
+# Name:        profiling
+# Purpose:     Opt-in profiling of the pipeline stages. A profiled stage runs under cProfile (<stage>.pstats) while
+#              a sampler thread records its stacks in the collapsed format of flamegraph.pl / speedscope
+#              (<stage>.folded). Nothing is profiled unless a profile folder is given or PROFILE_ENV is set.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import sys
+import cProfile
+import threading
+
+# Constants
+PROFILE_ENV = "BUILDING_EXTRACTION_PROFILE"     # folder for the profiles
+SAMPLE_SECONDS = 0.005                          # interval of the stack sampler
+PSTATS_EXTENSION = ".pstats"
+FOLDED_EXTENSION = ".folded"
+
+
+def profile_folder(folder=None, default_folder=None):
+    # Folder for the profiles: folder (e.g. a toolbox parameter), else PROFILE_ENV. PROFILE_ENV may also be
+    # "1" to write to default_folder. None when profiling is off.
+    folder = folder or os.environ.get(PROFILE_ENV)
+    if not folder or folder == "0":
+        return None
+    if folder == "1":
+        folder = default_folder
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    return folder
+
+
+def frame_label(code):
+    # function (file:line), without the frame separator of the collapsed format
+    label = "{0} ({1}:{2})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+    return label.replace(";", ",")
+
+
+class StackSampler(object):
+
+    """
+    Samples the Python stack of one thread every interval seconds from a background thread.
+    sys._current_frames works on every platform, also where signal based samplers (setitimer) are missing.
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_SECONDS):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="stack sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write(self, out_file):
+        # one "root;...;leaf count" line per distinct stack
+        with open(out_file, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write("{0} {1}\n".format(stack, count))
+
+
+class StageProfile(object):
+
+    """
+    Profiles the code run inside the with block: with StageProfile(folder, "FootprintsFromRaster"): ...
+    Writes <folder>/<name>.pstats (pstats.Stats, snakeviz) and <folder>/<name>.folded (flamegraph.pl).
+    """
+
+    def __init__(self, folder, name, interval=SAMPLE_SECONDS):
+        self.pstats_file = os.path.join(folder, name + PSTATS_EXTENSION)
+        self.folded_file = os.path.join(folder, name + FOLDED_EXTENSION)
+        self.interval = interval
+
+    def __enter__(self):
+        self.sampler = StackSampler(interval=self.interval).start()
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.disable()
+        self.sampler.stop()
+        self.profiler.dump_stats(self.pstats_file)
+        self.sampler.write(self.folded_file)
+        return False
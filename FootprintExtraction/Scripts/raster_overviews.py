@@ -0,0 +1,210 @@
+# -------------------------------------------------------------------------------
+# Name:        raster_overviews
+# Purpose:     Overview levels (2x, 4x, 8x) of the intermediate grids with a reducer per grid type,
+#              computed block parallel and stored as block rasters
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import block_raster
+import grid_lib
+
+# Constants
+MODE = "MODE"                     # class rasters: most frequent class, ties to the lowest class code
+MAXIMUM = "MAXIMUM"               # surface models (DSM)
+MINIMUM = "MINIMUM"               # ground surfaces (DTM)
+ANY = "ANY"                       # masks: set if any cell is set
+REDUCERS = (MODE, MAXIMUM, MINIMUM, ANY)
+OVERVIEW_FACTORS = (2, 4, 8)
+DEFAULT_BLOCK_SIZE = 512          # cells per block, must be a multiple of every factor
+MAX_COUNTED_VALUES = 32           # mode by counting the values up to this many distinct values, else by sorting
+
+
+def overview_spec(spec, factor):
+    # GridSpec of an overview level, same origin, the last row / column may cover a partial block of cells
+    return grid_lib.GridSpec(spec.x_min, spec.y_max, spec.cell_size * factor,
+                             -(-spec.n_rows // factor), -(-spec.n_cols // factor))
+
+
+def reduce_grid(a, factor, reducer, nodata):
+    # One overview level of a: every factor x factor group of cells becomes one cell.
+    # NoData cells are ignored, a cell is NoData only when all cells of its group are NoData.
+    n_rows, n_cols = a.shape
+    out_rows = -(-n_rows // factor)
+    out_cols = -(-n_cols // factor)
+
+    padded = np.full((out_rows * factor, out_cols * factor), nodata, dtype=a.dtype)
+    padded[:n_rows, :n_cols] = a
+    groups = padded.reshape(out_rows, factor, out_cols, factor).swapaxes(1, 2).reshape(out_rows, out_cols, -1)
+
+    valid = _valid(groups, nodata)
+    has_data = valid.any(axis=-1)
+
+    if reducer == ANY:
+        out = (valid & (groups != 0)).any(axis=-1).astype(a.dtype)
+        out[~has_data] = nodata
+        return out
+
+    if reducer in (MAXIMUM, MINIMUM):
+        if np.issubdtype(a.dtype, np.floating):
+            fill = -np.inf if reducer == MAXIMUM else np.inf
+        else:
+            info = np.iinfo(a.dtype)
+            fill = info.min if reducer == MAXIMUM else info.max
+        values = np.where(valid, groups, fill)
+        out = values.max(axis=-1) if reducer == MAXIMUM else values.min(axis=-1)
+        out[~has_data] = nodata
+        return out
+
+    if reducer == MODE:
+        return _mode(groups, valid, has_data, nodata)
+
+    raise ValueError("Unknown overview reducer " + str(reducer) + ", use one of " + ", ".join(REDUCERS) + ".")
+
+
+def _valid(values, nodata):
+    if np.issubdtype(values.dtype, np.floating):
+        valid = ~np.isnan(values)
+        if nodata is not None and not np.isnan(nodata):
+            valid &= values != nodata
+        return valid
+
+    return values != nodata
+
+
+def _mode(groups, valid, has_data, nodata):
+    # Class rasters have few distinct values: count every value, the lowest value wins ties
+    codes = np.unique(groups[valid]) if np.issubdtype(groups.dtype, np.integer) else None
+    if codes is not None and codes.size <= MAX_COUNTED_VALUES:
+        out = np.full(has_data.shape, nodata, dtype=groups.dtype)
+        best = np.zeros(has_data.shape, dtype=np.int32)
+        for code in codes:
+            count = np.count_nonzero(groups == code, axis=-1)
+            better = count > best
+            out[better] = code
+            best[better] = count[better]
+        return out
+
+    # Sorted values of every group, the longest run of equal valid values is the mode.
+    # argmax takes the first longest run, which is the lowest value.
+    order = np.argsort(groups, axis=-1, kind="stable")
+    values = np.take_along_axis(groups, order, axis=-1)
+    valid = np.take_along_axis(valid, order, axis=-1)
+
+    size = values.shape[-1]
+    position = np.broadcast_to(np.arange(size), values.shape)
+    new_run = np.ones(values.shape, dtype=bool)
+    new_run[..., 1:] = values[..., 1:] != values[..., :-1]
+    run_start = np.maximum.accumulate(np.where(new_run, position, 0), axis=-1)
+    run_length = np.where(valid, position - run_start + 1, 0)
+
+    best = run_length.argmax(axis=-1)
+    out = np.take_along_axis(values, best[..., None], axis=-1)[..., 0]
+    out[~has_data] = nodata
+
+    return out
+
+
+def reduce_block(a, reducer, nodata, factors=OVERVIEW_FACTORS):
+    # All overview levels of a. MAXIMUM, MINIMUM and ANY are computed from the previous level,
+    # MODE always from the full resolution cells (the mode of modes is not the mode).
+    levels = {}
+    previous, previous_factor = a, 1
+    for factor in sorted(factors):
+        if reducer == MODE or factor % previous_factor:
+            levels[factor] = reduce_grid(a, factor, reducer, nodata)
+        else:
+            levels[factor] = reduce_grid(previous, factor // previous_factor, reducer, nodata)
+            previous, previous_factor = levels[factor], factor
+
+    return levels
+
+
+def build_overviews(a, reducer, nodata, factors=OVERVIEW_FACTORS, block_size=DEFAULT_BLOCK_SIZE, workers=1):
+    # Returns {factor: overview array} of a full grid, block parallel (numpy releases the GIL)
+    def read(core):
+        return a[core]
+
+    levels = {f: np.full((-(-a.shape[0] // f), -(-a.shape[1] // f)), nodata, dtype=a.dtype) for f in factors}
+
+    def write(factor, b_row, b_col, values):
+        size = block_size // factor
+        levels[factor][b_row * size:b_row * size + values.shape[0], b_col * size:b_col * size + values.shape[1]] = \
+            values
+
+    _run_blocks(a.shape, read, write, reducer, nodata, factors, block_size, workers)
+
+    return levels
+
+
+def write_overviews(path, spec, a, reducer, nodata, factors=OVERVIEW_FACTORS, block_size=DEFAULT_BLOCK_SIZE,
+                    workers=1):
+    # Overview levels of the grid a (spec) as block rasters <path>_ov<factor>.blk.
+    # Returns {factor: block raster path}.
+    def read(core):
+        return a[core]
+
+    return _write_levels(path, spec, a.shape, a.dtype, read, reducer, nodata, factors, block_size, workers)
+
+
+def write_mosaic_overviews(mosaic, path, reducer=MODE, factors=OVERVIEW_FACTORS, block_size=DEFAULT_BLOCK_SIZE,
+                           workers=1):
+    # Overview levels of a virtual_mosaic.VirtualMosaic, the mosaic is read one block window at a time.
+    # The levels are recorded in the mosaic (save the index afterwards). Returns {factor: block raster path}.
+    spec = mosaic.grid_spec()
+
+    def read(core):
+        return mosaic.read_cells(core[0].start, core[1].start, core[0].stop - core[0].start,
+                                 core[1].stop - core[1].start)
+
+    paths = _write_levels(path, spec, (spec.n_rows, spec.n_cols), np.dtype(mosaic.dtype), read, reducer,
+                          mosaic.nodata, factors, block_size, workers)
+    for factor, level_path in paths.items():
+        mosaic.add_overview(factor, level_path)
+
+    return paths
+
+
+def overview_path(path, factor):
+    return os.path.splitext(path)[0] + "_ov" + str(factor) + block_raster.BLOCK_RASTER_EXTENSION
+
+
+def _write_levels(path, spec, shape, dtype, read, reducer, nodata, factors, block_size, workers):
+    rasters = {}
+    for factor in factors:
+        # every block of the grid is one block of every level
+        rasters[factor] = block_raster.BlockRaster.create(overview_path(path, factor), overview_spec(spec, factor),
+                                                          dtype, nodata, block_size // factor)
+
+    def write(factor, b_row, b_col, values):
+        rasters[factor].write_block(b_row, b_col, values)
+
+    _run_blocks(shape, read, write, reducer, nodata, factors, block_size, workers)
+
+    return {factor: raster.path for factor, raster in rasters.items()}
+
+
+def _run_blocks(shape, read, write, reducer, nodata, factors, block_size, workers):
+    if any(block_size % factor for factor in factors):
+        raise ValueError("The block size " + str(block_size) + " must be a multiple of the overview factors.")
+
+    blocks = list(grid_lib.iter_blocks(shape, block_size))
+
+    def process(block):
+        b_row, b_col, _, core, _ = block
+        for factor, values in reduce_block(read(core), reducer, nodata, factors).items():
+            write(factor, b_row, b_col, values)
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(process, blocks))
+    else:
+        for block in blocks:
+            process(block)
@@ -0,0 +1,139 @@
+# -------------------------------------------------------------------------------
+# Name:        scratch_workspace
+# Purpose:     Scratch workspaces with a unique name per run, worker or task (a folder, a file geodatabase in its own
+#              folder or a namespace in the in_memory workspace). The intermediate data of a run is created through
+#              its workspace, which deletes all of it when the run ends, so concurrent runs do not share names.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import uuid
+import shutil
+import tempfile
+
+import common_lib
+import lazy_imports
+
+arcpy = lazy_imports.lazy_import("arcpy")
+
+# Constants
+FOLDER = "folder"
+GDB = "gdb"
+MEMORY = "memory"
+MEMORY_WORKSPACE = "in_memory"
+SCRATCH_PREFIX = "scratch"
+GDB_NAME = "scratch.gdb"
+
+
+def unique_name(prefix=SCRATCH_PREFIX):
+    # prefix_pid_random, a valid dataset, layer and folder name when prefix starts with a letter
+    return "{0}_{1}_{2}".format(prefix, os.getpid(), uuid.uuid4().hex[:8])
+
+
+def default_folder():
+    # scratch folder of the geoprocessing environment, the temp folder without arcpy
+    try:
+        folder = arcpy.env.scratchFolder
+    except ImportError:
+        folder = None
+
+    return folder or tempfile.gettempdir()
+
+
+class ScratchWorkspace(object):
+
+    """
+    A scratch workspace of kind FOLDER, GDB or MEMORY, opened on enter and deleted with all the intermediate data
+    created through path() and layer() on exit:
+
+        with ScratchWorkspace(home_directory, "footprints") as scratch:
+            bldg_poly = scratch.path("bldg_poly")
+
+    FOLDER and GDB workspaces get a folder of their own in base_folder, with keep the data is left for debugging.
+    """
+
+    def __init__(self, base_folder=None, prefix=SCRATCH_PREFIX, kind=GDB, keep=False):
+        self.base_folder = base_folder
+        self.name = unique_name(prefix)
+        self.kind = kind
+        self.keep = keep
+        self.folder = None
+        self.workspace = None
+        self.items = []
+
+    def open(self):
+        if self.workspace is not None:
+            return self
+
+        if self.kind == MEMORY:
+            self.workspace = MEMORY_WORKSPACE
+            return self
+
+        self.folder = os.path.join(self.base_folder or default_folder(), self.name)
+        os.makedirs(self.folder)
+        if self.kind == GDB:
+            arcpy.CreateFileGDB_management(self.folder, GDB_NAME)
+            self.workspace = os.path.join(self.folder, GDB_NAME)
+        else:
+            self.workspace = self.folder
+
+        return self
+
+    def track(self, item):
+        # item is deleted on close
+        if item not in self.items:
+            self.items.append(item)
+        return item
+
+    def path(self, name):
+        # path of an intermediate dataset, names in the in_memory workspace get the namespace of the workspace
+        self.open()
+        if self.kind == MEMORY:
+            name = self.name + "_" + name
+        return self.track(os.path.join(self.workspace, name))
+
+    def layer(self, name):
+        # unique name for an intermediate layer
+        return self.track(self.name + "_" + name)
+
+    def delete(self, item):
+        if item in self.items:
+            self.items.remove(item)
+        if arcpy.Exists(item):
+            arcpy.Delete_management(item)
+        common_lib.invalidate_describe(item)
+
+    def close(self):
+        if self.workspace is None:
+            return
+
+        if self.keep:
+            arcpy.AddMessage("Intermediate data kept in " + str(self.folder or self.workspace))
+        else:
+            # the last created first, a layer before its data. The data in the folder goes with the folder.
+            for item in reversed(list(self.items)):
+                try:
+                    if self.folder and item.startswith(self.folder):
+                        common_lib.invalidate_describe(item)
+                    else:
+                        self.delete(item)
+                except Exception as e:
+                    arcpy.AddWarning("Could not delete intermediate data " + item + ": " + str(e))
+            if self.kind == GDB and arcpy.Exists(self.workspace):
+                arcpy.ClearWorkspaceCache_management(self.workspace)
+                arcpy.Delete_management(self.workspace)
+            if self.folder:
+                shutil.rmtree(self.folder, ignore_errors=True)
+
+        self.items = []
+        self.workspace = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
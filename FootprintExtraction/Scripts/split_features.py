@@ -15,17 +15,17 @@
 
 # -------------------------------------------------------------------------------
 
-import arcpy
 import sys
 import time
-import importlib
 import os
 import common_lib
-if 'common_lib' in sys.modules:
-    importlib.reload(common_lib)
+import field_engine
+import lazy_imports
 
 from common_lib import create_msg_body, msg
 
+arcpy = lazy_imports.lazy_import("arcpy")
+
 # Constants
 WARNING = "warning"
 
@@ -42,8 +42,7 @@ def split(scratch_ws, lc_input_features, lc_split_features, lc_minimum_area, lc_
             PRESPLITFIELD = "PRESPLIT_FID"
 
             # Keep original input feature OBJECTID as TEXT. copy to PRESPLITFIELD.
-            common_lib.delete_add_field(lc_input_features, PRESPLITFIELD, "LONG")
-            arcpy.CalculateField_management(lc_input_features, PRESPLITFIELD, "!OBJECTID!", "PYTHON_9.3", None)
+            field_engine.calculate_fields(lc_input_features, [], {PRESPLITFIELD: ("LONG", field_engine.copy_oid)})
 
             # use Identity to split the input features
             # copy feature class to capture selection
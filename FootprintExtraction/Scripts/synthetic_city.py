@@ -0,0 +1,249 @@
+# -------------------------------------------------------------------------------
+# Name:        synthetic_city
+# Purpose:     Deterministic synthetic LAS tiles of a small city: terrain, rectangular, L-shaped and
+#              circular buildings with known footprints, vegetation and noise. Used by the benchmark.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import json
+import math
+
+import numpy as np
+
+import grid_lib
+import las_io
+import las_writer
+
+# Constants, in meters
+DEFAULT_SEED = 1
+DEFAULT_TILE_SIZE = 250.0
+DEFAULT_DENSITY = 8.0             # points per square meter
+DEFAULT_ORIGIN = (500000.0, 4000000.0)
+LOT_SIZE = 40.0                   # parcels on a regular grid, one building per parcel at most
+LOT_MARGIN = 4.0                  # buildings stay this far inside their parcel
+BUILDING_FRACTION = 0.7           # parcels with a building
+VEGETATION_FRACTION = 0.1         # part of the area covered by tree crowns
+NOISE_FRACTION = 0.001            # points moved far above or below the surface
+ROOF_NOISE = 0.03                 # standard deviation of the roof points
+TRUTH_FILE = "city_truth.json"
+TRUTH_VERSION = 1
+
+RECTANGLE = "RECTANGLE"
+L_SHAPED = "L_SHAPED"
+CIRCULAR = "CIRCULAR"
+SHAPES = (RECTANGLE, L_SHAPED, CIRCULAR)
+SHAPE_WEIGHTS = (0.5, 0.3, 0.2)
+CIRCLE_VERTICES = 64
+
+
+def terrain(x, y):
+    # Ground elevation, gentle hills
+    return 1500.0 + 8.0 * np.sin(np.asarray(x) / 300.0) + 5.0 * np.cos(np.asarray(y) / 220.0)
+
+
+def building_ring(shape, cx, cy, width, height, angle):
+    # Clockwise outer ring of a building footprint, closed (first vertex repeated)
+    if shape == CIRCULAR:
+        radius = min(width, height) / 2.0
+        t = -np.linspace(0.0, 2.0 * math.pi, CIRCLE_VERTICES, endpoint=False)
+        ring = np.column_stack([radius * np.cos(t), radius * np.sin(t)])
+    elif shape == L_SHAPED:
+        # rectangle with the north east quarter cut out
+        w, h = width / 2.0, height / 2.0
+        ring = np.array([(-w, -h), (-w, h), (0.0, h), (0.0, 0.0), (w, 0.0), (w, -h)])
+    else:
+        w, h = width / 2.0, height / 2.0
+        ring = np.array([(-w, -h), (-w, h), (w, h), (w, -h)])
+
+    cos_a, sin_a = math.cos(angle), math.sin(angle)
+    x = cx + ring[:, 0] * cos_a - ring[:, 1] * sin_a
+    y = cy + ring[:, 0] * sin_a + ring[:, 1] * cos_a
+    ring = np.column_stack([x, y])
+
+    return np.vstack([ring, ring[:1]])
+
+
+def ring_area(ring):
+    # Signed area, negative for clockwise rings
+    ring = np.asarray(ring, dtype=np.float64)
+    x, y = ring[:-1, 0], ring[:-1, 1]
+    x1, y1 = ring[1:, 0], ring[1:, 1]
+    return 0.5 * float(np.sum(x * y1 - x1 * y))
+
+
+def points_in_ring(x, y, ring):
+    # Even odd rule, vectorized over the points
+    ring = np.asarray(ring, dtype=np.float64)
+    inside = np.zeros(np.shape(x), dtype=bool)
+    for (x0, y0), (x1, y1) in zip(ring[:-1], ring[1:]):
+        if y0 == y1:
+            continue
+        crosses = (y0 > y) != (y1 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= crosses & (x < x_cross)
+
+    return inside
+
+
+def rasterize_rings(spec, rings_list, labels=None):
+    # Cells of a grid (GridSpec) whose center is inside the footprints, each footprint a list of rings
+    # (outer ring and holes). Returns a label grid (1..n in the order of rings_list, or labels when given).
+    out = np.zeros((spec.n_rows, spec.n_cols), dtype=np.int64)
+    for i, rings in enumerate(rings_list):
+        outer = np.asarray(rings[0], dtype=np.float64)
+        window, row0, col0 = grid_lib.window_spec(spec, (outer[:, 0].min(), outer[:, 1].min(),
+                                                         outer[:, 0].max(), outer[:, 1].max()))
+        if window.n_rows == 0 or window.n_cols == 0:
+            continue
+        rows, cols = np.mgrid[0:window.n_rows, 0:window.n_cols]
+        x, y = grid_lib.cell_centers(window, rows, cols)
+        inside = np.zeros(rows.shape, dtype=bool)
+        for ring in rings:
+            inside ^= points_in_ring(x, y, ring)
+        target = out[row0:row0 + window.n_rows, col0:col0 + window.n_cols]
+        target[inside] = labels[i] if labels is not None else i + 1
+
+    return out
+
+
+def generate_buildings(rng, extent):
+    # Parcels of the extent and a building on BUILDING_FRACTION of them.
+    # Returns (buildings, parcels) as lists of dicts with rings in map units.
+    x_min, y_min, x_max, y_max = extent
+    buildings = []
+    parcels = []
+    for row in range(int((y_max - y_min) // LOT_SIZE)):
+        for col in range(int((x_max - x_min) // LOT_SIZE)):
+            lx, ly = x_min + col * LOT_SIZE, y_min + row * LOT_SIZE
+            parcels.append({"id": len(parcels) + 1,
+                            "ring": [[lx, ly], [lx, ly + LOT_SIZE], [lx + LOT_SIZE, ly + LOT_SIZE],
+                                     [lx + LOT_SIZE, ly], [lx, ly]]})
+            if rng.random() >= BUILDING_FRACTION:
+                continue
+
+            shape = SHAPES[rng.choice(len(SHAPES), p=SHAPE_WEIGHTS)]
+            size = LOT_SIZE - 2 * LOT_MARGIN
+            angle = 0.0 if shape == CIRCULAR else rng.uniform(0.0, math.pi / 2.0)
+            # rotated buildings must still fit in the parcel
+            fit = size / (abs(math.cos(angle)) + abs(math.sin(angle)))
+            width = rng.uniform(0.4, 1.0) * fit
+            height = rng.uniform(0.4, 1.0) * fit
+            ring = building_ring(shape, lx + LOT_SIZE / 2.0, ly + LOT_SIZE / 2.0, width, height, angle)
+            buildings.append({"id": len(buildings) + 1, "shape": shape, "parcel": parcels[-1]["id"],
+                              "height": float(rng.uniform(4.0, 20.0)),
+                              "rings": [ring.round(3).tolist()],
+                              "area": -ring_area(ring)})
+
+    return buildings, parcels
+
+
+def generate_tile(rng, extent, buildings, trees, density):
+    # x, y, z, class of the points of one tile. Ground points are classified (2), the rest is unassigned (1).
+    x_min, y_min, x_max, y_max = extent
+    n = rng.poisson(density * (x_max - x_min) * (y_max - y_min))
+    x = rng.uniform(x_min, x_max, n)
+    y = rng.uniform(y_min, y_max, n)
+    ground = terrain(x, y)
+    z = ground + rng.normal(0.0, 0.02, n)
+    classes = np.full(n, las_io.GROUND, dtype=np.uint8)
+
+    # points sorted by x, the points near a building or tree are found by bisection
+    order = np.argsort(x)
+    x_sorted = x[order]
+
+    def near(bx_min, by_min, bx_max, by_max):
+        candidates = order[np.searchsorted(x_sorted, bx_min):np.searchsorted(x_sorted, bx_max, side="right")]
+        return candidates[(y[candidates] >= by_min) & (y[candidates] <= by_max)]
+
+    for building in buildings:
+        ring = np.asarray(building["rings"][0])
+        candidates = near(ring[:, 0].min(), ring[:, 1].min(), ring[:, 0].max(), ring[:, 1].max())
+        if candidates.size == 0:
+            continue
+        roof = candidates[points_in_ring(x[candidates], y[candidates], ring)]
+        base = float(terrain(ring[:-1, 0].mean(), ring[:-1, 1].mean()))
+        z[roof] = base + building["height"] + rng.normal(0.0, ROOF_NOISE, roof.size)
+        classes[roof] = 1
+
+    for tx, ty, radius, height in trees:
+        candidates = near(tx - radius, ty - radius, tx + radius, ty + radius)
+        d2 = (x[candidates] - tx) ** 2 + (y[candidates] - ty) ** 2
+        inside = (d2 < radius * radius) & (classes[candidates] == las_io.GROUND)
+        # canopy returns from the whole crown volume, some points reach the ground
+        hit = inside & (rng.random(candidates.size) < 0.7)
+        crown = candidates[hit]
+        shape = 1.0 - d2[hit] / (radius * radius)
+        z[crown] = ground[crown] + height * np.sqrt(shape) * rng.uniform(0.3, 1.0, crown.size)
+        classes[crown] = 1
+
+    noise = np.flatnonzero(rng.random(n) < NOISE_FRACTION)
+    z[noise] += np.where(rng.random(noise.size) < 0.5, -1.0, 1.0) * rng.uniform(50.0, 200.0, noise.size)
+    classes[noise] = 1
+
+    return x, y, z, classes
+
+
+def generate_trees(rng, extent, buildings):
+    # Tree crowns (x, y, radius, height) on VEGETATION_FRACTION of the area, away from the buildings
+    x_min, y_min, x_max, y_max = extent
+    count = int(VEGETATION_FRACTION * (x_max - x_min) * (y_max - y_min) / (math.pi * 3.5 ** 2))
+    boxes = np.array([[min(p[0] for p in b["rings"][0]), min(p[1] for p in b["rings"][0]),
+                       max(p[0] for p in b["rings"][0]), max(p[1] for p in b["rings"][0])] for b in buildings])
+    trees = []
+    for _ in range(count):
+        tx, ty = rng.uniform(x_min, x_max), rng.uniform(y_min, y_max)
+        radius, height = rng.uniform(2.0, 5.0), rng.uniform(5.0, 15.0)
+        if boxes.size and ((boxes[:, 0] - radius <= tx) & (tx <= boxes[:, 2] + radius) &
+                           (boxes[:, 1] - radius <= ty) & (ty <= boxes[:, 3] + radius)).any():
+            continue
+        trees.append((tx, ty, radius, height))
+
+    return trees
+
+
+def generate_city(out_folder, tiles_x=2, tiles_y=2, tile_size=DEFAULT_TILE_SIZE, density=DEFAULT_DENSITY,
+                  seed=DEFAULT_SEED, origin=DEFAULT_ORIGIN):
+    # Writes tiles_x x tiles_y LAS tiles and the true footprints (TRUTH_FILE) to out_folder.
+    # The same arguments always give the same files. Returns the truth (see load_truth).
+    if not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+
+    rng = np.random.default_rng(seed)
+    extent = (origin[0], origin[1], origin[0] + tiles_x * tile_size, origin[1] + tiles_y * tile_size)
+    buildings, parcels = generate_buildings(rng, extent)
+    trees = generate_trees(rng, extent, buildings)
+
+    las_files = []
+    point_count = 0
+    for row in range(tiles_y):
+        for col in range(tiles_x):
+            tile = (origin[0] + col * tile_size, origin[1] + row * tile_size,
+                    origin[0] + (col + 1) * tile_size, origin[1] + (row + 1) * tile_size)
+            # every tile has its own random stream, a tile does not change when the grid of tiles grows
+            tile_rng = np.random.default_rng([seed, row, col])
+            x, y, z, classes = generate_tile(tile_rng, tile, buildings, trees, density)
+            las_file = os.path.join(out_folder, "city_{0:03d}_{1:03d}.las".format(row, col))
+            las_writer.write_points(las_file, x, y, z, classes)
+            las_files.append(os.path.basename(las_file))
+            point_count += x.size
+
+    truth = {"version": TRUTH_VERSION, "seed": seed, "tile_size": tile_size, "density": density,
+             "extent": list(extent), "point_count": point_count, "las_files": las_files,
+             "buildings": buildings, "parcels": parcels, "trees": len(trees)}
+    with open(os.path.join(out_folder, TRUTH_FILE), "w") as f:
+        json.dump(truth, f)
+
+    return truth
+
+
+def load_truth(folder):
+    with open(os.path.join(folder, TRUTH_FILE), "r") as f:
+        truth = json.load(f)
+    truth["las_files"] = [os.path.join(folder, f) for f in truth["las_files"]]
+
+    return truth
@@ -0,0 +1,53 @@
+# -------------------------------------------------------------------------------
+# Name:        tile_rasters
+# Purpose:     Rasters of single LAS tiles, the tasks of the warm workers of create_building_mosaic. The tasks
+#              are in a module of their own, a worker process can not import a script that runs as __main__.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import time
+
+import lazy_imports
+
+arcpy = lazy_imports.lazy_import("arcpy")
+
+
+def las_tile_raster(file, spatialRef, cellSize, scratchFolder):
+    # Predominant class raster of one LAS file, runs in a warm worker (see parallel_lib.WarmPool).
+    # Returns the messages for the file, none when it worked.
+    try:
+        fullFileName = os.path.join(scratchFolder, file)
+        # Obtain file name without extension and add .las:
+        #fileName = "{0}".format(os.path.splitext(file)[0])
+        fileName=os.path.basename(file).split('.')[0]+"_las_dataset_layer"
+        file_basename = os.path.basename(fileName)
+        # Create Las Dataset Layers in scratch folder
+        inLASD = os.path.join(scratchFolder, "{0}.lasd".format(os.path.splitext(file)[0]))
+
+        arcpy.CreateLasDataset_management(fullFileName, inLASD, False, "", spatialRef, "COMPUTE_STATS")
+
+        # arcpy.MakeLasDatasetLayer_management(inLASD, fileName, 6,
+        #                                      "'Last Return'",
+        #                                      "INCLUDE_UNFLAGGED", "INCLUDE_SYNTHETIC", "INCLUDE_KEYPOINT",
+        #                                      "EXCLUDE_WITHHELD", None, "INCLUDE_OVERLAP")
+        arcpy.management.MakeLasDatasetLayer(inLASD,fileName, "6", "LAST", "INCLUDE_UNFLAGGED", "INCLUDE_SYNTHETIC", "INCLUDE_KEYPOINT", "EXCLUDE_WITHHELD", None, "INCLUDE_OVERLAP")
+
+        bldgPtRaster = os.path.join(scratchFolder, "{0}.tif".format(file_basename))
+        arcpy.LasPointStatsAsRaster_management(fileName, bldgPtRaster, "PREDOMINANT_CLASS", "CELLSIZE", cellSize)
+
+        # Delete Intermediate Data
+        arcpy.Delete_management(fileName)
+        arcpy.Delete_management(inLASD)
+        return []
+
+    except Exception as e:
+        errorMessage = "{0} failed @ {1} : Check if building class codes exist".format(file, time.strftime("%H:%M:%S"))
+        #logMessage(logFile, errorMessage)
+        inLASD = os.path.join(scratchFolder, "{0}.lasd".format(os.path.splitext(file)[0]))
+        if arcpy.Exists(inLASD):
+            arcpy.Delete_management(inLASD)
+        return [str(e), errorMessage]
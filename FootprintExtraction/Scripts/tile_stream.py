@@ -0,0 +1,384 @@
+# -------------------------------------------------------------------------------
+# Name:        tile_stream
+# Purpose:     Streaming per tile footprint pipeline: classify -> rasterize -> morphology -> vectorize.
+#              The stages are connected by bounded queues, a tile moves on as soon as its upstream stage
+#              is done, so the stages overlap and footprints are written while later tiles are still read.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import math
+import time
+import queue
+import threading
+
+import numpy as np
+
+import building_classifier
+import grid_lib
+import las_io
+import parallel_lib
+
+# Constants
+QUEUE_SIZE = 4                    # tiles waiting between two stages, bounds the memory held by the pipeline
+POLL_SECONDS = 0.1                # blocked queue operations check for a failed stage this often
+MORPHOLOGY_SIZE = 3               # closing / opening window in cells, same as Shrink / Expand by 1 cell
+TILE_FIELD = "LAS_FILE"
+
+_END = object()                   # end of stream marker
+
+
+class StreamError(Exception):
+
+    """
+    Raised when a stage of a stream fails, the stream is stopped and the error of the stage is chained.
+    """
+
+    pass
+
+
+class StreamStage(object):
+
+    def __init__(self, name, function, workers=1):
+        # function: called with one item, returns the item for the next stage or None to drop it
+        # workers: threads of the stage (the functions of a stage must be thread safe)
+        self.name = name
+        self.function = function
+        self.workers = max(1, int(workers))
+        self.items = 0
+        self.seconds = 0.0
+
+
+def run_stream(items, stages, sink, queue_size=QUEUE_SIZE):
+    # Passes every item through the stages and the results of the last stage to sink, in the calling thread,
+    # in the order they complete. Returns {stage name: [items, busy seconds]}.
+    queues = [queue.Queue(queue_size) for _ in range(len(stages) + 1)]
+    failed = threading.Event()
+    errors = []
+    lock = threading.Lock()
+
+    def put(q, item):
+        while not failed.is_set():
+            try:
+                q.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q):
+        while not failed.is_set():
+            try:
+                return q.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                pass
+        return _END
+
+    def feed():
+        try:
+            for item in items:
+                if not put(queues[0], item):
+                    return
+        except Exception as e:
+            errors.append(("input", e))
+            failed.set()
+        put(queues[0], _END)
+
+    running = [stage.workers for stage in stages]
+
+    def work(number, stage):
+        in_queue, out_queue = queues[number], queues[number + 1]
+        while True:
+            item = get(in_queue)
+            if item is _END:
+                # the marker goes back for the other workers of the stage, the last one passes it on
+                put(in_queue, _END)
+                with lock:
+                    running[number] -= 1
+                    last = running[number] == 0
+                if last:
+                    put(out_queue, _END)
+                return
+
+            start_time = time.time()
+            try:
+                result = stage.function(item)
+            except Exception as e:
+                errors.append((stage.name, e))
+                failed.set()
+                return
+            with lock:
+                stage.items += 1
+                stage.seconds += time.time() - start_time
+
+            if result is not None and not put(out_queue, result):
+                return
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    for number, stage in enumerate(stages):
+        threads += [threading.Thread(target=work, args=(number, stage), daemon=True) for _ in range(stage.workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            result = get(queues[-1])
+            if result is _END:
+                break
+            sink(result)
+    except Exception as e:
+        errors.append(("output", e))
+        failed.set()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        name, error = errors[0]
+        raise StreamError("Stage " + name + " failed: " + str(error)) from error
+
+    return {stage.name: [stage.items, round(stage.seconds, 3)] for stage in stages}
+
+
+def classify_tile_task(las_file, neighbour_files, options, out_folder=None):
+    # Worker entry point (process pool): building classification of a tile and the building points of its
+    # window (tile + halo), the window is rasterized so buildings on the tile edge are complete
+    classes, x, y = building_classifier.classify_building_window(las_file, neighbour_files, options)
+    class_file = building_classifier.save_classes(las_file, classes, out_folder) if out_folder else None
+
+    header = las_io.read_header(las_file)
+    return {"las_file": las_file, "class_file": class_file, "window": las_io.header_bounds(header, options["halo"]),
+            "x": x, "y": y}
+
+
+def rasterize_tile(tile, cell_size):
+    # Building mask of the tile window, on a grid aligned to multiples of cell_size so the cells of
+    # overlapping windows are the same cells
+    x_min, y_min, x_max, y_max = tile.pop("window")
+    top = int(math.ceil(y_max / cell_size))
+    left = int(math.floor(x_min / cell_size))
+    spec = grid_lib.GridSpec(left * cell_size, top * cell_size, cell_size,
+                             top - int(math.floor(y_min / cell_size)) + 1,
+                             int(math.floor(x_max / cell_size)) - left + 1)
+
+    rows, cols, inside = grid_lib.cell_index(spec, tile.pop("x"), tile.pop("y"))
+    mask = np.zeros((spec.n_rows, spec.n_cols), dtype=bool)
+    mask[rows[inside], cols[inside]] = True
+
+    tile["spec"] = spec
+    tile["mask"] = mask
+    return tile
+
+
+def morphology_tile(tile, tile_centers, min_area, size=MORPHOLOGY_SIZE):
+    # Closes the gaps between the building points, opens away slivers, and keeps the buildings of at least
+    # min_area (map units) owned by this tile: the tile whose center is nearest to the first cell of the building.
+    # Every window sees the same first cell of a building that lies inside both windows, so exactly one tile
+    # keeps it.
+    spec = tile["spec"]
+    a = tile.pop("mask").astype(np.float64)
+    a = grid_lib.opening(grid_lib.min_filter(grid_lib.max_filter(a, size), size), size)
+    labels, n = grid_lib.label_components(a > 0, connectivity=4)
+
+    flat = labels.ravel()
+    cells = np.flatnonzero(flat)
+    ids, first, counts = np.unique(flat[cells], return_index=True, return_counts=True)
+    first = cells[first]
+
+    keep = counts * spec.cell_size ** 2 >= min_area
+    x, y = grid_lib.cell_centers(spec, first // spec.n_cols, first % spec.n_cols)
+    centers = np.asarray(tile_centers, dtype=np.float64)
+    nearest = np.argmin((x[:, None] - centers[:, 0]) ** 2 + (y[:, None] - centers[:, 1]) ** 2, axis=1)
+    keep &= nearest == tile["number"]
+
+    # buildings that touch the window edge are cut by the window (larger than the halo)
+    edge = np.unique(np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]]))
+    tile["cut"] = int(np.isin(ids[keep], edge).sum())
+
+    relabel = np.zeros(n + 1, dtype=np.int64)
+    relabel[ids[keep]] = np.arange(1, keep.sum() + 1)
+    tile["labels"] = relabel[labels]
+    tile["count"] = int(keep.sum())
+    return tile
+
+
+def vectorize_tile(tile):
+    # Polygon rings of the labelled buildings in map coordinates, [[outer ring, hole rings...], ...].
+    # Rings are clockwise (outer) and counterclockwise (holes), same as the Esri polygon convention.
+    spec = tile["spec"]
+    labels = tile.pop("labels")
+    footprints = []
+    for label, rings in _trace_labels(labels).items():
+        parts = []
+        for ring in rings:
+            ring = np.asarray(ring, dtype=np.float64)
+            x = spec.x_min + ring[:, 1] * spec.cell_size
+            y = spec.y_max - ring[:, 0] * spec.cell_size
+            parts.append(list(zip(x.tolist(), y.tolist())))
+        # largest ring first, that is the outer ring
+        parts.sort(key=lambda p: -abs(_ring_area(p)))
+        footprints.append(parts)
+
+    tile["footprints"] = footprints
+    return tile
+
+
+def _ring_area(ring):
+    x = np.array([p[0] for p in ring])
+    y = np.array([p[1] for p in ring])
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def _trace_labels(labels):
+    # Boundary rings of every label, as (row, col) cell corners. The edges are directed with the label on the right
+    # (clockwise on the map), a corner where two cells of a label touch diagonally is passed with a right turn
+    # so those cells stay apart (4 connectivity). Returns {label: [rings]}.
+    padded = np.pad(labels, 1)
+    inner = padded[1:-1, 1:-1]
+    edges = []
+    # (neighbour cells, start corner, direction) for the top, right, bottom and left edge of a cell
+    for neighbour, corner, direction in ((padded[:-2, 1:-1], (0, 0), (0, 1)),
+                                         (padded[1:-1, 2:], (0, 1), (1, 0)),
+                                         (padded[2:, 1:-1], (1, 1), (0, -1)),
+                                         (padded[1:-1, :-2], (1, 0), (-1, 0))):
+        rows, cols = np.nonzero((inner > 0) & (neighbour != inner))
+        edges.append((inner[rows, cols], rows + corner[0], cols + corner[1], direction))
+
+    outgoing = {}
+    for values, rows, cols, direction in edges:
+        for label, row, col in zip(values.tolist(), rows.tolist(), cols.tolist()):
+            outgoing.setdefault((label, row, col), []).append(direction)
+
+    rings = {}
+    while outgoing:
+        key = next(iter(outgoing))
+        label, row, col = key
+        start, first = (row, col), outgoing[key][0]
+        _remove(outgoing, key, first)
+
+        ring = [start]
+        direction = first
+        while True:
+            row, col = row + direction[0], col + direction[1]
+            key = (label, row, col)
+            choices = outgoing.get(key, [])
+            if (row, col) == start:
+                choices = choices + [first]
+            new_direction = _turn(choices, direction)
+            if (row, col) == start and new_direction == first:
+                break
+            _remove(outgoing, key, new_direction)
+            if new_direction != direction:
+                ring.append((row, col))
+            direction = new_direction
+
+        # the start corner is a vertex only when the ring turns there
+        if direction == first:
+            ring = ring[1:]
+        ring.append(ring[0])
+        rings.setdefault(label, []).append(ring)
+
+    return rings
+
+
+def _turn(choices, direction):
+    # Next edge from a corner: a right turn before straight on before a left turn
+    if len(choices) == 1:
+        return choices[0]
+
+    right = (direction[1], -direction[0])
+    if right in choices:
+        return right
+    if direction in choices:
+        return direction
+
+    return (-direction[1], direction[0])
+
+
+def _remove(outgoing, key, direction):
+    choices = outgoing[key]
+    choices.remove(direction)
+    if not choices:
+        del outgoing[key]
+
+
+class FootprintWriter(object):
+
+    """
+    Sink of stream_footprints: inserts the footprints of every tile into a polygon feature class as the tiles
+    come out of the stream.
+    """
+
+    def __init__(self, out_feature_class, spatial_reference, message=print):
+        import arcpy
+
+        self.out_feature_class = out_feature_class
+        self.spatial_reference = spatial_reference
+        self.message = message
+        self.tiles = 0
+        self.count = 0
+        self.cut = 0
+
+        folder, name = os.path.split(out_feature_class)
+        if arcpy.Exists(out_feature_class):
+            arcpy.Delete_management(out_feature_class)
+        arcpy.CreateFeatureclass_management(folder, name, "POLYGON", spatial_reference=spatial_reference)
+        arcpy.AddField_management(out_feature_class, TILE_FIELD, "TEXT", field_length=255)
+        self._cursor = arcpy.da.InsertCursor(out_feature_class, ["SHAPE@", TILE_FIELD])
+
+    def __call__(self, tile):
+        import arcpy
+
+        tile_name = os.path.basename(tile["las_file"])
+        for parts in tile["footprints"]:
+            rings = arcpy.Array([arcpy.Array([arcpy.Point(x, y) for x, y in ring]) for ring in parts])
+            self._cursor.insertRow([arcpy.Polygon(rings, self.spatial_reference), tile_name])
+
+        self.tiles += 1
+        self.count += len(tile["footprints"])
+        self.cut += tile["cut"]
+        self.message("{0}: {1} footprints ({2} tiles done)".format(tile_name, len(tile["footprints"]), self.tiles))
+
+    def close(self):
+        del self._cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def stream_footprints(las_files, sink, options, cell_size, min_area, out_folder=None, workers=None,
+                      queue_size=QUEUE_SIZE):
+    # Draft building footprints of the LAS files, streamed tile by tile into sink (e.g. a FootprintWriter).
+    # options: building_classifier.building_options(), cell_size and min_area in the units of the data.
+    # Classification runs in a process pool, the raster stages in threads of this process (NumPy releases the GIL).
+    # With out_folder the classification of every file is kept as well (see building_classifier.save_classes).
+    # Returns {stage name: [tiles, busy seconds]}.
+    if out_folder and not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+
+    workers = workers or parallel_lib.default_workers()
+    headers = [las_io.read_header(f) for f in las_files]
+    tile_centers = [((h.min[0] + h.max[0]) / 2.0, (h.min[1] + h.max[1]) / 2.0) for h in headers]
+    tasks = [(las_file, [las_files[n] for n in las_io.find_neighbours(headers, i, options["halo"])], options,
+              out_folder) for i, las_file in enumerate(las_files)]
+    numbers = {las_file: i for i, las_file in enumerate(las_files)}
+
+    with parallel_lib.process_pool(min(workers, max(1, len(tasks)))) as executor:
+        def classify(task):
+            # the thread waits for its tile in the pool, one thread per worker process keeps the pool busy
+            tile = executor.submit(classify_tile_task, *task).result()
+            tile["number"] = numbers[tile["las_file"]]
+            return tile
+
+        stages = [StreamStage("classify", classify, workers),
+                  StreamStage("rasterize", lambda tile: rasterize_tile(tile, cell_size)),
+                  StreamStage("morphology", lambda tile: morphology_tile(tile, tile_centers, min_area), 2),
+                  StreamStage("vectorize", vectorize_tile)]
+
+        return run_stream(tasks, stages, sink, queue_size)
@@ -0,0 +1,171 @@
+# -------------------------------------------------------------------------------
+# Name:        units
+# Purpose:     Linear and areal units of the tool parameters (GPLinearUnit '6 Feet', GPArealUnit '500 SquareFeet').
+#              A parameter text is parsed once into an immutable Quantity and converted to map units with the
+#              metersPerUnit of the spatial reference. Conversions work on NumPy arrays as well.
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import re
+import functools
+from collections import namedtuple
+
+import numpy as np
+
+# Constants
+LINEAR = 1
+AREAL = 2
+
+# meters per unit
+LINEAR_UNITS = {"Kilometers": 1000.0,
+                "Meters": 1.0,
+                "Decimeters": 0.1,
+                "Centimeters": 0.01,
+                "Millimeters": 0.001,
+                "Feet": 0.3048,
+                "FeetUS": 1200.0 / 3937.0,
+                "Inches": 0.0254,
+                "Yards": 0.9144,
+                "Miles": 1609.344,
+                "NauticalMiles": 1852.0}
+
+# square meters per unit
+AREAL_UNITS = {"SquareKilometers": 1000000.0,
+               "Hectares": 10000.0,
+               "Ares": 100.0,
+               "SquareMeters": 1.0,
+               "SquareDecimeters": 0.01,
+               "SquareCentimeters": 0.0001,
+               "SquareMillimeters": 0.000001,
+               "SquareFeet": 0.3048 ** 2,
+               "SquareFeetUS": (1200.0 / 3937.0) ** 2,
+               "SquareInches": 0.0254 ** 2,
+               "SquareYards": 0.9144 ** 2,
+               "SquareMiles": 1609.344 ** 2,
+               "Acres": 4046.8564224}
+
+# other spellings of the unit names (spatial reference unit names, older parameter texts)
+UNIT_ALIASES = {"Meter": "Meters",
+                "Foot": "Feet",
+                "Foot_Int": "Feet",
+                "Foot_US": "FeetUS",
+                "USSurveyFeet": "FeetUS",
+                "Kilometer": "Kilometers",
+                "Inch": "Inches",
+                "Yard": "Yards",
+                "Mile": "Miles",
+                "NauticalMile": "NauticalMiles"}
+
+_NUMBER = re.compile(r"^\s*([-+]?[0-9]*[.,]?[0-9]+(?:[eE][-+]?[0-9]+)?)\s*(.*?)\s*$")
+
+
+class UnitError(ValueError):
+
+    """
+    Raised for a unit parameter text that can not be parsed or a unit that is not known.
+    """
+
+    pass
+
+
+class Quantity(namedtuple("Quantity", ["value", "unit", "dimension", "meters"])):
+
+    """
+    A parsed unit parameter: value in unit, dimension LINEAR or AREAL, meters the value in meters
+    (square meters for AREAL).
+    """
+
+    __slots__ = ()
+
+    def to_map_units(self, m_per_unit):
+        # Value in the units of a spatial reference (metersPerUnit), squared for areas
+        return self.meters / m_per_unit ** self.dimension
+
+    def to_unit(self, unit):
+        if unit_name(unit) == self.unit:
+            return self.value
+        return self.meters / unit_factor(unit, self.dimension)
+
+
+def unit_name(unit):
+    # Parameter unit name of a unit (e.g. 'Foot_US' -> 'FeetUS', 'Nautical Miles' -> 'NauticalMiles')
+    unit = unit.replace(" ", "")
+    return UNIT_ALIASES.get(unit, unit)
+
+
+def unit_factor(unit, dimension=None):
+    # Meters (square meters for an areal unit) per unit
+    unit = unit_name(unit)
+    if unit in LINEAR_UNITS and dimension in (None, LINEAR):
+        return LINEAR_UNITS[unit]
+    if unit in AREAL_UNITS and dimension in (None, AREAL):
+        return AREAL_UNITS[unit]
+
+    raise UnitError("Unknown " + ("areal " if dimension == AREAL else "linear " if dimension == LINEAR else "") +
+                    "unit " + str(unit) + ".")
+
+
+def dimension_of(unit):
+    return AREAL if unit_name(unit) in AREAL_UNITS else LINEAR
+
+
+@functools.lru_cache(maxsize=None)
+def parse(text, default_unit="Meters"):
+    # Quantity of a parameter text ('6 Feet', '0,8 Meters', '500 SquareFeet'). A number without a unit (or with
+    # 'Unknown') is in default_unit.
+    match = _NUMBER.match(str(text))
+    if not match:
+        raise UnitError("Can not read a value and unit from '" + str(text) + "'.")
+
+    value = float(match.group(1).replace(",", "."))
+    unit = unit_name(match.group(2)) if match.group(2) not in ("", "Unknown") else unit_name(default_unit)
+    dimension = dimension_of(unit)
+
+    return Quantity(value, unit, dimension, value * unit_factor(unit, dimension))
+
+
+def linear(text, default_unit="Meters"):
+    quantity = parse(text, default_unit)
+    if quantity.dimension != LINEAR:
+        raise UnitError("'" + str(text) + "' is not a linear unit.")
+    return quantity
+
+
+def areal(text):
+    quantity = parse(text, "SquareMeters")
+    if quantity.dimension != AREAL:
+        raise UnitError("'" + str(text) + "' is not an areal unit.")
+    return quantity
+
+
+def conversion_factor(from_unit, to_unit):
+    # Factor from values in from_unit to values in to_unit (both linear or both areal)
+    dimension = dimension_of(from_unit)
+    return unit_factor(from_unit, dimension) / unit_factor(to_unit, dimension)
+
+
+def convert(values, from_unit, to_unit):
+    # Values (number or array) in from_unit converted to to_unit
+    return np.asarray(values, dtype=np.float64) * conversion_factor(from_unit, to_unit)
+
+
+def to_map_units(texts, m_per_unit):
+    # Parameter texts as an array of values in the units of a spatial reference
+    quantities = [parse(text) for text in texts]
+    meters = np.array([q.meters for q in quantities], dtype=np.float64)
+    dimensions = np.array([q.dimension for q in quantities], dtype=np.float64)
+
+    return meters / np.float64(m_per_unit) ** dimensions
+
+
+def map_values(m_per_unit, **texts):
+    # The parameter texts in the units of a spatial reference, converted at once, as a namedtuple with the
+    # names of the arguments. An empty text stays None.
+    names = sorted(texts)
+    given = [name for name in names if texts[name] not in (None, "")]
+    values = dict(zip(given, to_map_units([texts[name] for name in given], m_per_unit).tolist()))
+
+    return namedtuple("MapValues", names)(**{name: values.get(name) for name in names})
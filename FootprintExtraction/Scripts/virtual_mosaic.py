@@ -0,0 +1,295 @@
+# -------------------------------------------------------------------------------
+# Name:        virtual_mosaic
+# Purpose:     Lightweight mosaic of tile grids: a JSON index of the tiles and their geotransforms,
+#              windowed reads assemble only the tiles that intersect the window
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import os
+import json
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import block_raster
+import grid_lib
+
+# Constants
+INDEX_VERSION = 1
+PREDOMINANT = "PREDOMINANT"       # most frequent value of the overlapping tiles, ties go to the first tile
+FIRST = "FIRST"
+MAXIMUM = "MAXIMUM"
+MINIMUM = "MINIMUM"
+MOSAIC_RULES = (PREDOMINANT, FIRST, MAXIMUM, MINIMUM)
+TILE_CACHE_SIZE = 8               # tile arrays kept in memory per mosaic
+
+
+class VirtualMosaic(object):
+
+    """
+    Tiles with their grid (GridSpec fields) and footprint, stored as a JSON index.
+    Tiles are .npy grids (memory mapped), block rasters (.blk, only the blocks of the window are read)
+    or any raster that arcpy can read.
+    Windows can be read from several threads, only the tile cache is shared.
+    """
+
+    def __init__(self, cell_size=None, nodata=0, dtype="uint8", rule=PREDOMINANT, spatial_reference=None):
+        self.cell_size = cell_size
+        self.nodata = nodata
+        self.dtype = dtype
+        self.rule = rule
+        self.spatial_reference = spatial_reference
+        self.tiles = []
+        self.folder = ""
+        self.overviews = {}
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, index_file):
+        with open(index_file, "r") as f:
+            index = json.load(f)
+
+        mosaic = cls(index["cell_size"], index["nodata"], index["dtype"], index["rule"], index["spatial_reference"])
+        mosaic.tiles = index["tiles"]
+        mosaic.overviews = index.get("overviews", {})
+        mosaic.folder = os.path.dirname(os.path.abspath(index_file))
+
+        return mosaic
+
+    def save(self, index_file):
+        # tile paths are stored relative to the index file when they are in the same folder tree
+        folder = os.path.dirname(os.path.abspath(index_file))
+        tiles = []
+        for tile in self.tiles:
+            tile = dict(tile)
+            path = self._tile_path(tile)
+            relative = os.path.relpath(path, folder)
+            tile["path"] = path if relative.startswith("..") else relative
+            tiles.append(tile)
+
+        overviews = {}
+        for factor, path in self.overviews.items():
+            path = self._tile_path({"path": path})
+            relative = os.path.relpath(path, folder)
+            overviews[factor] = path if relative.startswith("..") else relative
+
+        index = {"version": INDEX_VERSION,
+                 "cell_size": self.cell_size,
+                 "nodata": self.nodata,
+                 "dtype": self.dtype,
+                 "rule": self.rule,
+                 "spatial_reference": self.spatial_reference,
+                 "tiles": tiles,
+                 "overviews": overviews}
+        with open(index_file, "w") as f:
+            json.dump(index, f, indent=1)
+
+        self.folder = folder
+        self.tiles = tiles
+        self.overviews = overviews
+
+        return index_file
+
+    def add_tile(self, path, spec):
+        # spec: grid_lib.GridSpec of the tile array (row 0 is the northern most row)
+        self.tiles.append({"path": os.path.abspath(path),
+                           "x_min": spec.x_min, "y_max": spec.y_max, "cell_size": spec.cell_size,
+                           "n_rows": spec.n_rows, "n_cols": spec.n_cols,
+                           "bounds": list(grid_lib.grid_extent(spec))})
+        if self.cell_size is None or spec.cell_size < self.cell_size:
+            self.cell_size = spec.cell_size
+
+    def add_overview(self, factor, path):
+        # block raster with the mosaic reduced by factor (see raster_overviews.write_mosaic_overviews)
+        self.overviews[str(factor)] = os.path.abspath(path)
+
+    def extent(self):
+        bounds = [t["bounds"] for t in self.tiles]
+        return (min(b[0] for b in bounds), min(b[1] for b in bounds),
+                max(b[2] for b in bounds), max(b[3] for b in bounds))
+
+    def grid_spec(self):
+        # grid of the whole mosaic, aligned to the first tile
+        first = self.tiles[0]
+        x_min, y_min, x_max, y_max = self.extent()
+        col0 = math.floor((x_min - first["x_min"]) / self.cell_size + 1e-9)
+        row0 = math.floor((first["y_max"] - y_max) / self.cell_size + 1e-9)
+        origin_x = first["x_min"] + col0 * self.cell_size
+        origin_y = first["y_max"] - row0 * self.cell_size
+
+        return grid_lib.GridSpec(origin_x, origin_y, self.cell_size,
+                                 int(math.ceil((origin_y - y_min) / self.cell_size - 1e-9)),
+                                 int(math.ceil((x_max - origin_x) / self.cell_size - 1e-9)))
+
+    def tiles_in(self, bounds):
+        # indexes of the tiles whose footprint intersects bounds (x_min, y_min, x_max, y_max)
+        return [i for i, t in enumerate(self.tiles)
+                if t["bounds"][0] < bounds[2] and bounds[0] < t["bounds"][2] and
+                t["bounds"][1] < bounds[3] and bounds[1] < t["bounds"][3]]
+
+    def read_window(self, bounds):
+        # Assembles the cells of the mosaic grid covering bounds from the intersecting tiles.
+        # Returns the array and its GridSpec. Cells without data are nodata.
+        spec, _, _ = grid_lib.window_spec(self.grid_spec(), bounds)
+        out = np.full((spec.n_rows, spec.n_cols), self.nodata, dtype=self.dtype)
+
+        # every tile's part of the window: (tile number, window slices, values, valid)
+        parts = []
+        cover = np.zeros(out.shape, dtype=np.int32)
+        for t in self.tiles_in(grid_lib.grid_extent(spec)):
+            part = self._tile_part(t, spec)
+            if part is not None:
+                parts.append(part)
+                cover[part[1]] += part[3]
+
+        # painted in index order: the first tile wins, or the rule for the overlap
+        for t, window, values, valid in reversed(parts):
+            out[window][valid] = values[valid]
+
+        if self.rule != FIRST and (cover > 1).any():
+            self._resolve_overlaps(out, cover, parts)
+
+        return out, spec
+
+    def read_cells(self, row0, col0, n_rows, n_cols):
+        # Cells [row0, row0 + n_rows) x [col0, col0 + n_cols) of the mosaic grid
+        spec = self.grid_spec()
+        x0, y0 = grid_lib.cell_centers(spec, row0 + n_rows - 1, col0)
+        x1, y1 = grid_lib.cell_centers(spec, row0, col0 + n_cols - 1)
+
+        return self.read_window((x0, y0, x1, y1))[0]
+
+    def read_overview(self, factor, bounds=None):
+        # Cells of an overview level covering bounds (all of it when None). Returns the array and its GridSpec.
+        raster = block_raster.BlockRaster.open(self._tile_path({"path": self.overviews[str(factor)]}))
+        if bounds is None:
+            return raster.read_array(), raster.spec
+
+        spec, row0, col0 = grid_lib.window_spec(raster.spec, bounds)
+        return raster.read_window(row0, col0, spec.n_rows, spec.n_cols), spec
+
+    def _resolve_overlaps(self, out, cover, parts):
+        # (cell, value, tile order) of all tiles at the cells covered more than once
+        overlap = cover > 1
+        n_cols = out.shape[1]
+        cells = []
+        values = []
+        orders = []
+        for order, (t, window, tile_values, valid) in enumerate(parts):
+            take = valid & overlap[window]
+            rows, cols = np.nonzero(take)
+            cells.append((rows + window[0].start) * n_cols + cols + window[1].start)
+            values.append(tile_values[take])
+            orders.append(np.full(rows.size, order))
+
+        cells = np.concatenate(cells)
+        values = np.concatenate(values)
+        orders = np.concatenate(orders)
+
+        if self.rule == MAXIMUM:
+            np.maximum.at(out.reshape(-1), cells, values)
+            return
+        if self.rule == MINIMUM:
+            np.minimum.at(out.reshape(-1), cells, values)
+            return
+
+        # predominant value: count every (cell, value) pair, keep the pair with the highest count per cell,
+        # ties to the value of the first tile
+        order = np.lexsort((orders, values, cells))
+        cells = cells[order]
+        values = values[order]
+        orders = orders[order]
+        new_pair = np.ones(cells.size, dtype=bool)
+        new_pair[1:] = (cells[1:] != cells[:-1]) | (values[1:] != values[:-1])
+        starts = np.flatnonzero(new_pair)
+        counts = np.diff(np.append(starts, cells.size))
+
+        # per cell: highest count first, then the lowest tile order
+        pick = np.lexsort((orders[starts], -counts, cells[starts]))
+        pair_cells = cells[starts][pick]
+        first = np.ones(pick.size, dtype=bool)
+        first[1:] = pair_cells[1:] != pair_cells[:-1]
+        out.reshape(-1)[pair_cells[first]] = values[starts][pick][first]
+
+    def _tile_part(self, t, spec):
+        # nearest cell of tile t for every window cell inside the tile, None when there are none
+        tile = self.tiles[t]
+        x, _ = grid_lib.cell_centers(spec, np.zeros(spec.n_cols, dtype=np.int64), np.arange(spec.n_cols))
+        _, y = grid_lib.cell_centers(spec, np.arange(spec.n_rows), np.zeros(spec.n_rows, dtype=np.int64))
+        cols = np.floor((x - tile["x_min"]) / tile["cell_size"]).astype(np.int64)
+        rows = np.floor((tile["y_max"] - y) / tile["cell_size"]).astype(np.int64)
+
+        col_in = np.flatnonzero((cols >= 0) & (cols < tile["n_cols"]))
+        row_in = np.flatnonzero((rows >= 0) & (rows < tile["n_rows"]))
+        if col_in.size == 0 or row_in.size == 0:
+            return None
+
+        values = self._read_tile(t, rows[row_in[0]], rows[row_in[-1]] + 1, cols[col_in[0]], cols[col_in[-1]] + 1)
+        values = values[np.ix_(rows[row_in] - rows[row_in[0]], cols[col_in] - cols[col_in[0]])]
+
+        window = (slice(row_in[0], row_in[-1] + 1), slice(col_in[0], col_in[-1] + 1))
+        valid = values != self.nodata
+        if np.issubdtype(values.dtype, np.floating):
+            valid &= ~np.isnan(values)
+
+        return t, window, values.astype(self.dtype), valid
+
+    def _tile_path(self, tile):
+        return tile["path"] if os.path.isabs(tile["path"]) else os.path.join(self.folder, tile["path"])
+
+    def _read_tile(self, t, row0, row1, col0, col1):
+        # cells [row0, row1) x [col0, col1) of tile t.
+        # The lock only covers the tile cache and opening the tile (arcpy is not thread safe),
+        # the cells are read outside of it.
+        with self._cache_lock:
+            if t in self._cache:
+                self._cache.move_to_end(t)
+                source = self._cache[t]
+            else:
+                path = self._tile_path(self.tiles[t])
+                if path.lower().endswith(".npy"):
+                    source = np.load(path, mmap_mode="r")
+                elif path.lower().endswith(block_raster.BLOCK_RASTER_EXTENSION):
+                    source = block_raster.BlockRaster.open(path)
+                else:
+                    import arcpy
+                    source = arcpy.RasterToNumPyArray(path, nodata_to_value=self.nodata)
+
+                self._cache[t] = source
+                while len(self._cache) > TILE_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+
+        if isinstance(source, block_raster.BlockRaster):
+            return source.read_window(row0, col0, row1 - row0, col1 - col0)
+
+        return np.asarray(source[row0:row1, col0:col1])
+
+
+def raster_spec(path):
+    # GridSpec of a raster dataset (arcpy)
+    import arcpy
+
+    desc = arcpy.Describe(path)
+    return grid_lib.GridSpec(desc.extent.XMin, desc.extent.YMax, desc.meanCellWidth, desc.height, desc.width)
+
+
+def build_from_rasters(raster_files, index_file, nodata=None, dtype="uint8", rule=PREDOMINANT, spatial_reference=None):
+    # Index of a folder of tile rasters (e.g. the PREDOMINANT_CLASS tiles of create_building_mosaic).
+    # nodata: NoData value of the tiles, read from the first raster when None.
+    if nodata is None and raster_files:
+        import arcpy
+        nodata = arcpy.Describe(raster_files[0]).noDataValue
+
+    mosaic = VirtualMosaic(nodata=nodata if nodata is not None else 0, dtype=dtype, rule=rule,
+                           spatial_reference=spatial_reference)
+    for raster_file in raster_files:
+        mosaic.add_tile(raster_file, raster_spec(raster_file))
+    mosaic.save(index_file)
+
+    return mosaic
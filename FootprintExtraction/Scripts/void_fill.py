@@ -0,0 +1,449 @@
+# -------------------------------------------------------------------------------
+# Name:        void_fill
+# Purpose:     In-process void filling for binned elevation surfaces
+#              (replaces the LINEAR void fill of 'BINNING MAXIMUM LINEAR')
+#
+# Created:     19/10/2026
+# updated:
+
+# -------------------------------------------------------------------------------
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import grid_lib
+import las_io
+
+# Constants
+LINEAR = "LINEAR"            # Delaunay triangulation of the cells surrounding the voids
+IDW = "IDW"                  # iterative inverse distance fill, from the void edges inwards
+LAPLACIAN = "LAPLACIAN"      # multigrid Laplace (membrane) fill
+SIMPLE = "SIMPLE"            # small voids (missing bins) only, from their direct neighbours
+FILL_METHODS = (LINEAR, IDW, LAPLACIAN, SIMPLE)
+
+DEFAULT_BLOCK_SIZE = 256
+DEFAULT_HALO = 32
+DEFAULT_MAX_HALO = 256
+SMALL_VOID_CELLS = 4
+
+_DIAG = 1.0 / math.sqrt(2.0)
+_IDW_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+_IDW_WEIGHTS = np.array([_DIAG, 1.0, _DIAG, 1.0, 1.0, _DIAG, 1.0, _DIAG])
+_LAPLACE_OFFSETS = ((-1, 0), (0, -1), (0, 1), (1, 0))
+
+
+def fill_voids(grid, method=LINEAR, block_size=DEFAULT_BLOCK_SIZE, halo=DEFAULT_HALO, max_halo=DEFAULT_MAX_HALO,
+               fill_mask=None, workers=1):
+    # Fills the NaN cells of a 2D surface.
+    # Only blocks that contain voids are visited, and within a block only the void cells (and the valid
+    # cells bordering them) are worked on, so the cost follows the void area, not the grid size.
+    # A block is read with a halo. If the voids still run into the edge of the halo, the halo is doubled
+    # up to max_halo so large voids (ground under large buildings) see their full boundary.
+    # fill_mask: optional boolean array, only NaN cells where fill_mask is True are filled
+    #            (e.g. to leave the area outside the LAS coverage as NoData).
+    if method not in FILL_METHODS:
+        raise ValueError("Unsupported void fill method: " + str(method))
+
+    grid = np.asarray(grid, dtype=np.float64)
+    voids = np.isnan(grid)
+    if fill_mask is not None:
+        voids &= np.asarray(fill_mask, dtype=bool)
+
+    out = grid.copy()
+    if not voids.any() or voids.all():
+        return out
+
+    fill_function = _FILL_FUNCTIONS[method]
+    void_blocks = np.argwhere(grid_lib.block_any(voids, block_size))
+
+    def process(block):
+        return _fill_block(grid, voids, block_size, block[0], block[1], halo, max_halo, fill_function)
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(process, void_blocks))
+    else:
+        results = [process(block) for block in void_blocks]
+
+    for core, core_voids, values in results:
+        out[core][core_voids] = values
+
+    return out
+
+
+def _fill_block(grid, voids, block_size, b_row, b_col, halo, max_halo, fill_function):
+    local_halo = halo
+
+    while True:
+        window, core, inner = grid_lib.block_window(grid.shape, block_size, b_row, b_col, local_halo)
+        win_fill = voids[window]
+        core_voids = voids[core]
+
+        whole_grid = window[0].stop - window[0].start == grid.shape[0] and \
+            window[1].stop - window[1].start == grid.shape[1]
+        if whole_grid or local_halo >= max_halo or not _void_reaches_window_edge(win_fill, core_voids, inner,
+                                                                                  window, grid.shape):
+            break
+
+        local_halo = min(local_halo * 2, max_halo)
+
+    filled = fill_function(grid[window], win_fill)
+
+    return core, core_voids, filled[inner][core_voids]
+
+
+def _void_reaches_window_edge(win_fill, core_voids, inner, window, shape):
+    # True if a void that has cells in the block also touches a side of the window that is not
+    # the edge of the grid, i.e. the halo did not capture the whole void boundary
+    edges = []
+    if window[0].start > 0:
+        edges.append(win_fill[0, :])
+    if window[0].stop < shape[0]:
+        edges.append(win_fill[-1, :])
+    if window[1].start > 0:
+        edges.append(win_fill[:, 0])
+    if window[1].stop < shape[1]:
+        edges.append(win_fill[:, -1])
+    if not any(edge.any() for edge in edges):
+        return False
+
+    labels, _ = grid_lib.label_components(win_fill, 8)
+    core_labels = np.unique(labels[inner][core_voids])
+
+    edge_labels = []
+    if window[0].start > 0:
+        edge_labels.append(labels[0, :])
+    if window[0].stop < shape[0]:
+        edge_labels.append(labels[-1, :])
+    if window[1].start > 0:
+        edge_labels.append(labels[:, 0])
+    if window[1].stop < shape[1]:
+        edge_labels.append(labels[:, -1])
+    edge_labels = np.concatenate(edge_labels)
+
+    return np.isin(edge_labels[edge_labels > 0], core_labels).any()
+
+
+def _padded_flat(values, fill):
+    # Pads the window with a NaN border so neighbour lookups need no bounds checks
+    padded = np.full((values.shape[0] + 2, values.shape[1] + 2), np.nan)
+    padded[1:-1, 1:-1] = values
+    padded_fill = np.zeros(padded.shape, dtype=bool)
+    padded_fill[1:-1, 1:-1] = fill
+
+    return padded.ravel(), padded_fill.ravel(), padded.shape[1]
+
+
+def _flat_offsets(offsets, width):
+    return np.array([r * width + c for r, c in offsets], dtype=np.int64)
+
+
+def _fill_idw(values, fill):
+    # Onion peel fill: every void cell with at least one valid neighbour gets the inverse distance
+    # weighted mean of its 8 neighbours. Only the cells next to the previous ring are re-examined.
+    flat, pending, width = _padded_flat(values, fill)
+    offsets = _flat_offsets(_IDW_OFFSETS, width)
+    pending &= np.isnan(flat)
+
+    candidates = np.flatnonzero(pending)
+
+    while candidates.size:
+        neighbours = flat[candidates[:, None] + offsets]
+        valid = ~np.isnan(neighbours)
+        weight_sum = (valid * _IDW_WEIGHTS).sum(axis=1)
+        value_sum = np.where(valid, neighbours * _IDW_WEIGHTS, 0.0).sum(axis=1)
+
+        ready = weight_sum > 0
+        newly_filled = candidates[ready]
+        if newly_filled.size == 0:
+            break
+
+        flat[newly_filled] = value_sum[ready] / weight_sum[ready]
+        pending[newly_filled] = False
+
+        next_candidates = (newly_filled[:, None] + offsets).ravel()
+        candidates = np.unique(next_candidates[pending[next_candidates]])
+
+    return flat.reshape(values.shape[0] + 2, values.shape[1] + 2)[1:-1, 1:-1]
+
+
+def _fill_linear(values, fill):
+    # Linear interpolation in a Delaunay triangulation of the valid cells that border the voids.
+    # Triangulating only the void boundary keeps the triangulation proportional to the void perimeter.
+    from scipy.spatial import Delaunay, QhullError
+
+    target = fill & np.isnan(values)
+
+    # small voids (missing bins) are filled from their direct neighbours, only the larger
+    # voids are triangulated
+    small = _small_voids(target)
+    filled = _fill_idw(values, small) if small.any() else values.copy()
+
+    target &= ~small
+    valid = ~np.isnan(values) & ~fill
+    source = valid & _dilate(target)
+
+    src_rows, src_cols = np.nonzero(source)
+    if src_rows.size >= 3:
+        try:
+            tri = Delaunay(np.column_stack((src_rows, src_cols)).astype(np.float64))
+        except QhullError:  # all boundary cells on one line
+            tri = None
+
+        if tri is not None:
+            q_rows, q_cols = np.nonzero(target)
+            query = np.column_stack((q_rows, q_cols)).astype(np.float64)
+            simplex = tri.find_simplex(query)
+            inside = simplex >= 0
+
+            simplex = simplex[inside]
+            query = query[inside]
+            transform = tri.transform[simplex]
+            bary = np.einsum("ijk,ik->ij", transform[:, :2, :], query - transform[:, 2, :])
+            bary = np.column_stack((bary, 1.0 - bary.sum(axis=1)))
+
+            src_values = values[src_rows, src_cols]
+            filled[q_rows[inside], q_cols[inside]] = (src_values[tri.simplices[simplex]] * bary).sum(axis=1)
+
+    # voids outside the triangulation (open to the window edge)
+    remaining = target & np.isnan(filled)
+    if remaining.any():
+        filled = _fill_idw(filled, remaining)
+
+    return filled
+
+
+def _fill_simple(values, fill):
+    # Fills the small voids from their direct neighbours, larger voids stay NaN
+    small = _small_voids(fill & np.isnan(values))
+
+    return _fill_idw(values, small) if small.any() else values.copy()
+
+
+def _small_voids(target):
+    # Voids of at most SMALL_VOID_CELLS cells
+    labels, _ = grid_lib.label_components(target, 8)
+    sizes = np.bincount(labels.ravel())
+    sizes[0] = 0
+
+    return target & (sizes[labels] <= SMALL_VOID_CELLS)
+
+
+def _fill_laplacian(values, fill, sweeps=6, coarsest=8):
+    # Cascadic multigrid: solve on a 2x coarser grid, use it as start value, then relax the void cells
+    # with red-black Gauss-Seidel. Valid cells are fixed (Dirichlet) boundary values.
+    target = fill & np.isnan(values)
+    if not target.any():
+        return values.copy()
+
+    filled = values.copy()
+
+    if min(values.shape) > coarsest:
+        coarse_values, coarse_fill = _restrict(values, target)
+        if coarse_fill.any():
+            coarse_filled = _fill_laplacian(coarse_values, coarse_fill, sweeps, coarsest)
+        else:
+            coarse_filled = coarse_values
+
+        guess = np.repeat(np.repeat(coarse_filled, 2, axis=0), 2, axis=1)[:values.shape[0], :values.shape[1]]
+        filled[target] = guess[target]
+
+    # start values where the coarse grid gave none
+    remaining = target & np.isnan(filled)
+    if remaining.any():
+        filled = _fill_idw(filled, remaining)
+
+    _relax(filled, target, sweeps)
+
+    return filled
+
+
+def _restrict(values, target):
+    # 2x2 mean of the valid cells. A coarse cell is a void if it holds void cells and no valid ones.
+    n_rows = values.shape[0] + values.shape[0] % 2
+    n_cols = values.shape[1] + values.shape[1] % 2
+
+    padded = np.full((n_rows, n_cols), np.nan)
+    padded[:values.shape[0], :values.shape[1]] = np.where(target, np.nan, values)
+    padded_target = np.zeros((n_rows, n_cols), dtype=bool)
+    padded_target[:values.shape[0], :values.shape[1]] = target
+
+    blocks = padded.reshape(n_rows // 2, 2, n_cols // 2, 2)
+    valid = ~np.isnan(blocks)
+    counts = valid.sum(axis=(1, 3))
+    sums = np.where(valid, blocks, 0.0).sum(axis=(1, 3))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        coarse = sums / counts
+
+    coarse_fill = padded_target.reshape(n_rows // 2, 2, n_cols // 2, 2).any(axis=(1, 3)) & (counts == 0)
+
+    return coarse, coarse_fill
+
+
+def _relax(filled, target, sweeps):
+    flat, _, width = _padded_flat(filled, target)
+    offsets = _flat_offsets(_LAPLACE_OFFSETS, width)
+
+    rows, cols = np.nonzero(target)
+    indices = (rows + 1) * width + (cols + 1)
+    red = indices[(rows + cols) % 2 == 0]
+    black = indices[(rows + cols) % 2 == 1]
+
+    for _ in range(sweeps):
+        for colour in (red, black):
+            if colour.size == 0:
+                continue
+            neighbours = flat[colour[:, None] + offsets]
+            valid = ~np.isnan(neighbours)
+            counts = valid.sum(axis=1)
+            update = counts > 0
+            sums = np.where(valid, neighbours, 0.0).sum(axis=1)
+            flat[colour[update]] = sums[update] / counts[update]
+
+    filled[:, :] = flat.reshape(filled.shape[0] + 2, filled.shape[1] + 2)[1:-1, 1:-1]
+
+
+def _dilate(mask):
+    # 3x3 binary dilation
+    out = mask.copy()
+    out[1:, :] |= mask[:-1, :]
+    out[:-1, :] |= mask[1:, :]
+    rows = out.copy()
+    out[:, 1:] |= rows[:, :-1]
+    out[:, :-1] |= rows[:, 1:]
+
+    return out
+
+
+_FILL_FUNCTIONS = {
+    LINEAR: _fill_linear,
+    IDW: _fill_idw,
+    LAPLACIAN: _fill_laplacian,
+    SIMPLE: _fill_simple,
+}
+
+
+def binning_surface(spec, x, y, z, method="MAXIMUM", void_fill=LINEAR, mask=None, **fill_options):
+    # In-process equivalent of LasDatasetToRaster 'BINNING <method> <void_fill>'
+    surface = grid_lib.bin_points(spec, x, y, z, method, mask)
+    if void_fill and void_fill != "NONE":
+        surface = fill_voids(surface, method=void_fill, **fill_options)
+
+    return surface
+
+
+def binning_surface_from_tiles(bounds, load, cell_size, method="MAXIMUM", void_fill=LINEAR, workers=1,
+                               extent=None, snap=None):
+    # Surface over a set of tiles, each tile is binned into its window of the surface.
+    # bounds: (x_min, y_min, x_max, y_max) of every tile, load(i): returns x, y, z of the points of tile i.
+    # Where tiles overlap, MAXIMUM and MINIMUM keep the extreme, AVERAGE and COUNT are accumulated from
+    # the sums and counts of all tiles. workers: threads that load and bin the tiles (and fill the voids).
+    # extent: optional (x_min, y_min, x_max, y_max) the surface is limited to (e.g. the AOI), the tiles
+    # outside it are not loaded. snap: optional (x, y) cell corner the grid is aligned to (see snap_extent).
+    # Returns the surface and its GridSpec.
+    if method not in grid_lib.BINNING_METHODS:
+        raise ValueError("Unsupported binning method: " + str(method))
+
+    tiles = list(range(len(bounds)))
+    surface_extent = (min(b[0] for b in bounds), min(b[1] for b in bounds),
+                      max(b[2] for b in bounds), max(b[3] for b in bounds))
+    if extent is not None:
+        tiles = [i for i in tiles if las_io.bounds_intersect(bounds[i], extent)]
+        if not tiles:
+            raise ValueError("No tiles in the extent " + str(tuple(extent)))
+        surface_extent = (max(surface_extent[0], extent[0]), max(surface_extent[1], extent[1]),
+                          min(surface_extent[2], extent[2]), min(surface_extent[3], extent[3]))
+    if snap is not None:
+        surface_extent = grid_lib.snap_extent(*surface_extent, cell_size=cell_size, origin=snap)
+
+    spec = grid_lib.grid_spec_from_extent(*surface_extent, cell_size=cell_size)
+    shape = (spec.n_rows, spec.n_cols)
+
+    def bin_tile(i):
+        x, y, z = load(i)
+        tile_spec, row0, col0 = grid_lib.window_spec(spec, bounds[i])
+        if method in ("MAXIMUM", "MINIMUM"):
+            return tile_spec, row0, col0, grid_lib.bin_points(tile_spec, x, y, z, method)
+
+        return tile_spec, row0, col0, _bin_sums(tile_spec, x, y, z)
+
+    if method == "MINIMUM":
+        surface = np.full(shape, np.nan)
+        merge = np.fmin
+    elif method == "MAXIMUM":
+        surface = np.full(shape, np.nan)
+        merge = np.fmax
+    else:
+        sums = np.zeros(shape)
+        counts = np.zeros(shape, dtype=np.int64)
+
+    if workers > 1:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        binned = executor.map(bin_tile, tiles)
+    else:
+        executor = None
+        binned = (bin_tile(i) for i in tiles)
+
+    try:
+        for tile_spec, row0, col0, tile in binned:
+            window = (slice(row0, row0 + tile_spec.n_rows), slice(col0, col0 + tile_spec.n_cols))
+            if method in ("MAXIMUM", "MINIMUM"):
+                merge(surface[window], tile, out=surface[window])
+            else:
+                sums[window] += tile[0]
+                counts[window] += tile[1]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if method == "COUNT":
+        # empty cells are 0, there are no voids to fill
+        return counts, spec
+
+    if method == "AVERAGE":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            surface = np.where(counts > 0, sums / counts, np.nan)
+
+    if void_fill and void_fill != "NONE":
+        surface = fill_voids(surface, method=void_fill, workers=workers)
+
+    return surface, spec
+
+
+def _bin_sums(spec, x, y, z):
+    # Sum and number of the point values per cell
+    row, col, inside = grid_lib.cell_index(spec, x, y)
+    flat = row[inside] * spec.n_cols + col[inside]
+    size = spec.n_rows * spec.n_cols
+
+    sums = np.bincount(flat, weights=np.asarray(z, dtype=np.float64)[inside], minlength=size)
+    counts = np.bincount(flat, minlength=size)
+
+    return sums.reshape(spec.n_rows, spec.n_cols), counts.reshape(spec.n_rows, spec.n_cols)
+
+
+def binning_surface_from_las(las_files, cell_size, method="MAXIMUM", void_fill=LINEAR, class_codes=None,
+                             last_return=False, select=None, exclude=None, workers=1, extent=None, snap=None):
+    # Surface over all files, in-process equivalent of LasDatasetToRaster on a filtered LAS dataset layer.
+    # select: optional {las_file: mask} of the points to use (e.g. ground points)
+    # exclude: optional {las_file: mask} of the points to leave out (e.g. noise)
+    # extent, snap: see binning_surface_from_tiles
+    # Returns the surface and its GridSpec.
+    headers = [las_io.read_header(f) for f in las_files]
+
+    def load(i):
+        las_file = las_files[i]
+        _, points = las_io.read_points(las_file, headers[i])
+        keep = las_io.point_filter(headers[i], points, class_codes, last_return)
+        if select is not None:
+            keep &= select[las_file]
+        if exclude is not None:
+            keep &= ~exclude[las_file]
+
+        return las_io.scaled_xyz(headers[i], points[keep])
+
+    return binning_surface_from_tiles([las_io.header_bounds(h) for h in headers], load, cell_size, method,
+                                      void_fill, workers, extent, snap)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+SCRIPTS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "FootprintExtraction",
+                              "Scripts")
+
+# the scripts are run by the toolbox from their folder, they import each other as top level modules
+if SCRIPTS_FOLDER not in sys.path:
+    sys.path.insert(0, SCRIPTS_FOLDER)
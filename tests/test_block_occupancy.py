@@ -0,0 +1,37 @@
+import numpy as np
+
+import block_occupancy
+import grid_lib
+
+
+def test_regions_cover_occupied_blocks():
+    occupied = np.zeros((20, 20), dtype=bool)
+    occupied[2, 2] = occupied[2, 3] = True
+    occupied[15, 15] = True
+    blocks = grid_lib.GridSpec(0.0, 200.0, 10.0, 20, 20)
+
+    regions = block_occupancy.region_extents(occupied, blocks, halo=1)
+
+    assert [extent for extent, _ in regions] == [(10.0, 160.0, 50.0, 190.0), (140.0, 30.0, 170.0, 60.0)]
+    fraction = block_occupancy.covered_fraction(regions, grid_lib.grid_extent(blocks))
+    assert np.isclose(fraction, (12 + 9) / 400.0)
+    assert block_occupancy.choose_regions(regions, fraction) == regions
+
+
+def test_choose_regions_falls_back_to_one_pass():
+    region = ((0.0, 0.0, 1.0, 1.0), [(0.0, 0.0, 1.0, 1.0)])
+
+    assert block_occupancy.choose_regions([], 0.0) == [(None, [])]
+    assert block_occupancy.choose_regions([region] * 3, 0.9) == [(None, [])]
+    assert block_occupancy.choose_regions([region] * 3, 0.1, max_regions=2) == [(None, [])]
+
+
+def test_many_boxes_are_grouped():
+    occupied = np.zeros((64, 64), dtype=bool)
+    occupied[::4, ::4] = True
+
+    regions = block_occupancy.block_regions(occupied, halo=0, max_regions=16)
+
+    assert len(regions) <= 16
+    boxes = [box for _, members in regions for box in members]
+    assert len(boxes) == occupied.sum()
@@ -0,0 +1,54 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import common_lib
+
+
+class FakeArcpy(object):
+
+    def __init__(self, datasets):
+        # name or path: (catalog path, data type)
+        self.datasets = datasets
+        self.calls = []
+
+    def Describe(self, dataset):
+        self.calls.append(dataset)
+        catalog_path, data_type = self.datasets[dataset]
+        return SimpleNamespace(name=os.path.basename(catalog_path), catalogPath=catalog_path, dataType=data_type)
+
+
+@pytest.fixture
+def fake_arcpy(monkeypatch, tmp_path):
+    gdb = str(tmp_path / "data.gdb")
+    fake = FakeArcpy({os.path.join(gdb, "buildings"): (os.path.join(gdb, "buildings"), "FeatureClass"),
+                      "buildings_lyr": (os.path.join(gdb, "buildings"), "FeatureLayer"),
+                      "memory/parts": ("memory/parts", "FeatureClass")})
+    monkeypatch.setattr(common_lib, "arcpy", fake)
+    common_lib.invalidate_describe()
+    yield fake, gdb
+    common_lib.invalidate_describe()
+
+
+def test_datasets_are_cached_by_catalog_path(fake_arcpy):
+    fake, gdb = fake_arcpy
+    path = os.path.join(gdb, "buildings")
+
+    common_lib.describe_dataset(path)
+    common_lib.describe_dataset(path)
+    common_lib.describe_dataset(os.path.join(gdb, ".", "buildings"))
+    assert fake.calls == [path]
+
+    common_lib.invalidate_describe(path)
+    common_lib.describe_dataset(path)
+    assert fake.calls == [path, path]
+
+
+def test_layers_and_memory_datasets_are_not_cached(fake_arcpy):
+    fake, _ = fake_arcpy
+
+    for _ in range(2):
+        assert common_lib.describe_dataset("buildings_lyr").data_type == "FeatureLayer"
+        common_lib.describe_dataset("memory/parts")
+    assert fake.calls == ["buildings_lyr", "memory/parts"] * 2
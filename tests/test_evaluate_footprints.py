@@ -0,0 +1,25 @@
+import evaluate_footprints
+import overlay_lib
+import synthetic_city
+
+
+def test_overlay_areas():
+    intersections = overlay_lib.sum_areas_by_id([(1, 2.0), (1, 3.0), (2, 1.0)])
+    unions = overlay_lib.sum_areas_by_id([(1, 10.0), (2, 4.0), (3, 1.0)])
+
+    assert intersections == {1: 5.0, 2: 1.0}
+    assert overlay_lib.iou_by_id(intersections, unions) == {1: 0.5, 2: 0.25}
+
+
+def test_true_footprints_score_perfectly(tmp_path):
+    synthetic_city.generate_city(str(tmp_path), 1, 1, 120.0, 2.0)
+    truth = synthetic_city.load_truth(str(tmp_path))
+
+    records, summary = evaluate_footprints.evaluate(truth, [b["rings"] for b in truth["buildings"]])
+
+    assert summary["buildings"] == len(truth["buildings"]) > 0
+    assert summary["recall"] == 1.0
+    assert summary["false_positives"] == 0
+    assert summary["mean_iou"] > 0.99
+    assert all(r["boundary_f"] > 0.99 for r in records)
+
@@ -0,0 +1,29 @@
+import json
+
+import instrumentation
+
+
+def test_failed_span_is_recorded_with_error(tmp_path):
+    out = tmp_path / "spans.jsonl"
+    instrumentation.set_output(str(out))
+    try:
+        ok = instrumentation.start_span("ok_stage")
+        ok.end()
+        # a later end (e.g. in a finally) does not change a span that already ended
+        ok.end("failed")
+
+        failed = instrumentation.start_span("failed_stage")
+        failed.end("failed")
+
+        try:
+            with instrumentation.span("raised_stage"):
+                raise ValueError("bad input")
+        except ValueError:
+            pass
+    finally:
+        instrumentation.set_output(None)
+
+    records = {r["name"]: r for r in (json.loads(line) for line in out.read_text().splitlines())}
+    assert records["ok_stage"]["error"] is None
+    assert records["failed_stage"]["error"] == "failed"
+    assert records["raised_stage"]["error"] == "bad input"
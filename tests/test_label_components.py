@@ -0,0 +1,64 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+import grid_lib
+
+
+def flood_fill_labels(mask, connectivity):
+    # labels in raster scan order of the first cell of every region, like label_components
+    offsets = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    if connectivity == 8:
+        offsets += [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+    labels = np.zeros(mask.shape, dtype=np.int64)
+    n = 0
+    for row, col in zip(*np.nonzero(mask)):
+        if labels[row, col]:
+            continue
+        n += 1
+        labels[row, col] = n
+        cells = deque([(row, col)])
+        while cells:
+            r, c = cells.popleft()
+            for dr, dc in offsets:
+                nr, nc = r + dr, c + dc
+                if 0 <= nr < mask.shape[0] and 0 <= nc < mask.shape[1] and mask[nr, nc] and not labels[nr, nc]:
+                    labels[nr, nc] = n
+                    cells.append((nr, nc))
+    return labels, n
+
+
+@pytest.mark.parametrize("connectivity", [4, 8])
+@pytest.mark.parametrize("seed, fraction", [(1, 0.3), (2, 0.5), (3, 0.6)])
+def test_labels_match_a_flood_fill(seed, fraction, connectivity):
+    mask = np.random.default_rng(seed).random((60, 45)) < fraction
+    labels, n = grid_lib.label_components(mask, connectivity)
+    expected, expected_n = flood_fill_labels(mask, connectivity)
+
+    assert n == expected_n
+    np.testing.assert_array_equal(labels, expected)
+
+
+def test_spiral_is_one_component():
+    # a long winding region needs many joining rounds
+    mask = np.zeros((21, 21), dtype=bool)
+    top, left, bottom, right = 0, 0, 20, 20
+    while top <= bottom and left <= right:
+        mask[top, left:right + 1] = True
+        mask[top:bottom + 1, right] = True
+        mask[bottom, left:right + 1] = True
+        mask[top + 2:bottom + 1, left] = True
+        top, left, bottom, right = top + 2, left + 2, bottom - 2, right - 2
+        if top <= bottom:
+            mask[top - 1, left] = True
+    labels, n = grid_lib.label_components(mask, 4)
+    expected, expected_n = flood_fill_labels(mask, 4)
+
+    assert n == expected_n == 1
+    np.testing.assert_array_equal(labels, expected)
+
+
+def test_empty_mask():
+    labels, n = grid_lib.label_components(np.zeros((3, 4), dtype=bool))
+    assert n == 0 and not labels.any()
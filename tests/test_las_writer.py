@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+
+import las_io
+import las_writer
+
+
+def write_tile(folder, n=500, seed=1):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(1000.0, 1100.0, n)
+    y = rng.uniform(2000.0, 2100.0, n)
+    z = rng.uniform(10.0, 30.0, n)
+    classes = rng.choice([1, 2, 6], n)
+    returns = rng.integers(1, 4, n)
+    las_file = os.path.join(str(folder), "tile.las")
+    las_writer.write_points(las_file, x, y, z, classes, return_number=returns)
+
+    return las_file, x, y, z, classes, returns
+
+
+def test_write_points_round_trip(tmp_path):
+    las_file, x, y, z, classes, returns = write_tile(tmp_path)
+
+    header, points = las_io.read_points(las_file)
+    r_x, r_y, r_z = las_io.scaled_xyz(header, points)
+
+    assert header.point_count == x.size
+    assert np.allclose(r_x, x, atol=0.005) and np.allclose(r_y, y, atol=0.005) and np.allclose(r_z, z, atol=0.005)
+    assert np.array_equal(las_io.classification(header, points), classes)
+    assert np.array_equal(las_io.return_numbers(header, points)[0], returns)
+    assert not las_io.withheld(header, points).any()
+
+
+def test_patch_classification_writes_only_indices(tmp_path):
+    las_file, _, _, _, classes, _ = write_tile(tmp_path)
+    with open(las_file, "rb") as f:
+        before = f.read()
+
+    count, histogram = las_writer.patch_classification(las_file, [3, 7], [6, 6], withhold=[False, True])
+    assert count == 2
+    assert histogram[6] == 2 and histogram.sum() == 2
+
+    header, points = las_io.read_points(las_file)
+    expected = classes.copy()
+    expected[[3, 7]] = 6
+    assert np.array_equal(las_io.classification(header, points), expected)
+    assert np.array_equal(np.flatnonzero(las_io.withheld(header, points)), [7])
+    del points
+
+    # only the class bytes of the patched records change
+    with open(las_file, "rb") as f:
+        after = f.read()
+    differ = np.flatnonzero(np.frombuffer(before, np.uint8) != np.frombuffer(after, np.uint8))
+    assert set((differ - header.offset_to_points) // header.record_length) <= {3, 7}
+
+
+def test_apply_classification_keeps_withheld_flags(tmp_path):
+    las_file, _, _, _, classes, _ = write_tile(tmp_path)
+    las_writer.patch_classification(las_file, [0, 1, 2], withhold=True)
+
+    # noise masks leave the already withheld points False
+    noise = np.zeros(classes.size, dtype=bool)
+    noise[[10, 11]] = True
+    new_classes = classes.copy()
+    new_classes[20:30] = 6
+
+    changed = las_writer.apply_classification({las_file: new_classes}, withhold={las_file: noise})
+
+    header, points = las_io.read_points(las_file)
+    assert np.array_equal(las_io.classification(header, points), new_classes)
+    assert np.array_equal(np.flatnonzero(las_io.withheld(header, points)), [0, 1, 2, 10, 11])
+    assert changed[las_file] == np.count_nonzero(new_classes != classes) + 2
+
+
+def test_write_subset(tmp_path):
+    las_file, x, _, _, classes, _ = write_tile(tmp_path)
+    out_file = las_writer.write_subset(las_file, os.path.join(str(tmp_path), "buildings.las"), classes == 6)
+
+    header, points = las_io.read_points(out_file)
+    assert header.point_count == np.count_nonzero(classes == 6)
+    assert np.all(las_io.classification(header, points) == 6)
+    assert np.isclose(header.min[0], las_io.scaled_xyz(header, points)[0].min())
@@ -0,0 +1,16 @@
+import os
+
+from conftest import SCRIPTS_FOLDER
+
+
+def test_scripts_use_crlf():
+    # the toolbox scripts are CRLF, an editor that saves a script with LF rewrites every line in the diff
+    mixed = []
+    for name in sorted(os.listdir(SCRIPTS_FOLDER)):
+        if name.endswith(".py"):
+            with open(os.path.join(SCRIPTS_FOLDER, name), "rb") as f:
+                data = f.read()
+            if data.count(b"\n") != data.count(b"\r\n"):
+                mixed.append(name)
+
+    assert mixed == []
@@ -0,0 +1,30 @@
+import logging
+import threading
+
+import message_log
+
+
+def test_geoprocessing_messages_are_written_in_the_calling_thread(tmp_path):
+    written = []
+
+    def add(text):
+        written.append((text, threading.get_ident()))
+
+    log_file = tmp_path / "run.log"
+    message_log.start([message_log.ArcpyHandler(add, add, add), message_log.file_handler(str(log_file))],
+                      interval=60)
+    try:
+        for i in range(5):
+            message_log.log(logging.INFO, "Processed tile {0} of 5".format(i))
+        message_log.log(logging.WARNING, "No points in tile 3")
+        # written before log returns, not by the listener thread
+        assert [t for t, _ in written] == ["Processed tile 0 of 5", "No points in tile 3"]
+        message_log.flush()
+    finally:
+        message_log.stop()
+
+    assert {ident for _, ident in written} == {threading.get_ident()}
+    assert written[-1][0] == "Processed tile 4 of 5 (+4 similar messages)"
+    lines = log_file.read_text().splitlines()
+    assert len(lines) == 3
+    assert lines[-1].endswith("Processed tile 4 of 5 (+4 similar messages)")
@@ -0,0 +1,65 @@
+import numpy as np
+
+import neighbour_index
+
+
+def brute_distances(points, queries):
+    return np.sqrt(((queries[:, None, :] - points[None, :, :]) ** 2).sum(axis=2))
+
+
+def make_points(dimension, n=800, seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0.0, 20.0, size=(n, dimension))
+
+
+def test_query_radius_matches_brute_force():
+    for dimension in (2, 3):
+        points = make_points(dimension)
+        queries = make_points(dimension, 200, seed=2)
+        index = neighbour_index.VoxelIndex(*points.T, voxel_size=1.5)
+
+        indptr, indices, distances = index.query_radius(*queries.T, radius=2.0, return_distance=True)
+        expected = brute_distances(points, queries)
+
+        for q in range(queries.shape[0]):
+            found = indices[indptr[q]:indptr[q + 1]]
+            assert sorted(found) == sorted(np.flatnonzero(expected[q] <= 2.0))
+            assert np.allclose(distances[indptr[q]:indptr[q + 1]], expected[q, found])
+
+
+def test_count_radius_exclude_self():
+    points = make_points(3)
+    index = neighbour_index.VoxelIndex(*points.T, voxel_size=1.0)
+
+    counts = index.count_radius(*points.T, radius=1.5, exclude_self=True)
+    expected = (brute_distances(points, points) <= 1.5).sum(axis=1) - 1
+
+    assert np.array_equal(counts, expected)
+
+
+def test_query_knn_matches_brute_force():
+    points = make_points(3)
+    queries = make_points(3, 100, seed=3)
+    index = neighbour_index.VoxelIndex(*points.T, voxel_size=1.0)
+
+    indices, distances = index.query_knn(*queries.T, k=5, max_radius=30.0)
+    expected = np.sort(brute_distances(points, queries), axis=1)[:, :5]
+
+    assert np.allclose(distances, expected)
+    assert np.allclose(brute_distances(points, queries)[np.arange(100)[:, None], indices], expected)
+
+
+def test_query_knn_isolated_point_stops_at_max_radius():
+    # an outlier far from a dense cluster must not grow the search to the extent of the points
+    rng = np.random.default_rng(4)
+    cluster = rng.uniform(0.0, 5.0, size=(1000, 3))
+    points = np.vstack((cluster, [[2800.0, 0.0, 0.0]]))
+    index = neighbour_index.VoxelIndex(*points.T, voxel_size=0.25)
+
+    indices, distances = index.query_knn(*points[-1:].T, k=4, exclude_self=True)
+
+    assert np.all(indices == -1)
+    assert np.all(np.isinf(distances))
+
+    indices, _ = index.query_knn(*cluster[:10].T, k=4, exclude_self=True)
+    assert np.all(indices >= 0)
@@ -0,0 +1,37 @@
+import multiprocessing
+import os
+import time
+
+import parallel_lib
+
+
+def timed_task(seconds):
+    start = time.monotonic()
+    time.sleep(seconds)
+    return os.getpid(), start, time.monotonic()
+
+
+def most_at_once(intervals):
+    events = sorted([(start, 1) for _, start, _ in intervals] + [(end, -1) for _, _, end in intervals])
+    running = most = 0
+    for _, change in events:
+        running += change
+        most = max(most, running)
+    return most
+
+
+def test_warm_pool_never_runs_more_than_workers_tasks():
+    # 16 tasks with a new pool after every 4, the old pools must be drained before the next one starts
+    processes = []
+    with parallel_lib.WarmPool(2, extensions=(), max_tasks=2) as pool:
+        results = []
+        for result in pool.run_unordered(timed_task, [(0.05,)] * 16):
+            results.append(result)
+            processes.append(len(multiprocessing.active_children()))
+        results += pool.run_tasks(timed_task, [(0.05,)] * 8)
+
+    assert len(results) == 24
+    assert most_at_once(results) <= 2
+    assert max(processes) <= 2
+    # the workers were replaced
+    assert len({pid for pid, _, _ in results}) > 2
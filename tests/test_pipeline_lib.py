@@ -0,0 +1,74 @@
+import pytest
+
+import pipeline_lib
+
+
+def build(folder, runs, params=None, fail=None):
+    # A (reads the input file) -> B (classifies the input in place) -> C (writes the output)
+    source = folder / "tile.las"
+    output = folder / "footprints.txt"
+
+    def stage(name, action=None):
+        def function():
+            if fail == name:
+                raise RuntimeError(name + " failed")
+            runs.append(name)
+            if action:
+                action()
+        return function
+
+    pipeline = pipeline_lib.Pipeline(str(folder), message=lambda text: None)
+    pipeline.add_stage("A", stage("A"), inputs=[str(source)])
+    pipeline.add_stage("B", stage("B", lambda: source.write_text(source.read_text() + " classified")),
+                       inputs=[str(source)], params=params or {"min_height": 2}, depends=["A"],
+                       updates=[str(source)])
+    pipeline.add_stage("C", stage("C", lambda: output.write_text("footprints")), outputs=[str(output)],
+                       depends=["B"])
+    return pipeline
+
+
+@pytest.fixture
+def folder(tmp_path):
+    (tmp_path / "tile.las").write_text("points")
+    return tmp_path
+
+
+def test_a_rerun_skips_the_completed_stages(folder):
+    runs = []
+    assert build(folder, runs).run() == ["A", "B", "C"]
+    # B edited its input in place, that does not make the stages out of date
+    assert build(folder, runs).run() == []
+    assert runs == ["A", "B", "C"]
+
+
+def test_a_changed_parameter_reruns_the_stage_and_its_downstream_stages(folder):
+    build(folder, []).run()
+    assert build(folder, [], params={"min_height": 3}).run() == ["B", "C"]
+
+
+def test_a_changed_input_reruns_everything(folder):
+    build(folder, []).run()
+    (folder / "tile.las").write_text("other points")
+    assert build(folder, []).run() == ["A", "B", "C"]
+
+
+def test_a_missing_output_reruns_the_stage(folder):
+    build(folder, []).run()
+    (folder / "footprints.txt").unlink()
+    assert build(folder, []).run() == ["C"]
+
+
+def test_a_run_resumes_at_the_failed_stage(folder):
+    with pytest.raises(RuntimeError):
+        build(folder, [], fail="C").run()
+    runs = []
+    assert build(folder, runs).run() == ["C"]
+    assert runs == ["C"]
+
+
+def test_circular_dependencies_are_an_error(folder):
+    pipeline = pipeline_lib.Pipeline(str(folder), message=lambda text: None)
+    pipeline.add_stage("A", lambda: None, depends=["B"])
+    pipeline.add_stage("B", lambda: None, depends=["A"])
+    with pytest.raises(pipeline_lib.PipelineError):
+        pipeline.run()
@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+
+import grid_lib
+import las_writer
+import point_cache
+import void_fill
+
+
+def write_tiles(folder):
+    # two overlapping tiles with building (6) and ground (2) points
+    rng = np.random.default_rng(7)
+    las_files = []
+    for i, x0 in enumerate((0.0, 40.0)):
+        n = 3000
+        x = rng.uniform(x0, x0 + 60.0, n)
+        y = rng.uniform(0.0, 60.0, n)
+        z = rng.uniform(0.0, 20.0, n)
+        classes = rng.choice([2, 6], n)
+        returns = rng.integers(1, 3, n)
+        las_file = os.path.join(str(folder), "tile_{}.las".format(i))
+        las_writer.write_points(las_file, x, y, z, classes, return_number=returns, number_of_returns=np.full(n, 2))
+        las_files.append(las_file)
+
+    return las_files
+
+
+def test_sidecar_surface_matches_las_surface(tmp_path):
+    las_files = write_tiles(tmp_path)
+    cache = os.path.join(str(tmp_path), point_cache.CACHE_FOLDER)
+    paths = point_cache.cached_sidecars(las_files, cache)
+
+    for method in ("MAXIMUM", "MINIMUM", "AVERAGE", "COUNT"):
+        for last_return in (False, True):
+            expected, expected_spec = void_fill.binning_surface_from_las(las_files, 2.0, method, "NONE", [6],
+                                                                        last_return)
+            surface, spec = point_cache.binning_surface(paths, 2.0, [6], method, "NONE", last_return, workers=2)
+
+            assert spec == expected_spec
+            assert np.allclose(surface, expected, equal_nan=True)
+
+
+def test_overlapping_tiles_accumulate_average_and_count(tmp_path):
+    las_files = write_tiles(tmp_path)
+    paths = point_cache.cached_sidecars(las_files, str(tmp_path))
+    x, y, z = [np.concatenate(c) for c in zip(*[point_cache.read_xyz(p, [6]) for p in paths])]
+
+    count, spec = point_cache.binning_surface(paths, 5.0, [6], "COUNT", "NONE")
+    average, _ = point_cache.binning_surface(paths, 5.0, [6], "AVERAGE", "NONE")
+
+    assert count.sum() == x.size
+    assert np.allclose(average, grid_lib.bin_points(spec, x, y, z, "AVERAGE"), equal_nan=True)
+
+
+def test_cached_sidecars_rewrites_changed_files(tmp_path):
+    las_files = write_tiles(tmp_path)
+    cache = os.path.join(str(tmp_path), point_cache.CACHE_FOLDER)
+    paths = point_cache.cached_sidecars(las_files, cache)
+    header_file = os.path.join(paths[0], point_cache.HEADER_FILE)
+    written = os.path.getmtime(header_file)
+
+    assert point_cache.cached_sidecars(las_files, cache) == paths
+    assert os.path.getmtime(header_file) == written
+
+    os.utime(las_files[0], (written + 10, written + 10))
+    assert not point_cache.is_current(paths[0], las_files[0])
+    point_cache.cached_sidecars(las_files, cache)
+    assert point_cache.is_current(paths[0], las_files[0])
+
+
+def test_surface_is_limited_to_the_extent_and_snapped(tmp_path):
+    las_files = write_tiles(tmp_path)
+    paths = point_cache.cached_sidecars(las_files, str(tmp_path))
+    full, full_spec = point_cache.binning_surface(paths, 2.0, [6], "MAXIMUM", "NONE")
+
+    loaded = []
+    bounds = [(0.0, 0.0, 60.0, 60.0), (40.0, 0.0, 100.0, 60.0)]
+
+    def load(i):
+        loaded.append(i)
+        return point_cache.read_xyz(paths[i], [6])
+
+    # only the first tile is in the extent
+    surface, spec = void_fill.binning_surface_from_tiles(bounds, load, 2.0, "MAXIMUM", "NONE",
+                                                         extent=(5.3, 10.7, 30.1, 40.2),
+                                                         snap=(full_spec.x_min, full_spec.y_max))
+    assert loaded == [0]
+    assert spec.x_min <= 5.3 and spec.y_max >= 40.2 and spec.n_cols * spec.cell_size < 30.0
+
+    # the grid has the cells of the full surface
+    col0 = (spec.x_min - full_spec.x_min) / spec.cell_size
+    row0 = (full_spec.y_max - spec.y_max) / spec.cell_size
+    assert col0 == int(col0) and row0 == int(row0)
+    window = full[int(row0):int(row0) + spec.n_rows, int(col0):int(col0) + spec.n_cols]
+    assert np.array_equal(surface, window, equal_nan=True)
+
+
+def test_sidecars_are_replaced_whole(tmp_path):
+    las_files = write_tiles(tmp_path)
+    cache = os.path.join(str(tmp_path), point_cache.CACHE_FOLDER)
+    path = point_cache.cached_sidecars(las_files[:1], cache)[0]
+
+    # a sidecar left incomplete (no header) by another run is never current and is replaced as a whole
+    os.remove(os.path.join(path, point_cache.HEADER_FILE))
+    np.save(os.path.join(path, "x.npy"), np.zeros(3, dtype=np.int32))
+    assert not point_cache.is_current(path, las_files[0])
+
+    point_cache.cached_sidecars(las_files[:1], cache)
+    assert point_cache.is_current(path, las_files[0])
+    assert np.load(os.path.join(path, "x.npy")).size == point_cache.read_header(path)["point_count"]
+    # no temporary folders are left behind
+    assert os.listdir(cache) == [os.path.basename(path)]
@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+
+import grid_lib
+import raster_overviews
+import virtual_mosaic
+
+
+def build_mosaic(folder):
+    # 3 x 3 class tiles of 100 cells, nodata 0
+    rng = np.random.default_rng(5)
+    mosaic = virtual_mosaic.VirtualMosaic(nodata=0, dtype="uint8")
+    full = np.zeros((300, 300), dtype=np.uint8)
+    for r in range(3):
+        for c in range(3):
+            tile = rng.choice(np.array([0, 2, 6], dtype=np.uint8), (100, 100))
+            full[r * 100:(r + 1) * 100, c * 100:(c + 1) * 100] = tile
+            path = os.path.join(str(folder), "tile_{}_{}.npy".format(r, c))
+            np.save(path, tile)
+            mosaic.add_tile(path, grid_lib.GridSpec(c * 100.0, 300.0 - r * 100.0, 1.0, 100, 100))
+
+    return mosaic, full
+
+
+def test_threaded_mosaic_overviews_match_full_grid(tmp_path):
+    mosaic, full = build_mosaic(tmp_path)
+    index_file = os.path.join(str(tmp_path), "mosaic_index.json")
+    mosaic.save(index_file)
+
+    paths = raster_overviews.write_mosaic_overviews(mosaic, index_file, raster_overviews.MODE, block_size=64,
+                                                    workers=4)
+    expected = raster_overviews.build_overviews(full, raster_overviews.MODE, 0, block_size=64)
+
+    for factor in raster_overviews.OVERVIEW_FACTORS:
+        level, _ = mosaic.read_overview(factor)
+        assert os.path.exists(paths[factor])
+        assert np.array_equal(level, expected[factor])
@@ -0,0 +1,19 @@
+import pytest
+
+import elevation_from_las
+import units
+
+
+def test_height_values_are_converted_to_the_data_unit():
+    assert elevation_from_las.get_height_value("-2 Meters", "Feet") == pytest.approx(-2 / 0.3048)
+    assert elevation_from_las.get_height_value("1 Feet", "Meters") == pytest.approx(0.3048)
+    # a number without a unit is in the unit of the data, decimal commas are read
+    assert elevation_from_las.get_height_value("3,5", "Feet") == 3.5
+    assert elevation_from_las.get_height_value("2 Unknown", "Meters") == 2.0
+
+
+def test_unknown_units_are_an_error_not_a_factor_of_one():
+    with pytest.raises(units.UnitError):
+        elevation_from_las.get_height_value("2 Cubits", "Meters")
+    with pytest.raises(units.UnitError):
+        elevation_from_las.get_height_value("2 SquareMeters", "Meters")
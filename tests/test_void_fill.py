@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import void_fill
+
+
+def plane_with_voids():
+    rows, cols = np.mgrid[0:64, 0:64]
+    plane = 0.5 * rows - 0.25 * cols + 10.0
+    grid = plane.copy()
+    # a void larger than the block and the first halo, and a missing bin
+    grid[20:34, 25:39] = np.nan
+    grid[50, 10] = np.nan
+    return plane, grid
+
+
+@pytest.mark.parametrize("block_size, halo", [(256, 32), (16, 4)])
+def test_linear_fill_reproduces_a_plane(block_size, halo):
+    plane, grid = plane_with_voids()
+    filled = void_fill.fill_voids(grid, void_fill.LINEAR, block_size=block_size, halo=halo)
+
+    np.testing.assert_allclose(filled, plane, atol=1e-9)
+
+
+@pytest.mark.parametrize("method", [void_fill.IDW, void_fill.LAPLACIAN])
+def test_fills_stay_within_the_void_boundary(method):
+    plane, grid = plane_with_voids()
+    filled = void_fill.fill_voids(grid, method, block_size=16, halo=4)
+
+    assert not np.isnan(filled).any()
+    boundary = plane[19:35, 24:40]
+    assert boundary.min() <= filled[20:34, 25:39].min() and filled[20:34, 25:39].max() <= boundary.max()
+    # valid cells are not changed, a missing bin of a plane gets its exact value
+    np.testing.assert_array_equal(filled[~np.isnan(grid)], grid[~np.isnan(grid)])
+    assert filled[50, 10] == pytest.approx(plane[50, 10])
+
+
+def test_laplacian_fill_is_close_to_a_plane():
+    plane, grid = plane_with_voids()
+    filled = void_fill.fill_voids(grid, void_fill.LAPLACIAN, block_size=16, halo=4)
+
+    assert np.abs(filled - plane).max() < 0.25
+
+
+def test_simple_fill_only_fills_small_voids():
+    plane, grid = plane_with_voids()
+    filled = void_fill.fill_voids(grid, void_fill.SIMPLE)
+
+    assert filled[50, 10] == pytest.approx(plane[50, 10])
+    assert np.isnan(filled[20:34, 25:39]).all()
+
+
+def test_fill_mask_leaves_voids_outside_it():
+    plane, grid = plane_with_voids()
+    fill_mask = np.ones(grid.shape, dtype=bool)
+    fill_mask[50, 10] = False
+    filled = void_fill.fill_voids(grid, void_fill.LINEAR, fill_mask=fill_mask)
+
+    assert np.isnan(filled[50, 10])
+    np.testing.assert_allclose(filled[20:34, 25:39], plane[20:34, 25:39], atol=1e-9)
+
+
+def test_unknown_method_is_an_error():
+    with pytest.raises(ValueError):
+        void_fill.fill_voids(np.zeros((4, 4)), "NATURAL_NEIGHBOR")